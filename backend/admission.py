@@ -0,0 +1,227 @@
+"""
+Admission control for the expensive stages of upload and ask requests.
+
+Each stage (extraction, embedding, query_embedding, rerank, generation) has a
+fixed number of concurrent slots and a bounded number of waiters. Blocking work runs on the
+stage's own thread pool so it never stalls the event loop; coroutines (LLM
+calls) hold a slot while they await. Request handlers are admitted only
+while the stage has room, otherwise StageFullError is raised and answered
+with 429 and a Retry-After estimated from recent service times. Background
+ingestion waits for a slot instead of being rejected. Questions are embedded
+on query_embedding, whose slots ingestion never holds, so a question is not
+queued behind a document's embedding batches.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# Extraction shares the ingestion worker settings (jobs.JobQueue) so both entry points use one knob
+EXTRACTION_CONCURRENCY = int(os.getenv("INGEST_WORKERS", "2"))
+EXTRACTION_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "16"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "2"))
+EMBEDDING_QUEUE_DEPTH = int(os.getenv("EMBEDDING_QUEUE_DEPTH", "32"))
+QUERY_EMBEDDING_CONCURRENCY = int(os.getenv("QUERY_EMBEDDING_CONCURRENCY", "2"))
+QUERY_EMBEDDING_QUEUE_DEPTH = int(os.getenv("QUERY_EMBEDDING_QUEUE_DEPTH", "32"))
+# Cross-encoder scoring is CPU-bound, so one batch at a time by default
+RERANK_CONCURRENCY = int(os.getenv("RERANK_CONCURRENCY", "1"))
+RERANK_QUEUE_DEPTH = int(os.getenv("RERANK_QUEUE_DEPTH", "32"))
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "8"))
+GENERATION_QUEUE_DEPTH = int(os.getenv("GENERATION_QUEUE_DEPTH", "32"))
+ADMISSION_MAX_RETRY_AFTER = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", "60"))
+# Number of recent queue waits kept for the p50/p95 metrics
+ADMISSION_WAIT_SAMPLES = 1000
+
+
+class StageFullError(Exception):
+    """Raised when a stage has no free slot and its queue is full"""
+
+    def __init__(self, stage, retry_after):
+        super().__init__(f"Server is busy: the {stage} queue is full. Retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageMetrics:
+    """Queue depth, wait time and service time counters for one bounded queue"""
+
+    def __init__(self, name, concurrency, queue_depth):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.queued = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.service_seconds = None   # moving average
+        self._waits = deque(maxlen=ADMISSION_WAIT_SAMPLES)
+        self._lock = threading.Lock()
+
+    def admit(self, wait=False):
+        """Reserve a place in the queue, or raise StageFullError when the stage is saturated.
+
+        With wait=True the caller is always admitted (background work that
+        should queue rather than fail). Returns the enqueue timestamp.
+        """
+        with self._lock:
+            if not wait and self.queued + self.running >= self.concurrency + self.queue_depth:
+                self.rejected += 1
+                raise StageFullError(self.name, self._retry_after())
+            self.queued += 1
+            self.admitted += 1
+        return time.perf_counter()
+
+    def abandon(self):
+        """A queued item was cancelled before it started"""
+        with self._lock:
+            self.queued -= 1
+
+    def start(self, queued_at):
+        now = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self._waits.append(now - queued_at)
+        return now
+
+    def finish(self, started_at):
+        elapsed = time.perf_counter() - started_at
+        with self._lock:
+            self.running -= 1
+            self.completed += 1
+            if self.service_seconds is None:
+                self.service_seconds = elapsed
+            else:
+                self.service_seconds = 0.9 * self.service_seconds + 0.1 * elapsed
+
+    def _retry_after(self):
+        # Time for the slots to drain the work ahead of a new arrival
+        if not self.service_seconds:
+            return 1
+        backlog = (self.queued + self.running) / max(self.concurrency, 1)
+        return min(ADMISSION_MAX_RETRY_AFTER, max(1, math.ceil(self.service_seconds * backlog)))
+
+    def retry_after(self):
+        with self._lock:
+            return self._retry_after()
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+
+            def percentile(p):
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2) if waits else 0.0
+
+            return {
+                "concurrency": self.concurrency,
+                "queue_depth": self.queue_depth,
+                "running": self.running,
+                "queued": self.queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "wait_ms_p50": percentile(0.5),
+                "wait_ms_p95": percentile(0.95),
+                "wait_ms_max": round(waits[-1] * 1000, 2) if waits else 0.0,
+                "service_ms_avg": round(self.service_seconds * 1000, 2) if self.service_seconds else None,
+            }
+
+
+class Stage(StageMetrics):
+    """A bounded executor: at most concurrency items run, at most queue_depth wait"""
+
+    def __init__(self, name, concurrency, queue_depth):
+        super().__init__(name, concurrency, queue_depth)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                    thread_name_prefix=f"{self.name}-stage")
+            return self._executor
+
+    def _execute(self, queued_at, fn, args, kwargs):
+        started_at = self.start(queued_at)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.finish(started_at)
+
+    def _submit(self, queued_at, fn, args, kwargs):
+        future = self._get_executor().submit(self._execute, queued_at, fn, args, kwargs)
+        # A future cancelled while still queued never reaches _execute
+        future.add_done_callback(lambda f: f.cancelled() and self.abandon())
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking function on the stage's pool, raising StageFullError if saturated"""
+        queued_at = self.admit()
+        return await asyncio.wrap_future(self._submit(queued_at, fn, args, kwargs))
+
+    async def run_waiting(self, fn, *args, **kwargs):
+        """Like run, but wait for a slot however long the queue is (a request's bulk work, e.g. a batch)"""
+        queued_at = self.admit(wait=True)
+        return await asyncio.wrap_future(self._submit(queued_at, fn, args, kwargs))
+
+    def call(self, fn, *args, **kwargs):
+        """Run a blocking function on the stage's pool from a worker thread, waiting for a slot"""
+        queued_at = self.admit(wait=True)
+        return self._submit(queued_at, fn, args, kwargs).result()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the stage's slots for the duration of an async block (e.g. an LLM call)"""
+        queued_at = self.admit()
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        semaphore = self._semaphore
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            self.abandon()
+            raise
+        started_at = self.start(queued_at)
+        try:
+            yield
+        finally:
+            semaphore.release()
+            self.finish(started_at)
+
+
+_stages = {}
+_stages_lock = threading.Lock()
+
+_STAGE_LIMITS = {
+    "extraction": (EXTRACTION_CONCURRENCY, EXTRACTION_QUEUE_DEPTH),
+    "embedding": (EMBEDDING_CONCURRENCY, EMBEDDING_QUEUE_DEPTH),
+    "query_embedding": (QUERY_EMBEDDING_CONCURRENCY, QUERY_EMBEDDING_QUEUE_DEPTH),
+    "rerank": (RERANK_CONCURRENCY, RERANK_QUEUE_DEPTH),
+    "generation": (GENERATION_CONCURRENCY, GENERATION_QUEUE_DEPTH),
+}
+
+
+def get_stage(name):
+    """Return the process-wide stage called name (extraction, embedding, query_embedding, rerank or generation)"""
+    with _stages_lock:
+        if name not in _stages:
+            concurrency, queue_depth = _STAGE_LIMITS[name]
+            _stages[name] = Stage(name, concurrency, queue_depth)
+        return _stages[name]
+
+
+def admission_stats():
+    """Metrics for every stage that has been used"""
+    with _stages_lock:
+        stages = dict(_stages)
+    return {name: stage.stats() for name, stage in stages.items()}
@@ -0,0 +1,156 @@
+"""
+Answer cache in front of rag_chat.chat.
+
+Answers are keyed by the normalized question, the document scope, the chat
+and embedding models and the corpus version. Every ingestion or deletion
+bumps the corpus version, so stale answers are never served; they simply
+stop being looked up and age out. Entries live in an in-memory LRU with a
+TTL, optionally written through to a local SQLite file so they survive
+restarts and are shared by worker processes.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from embedding_cache import normalize_text
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# memory: per-process only; sqlite: also persisted to ANSWER_CACHE_PATH
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+ANSWER_CACHE_PATH = os.getenv(
+    "ANSWER_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "answers.sqlite3")
+)
+
+
+def answer_cache_key(question, sources, model, corpus_version):
+    """Questions differing only in case, whitespace or trailing punctuation share a key"""
+    normalized = normalize_text(question).casefold().rstrip("?!. ")
+    scope = json.dumps(sorted(set(sources)) if sources else None)
+    return hashlib.sha256(f"{model}\0{corpus_version}\0{scope}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """LRU + TTL cache of answers, optionally persisted to SQLite"""
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()   # key -> (answer, expires_at)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path is not None:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used_idx ON answers (last_used)")
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+            del self._entries[key]
+        if self._conn is not None:
+            row = self._conn.execute("SELECT answer, expires_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+                self._remember(key, row[0], row[1])
+                return row[0]
+        return None
+
+    def _remember(self, key, answer, expires_at):
+        self._entries[key] = (answer, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Return the cached answer, or None on a miss or expiry"""
+        with self._lock:
+            answer = self._lookup(key, time.time())
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def put(self, key, answer):
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, answer, expires_at)
+            if self._conn is not None:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO answers (key, answer, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                        (key, answer, expires_at, now)
+                    )
+                    self._conn.execute("DELETE FROM answers WHERE expires_at <= ?", (now,))
+                    self._conn.execute(
+                        "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used DESC "
+                        "LIMIT -1 OFFSET ?)", (self.max_entries,)
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite" if self._conn is not None else "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Return the process-wide cache, or None when caching is disabled or unavailable"""
+    global _cache, _cache_failed
+    if not ANSWER_CACHE_ENABLED or _cache_failed:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                path = ANSWER_CACHE_PATH if ANSWER_CACHE_BACKEND == "sqlite" else None
+                _cache = AnswerCache(path=path)
+                print(f"🗃️ Answer cache ready ({ANSWER_CACHE_BACKEND}, {ANSWER_CACHE_MAX_ENTRIES} entries, "
+                      f"{ANSWER_CACHE_TTL:g}s TTL)")
+            except Exception as e:
+                print(f"⚠️ Answer cache unavailable, continuing without it: {e}")
+                _cache_failed = True
+        return _cache
@@ -0,0 +1,157 @@
+"""
+Chunking engine for extracted PDF text.
+
+Pages arrive as (page_number, text) pairs and are cut into chunks that carry
+their page number and character offsets. Offsets are positions in the
+document text formed by joining the pages with a newline.
+
+Strategies:
+    tokens     fixed windows of chunk_size tokens
+    sentences  whole sentences packed up to chunk_size tokens
+    pages      like sentences, but a chunk never spans two pages
+
+Tokens are words and punctuation marks, which tracks the LLM tokenizer count
+closely enough for sizing chunks without pulling in a tokenizer. Every token
+is visited a bounded number of times, so chunking is linear in the document
+length for any overlap smaller than the chunk size.
+"""
+import os
+import re
+from collections import deque
+
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "pages")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+[\"')\]]*(?=\s|$)|\n\s*\n")
+
+STRATEGIES = ("tokens", "sentences", "pages")
+
+
+def count_tokens(text):
+    """Approximate token count used for chunk sizing and prompt budgets"""
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+
+def _token_pieces(page, text, base):
+    """Yield one piece per token"""
+    for match in TOKEN_PATTERN.finditer(text):
+        yield (page, base + match.start(), base + match.end(), 1)
+
+
+def _sentence_pieces(page, text, base, chunk_size):
+    """Yield one piece per sentence, splitting sentences longer than chunk_size"""
+    start = 0
+    boundaries = [match.end() for match in SENTENCE_END_PATTERN.finditer(text)]
+    if not boundaries or boundaries[-1] < len(text):
+        boundaries.append(len(text))
+    for end in boundaries:
+        tokens = list(TOKEN_PATTERN.finditer(text, start, end))
+        if tokens:
+            if len(tokens) > chunk_size:
+                for match in tokens:
+                    yield (page, base + match.start(), base + match.end(), 1)
+            else:
+                yield (page, base + tokens[0].start(), base + tokens[-1].end(), len(tokens))
+        start = end
+
+
+class _Packer:
+    """Accumulates pieces into chunks of at most chunk_size tokens"""
+
+    def __init__(self, chunk_size, overlap):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.window = deque()
+        self.tokens = 0
+        self.pages = {}
+
+    def add_page(self, page, text, base):
+        self.pages[page] = (text, base)
+
+    def add(self, piece):
+        """Add a piece, returning a finished chunk when the window overflows"""
+        chunk = None
+        if self.window and self.tokens + piece[3] > self.chunk_size:
+            chunk = self.emit()
+            self._trim(self.overlap)
+            # Drop overlap that would leave no room for the new piece
+            self._trim(self.chunk_size - piece[3])
+        self.window.append(piece)
+        self.tokens += piece[3]
+        return chunk
+
+    def emit(self):
+        """Render the current window as a chunk dict"""
+        groups = []
+        for page, start, end, _ in self.window:
+            if groups and groups[-1][0] == page:
+                groups[-1][2] = end
+            else:
+                groups.append([page, start, end])
+        content = "\n".join(
+            self.pages[page][0][start - self.pages[page][1]:end - self.pages[page][1]]
+            for page, start, end in groups
+        )
+        return {
+            "content": content,
+            "page": self.window[0][0],
+            "start_offset": self.window[0][1],
+            "end_offset": self.window[-1][2],
+            "token_count": self.tokens,
+        }
+
+    def flush(self):
+        """Return the final chunk (if any) and reset the window"""
+        chunk = self.emit() if self.window else None
+        self.window.clear()
+        self.tokens = 0
+        self.pages = {}
+        return chunk
+
+    def _trim(self, max_tokens):
+        while self.window and self.tokens > max_tokens:
+            self.tokens -= self.window.popleft()[3]
+        # Forget page texts the window no longer references
+        if self.window:
+            first_page = self.window[0][0]
+            for page in [page for page in self.pages if page < first_page]:
+                del self.pages[page]
+
+
+def chunk_pages(pages, strategy=None, chunk_size=None, overlap=None):
+    """Lazily cut (page_number, text) pairs into chunk dicts.
+
+    Each chunk has content, page (where it starts), start_offset, end_offset
+    and token_count. Consecutive chunks share up to overlap tokens.
+    """
+    strategy = strategy or CHUNK_STRATEGY
+    chunk_size = chunk_size or CHUNK_SIZE
+    overlap = CHUNK_OVERLAP if overlap is None else overlap
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy '{strategy}', expected one of {STRATEGIES}")
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("Chunk overlap must be at least 0 and smaller than the chunk size")
+
+    packer = _Packer(chunk_size, overlap)
+    base = 0
+    for page, text in pages:
+        packer.add_page(page, text, base)
+        if strategy == "tokens":
+            pieces = _token_pieces(page, text, base)
+        else:
+            pieces = _sentence_pieces(page, text, base, chunk_size)
+        for piece in pieces:
+            chunk = packer.add(piece)
+            if chunk:
+                yield chunk
+        if strategy == "pages":
+            chunk = packer.flush()
+            if chunk:
+                yield chunk
+        base += len(text) + 1
+
+    chunk = packer.flush()
+    if chunk:
+        yield chunk
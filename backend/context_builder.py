@@ -0,0 +1,164 @@
+"""
+Prompt context assembly for rag_chat.
+
+Retrieval over-fetches candidates; this stage picks the ones that go into
+the prompt:
+
+    1. exact and near-duplicate chunks (word-set Jaccard similarity at or
+       above CONTEXT_DEDUP_THRESHOLD, e.g. overlapping windows or the same
+       page uploaded twice) are dropped, keeping the better-ranked copy
+    2. the rest are ordered by maximal marginal relevance: each pick
+       maximises lambda * relevance - (1 - lambda) * similarity to the
+       chunks already picked, so a second chunk saying the same thing loses
+       to one that adds new information
+    3. chunks are added in that order while they fit CONTEXT_TOKEN_BUDGET
+       (at most CONTEXT_MAX_CHUNKS); the first chunk is truncated rather
+       than dropped if it alone is over budget
+
+Relevance comes from the retrieval rank, since vector, BM25 and fused
+scores are not on one scale. Tokens are counted with chunking.count_tokens.
+Every report is also added to process-wide totals (get_context_stats), which
+/health exposes.
+"""
+import os
+import threading
+from chunking import TOKEN_PATTERN, count_tokens
+from lexical_index import tokenize
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "5"))
+# Candidates retrieved for the builder to choose from
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "10"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85"))
+
+SEPARATOR = "\n"
+
+
+class ContextStats:
+    """Running totals of the tokens build_context kept out of prompts"""
+
+    def __init__(self):
+        self.requests = 0
+        self.baseline_tokens = 0
+        self.context_tokens = 0
+        self.duplicates_dropped = 0
+        self._lock = threading.Lock()
+
+    def record(self, report):
+        with self._lock:
+            self.requests += 1
+            self.baseline_tokens += report["baseline_tokens"]
+            self.context_tokens += report["context_tokens"]
+            self.duplicates_dropped += report["duplicates_dropped"]
+
+    def stats(self):
+        with self._lock:
+            saved = self.baseline_tokens - self.context_tokens
+            return {
+                "requests": self.requests,
+                "baseline_tokens": self.baseline_tokens,
+                "context_tokens": self.context_tokens,
+                "tokens_saved": saved,
+                "tokens_saved_per_request": round(saved / self.requests, 1) if self.requests else 0.0,
+                "saved_ratio": round(saved / self.baseline_tokens, 4) if self.baseline_tokens else 0.0,
+                "duplicates_dropped": self.duplicates_dropped,
+            }
+
+
+_stats = ContextStats()
+
+
+def get_context_stats():
+    """Return the process-wide context assembly totals"""
+    return _stats
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text after its first max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    for position, match in enumerate(TOKEN_PATTERN.finditer(text), start=1):
+        if position == max_tokens:
+            return text[:match.end()]
+    return text
+
+
+def mmr_order(word_sets, relevance, mmr_lambda=CONTEXT_MMR_LAMBDA):
+    """Indexes of the candidates in maximal marginal relevance order"""
+    remaining = list(range(len(word_sets)))
+    redundancy = [0.0] * len(word_sets)   # max similarity to anything already picked
+    order = []
+    while remaining:
+        best = max(remaining, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy[i])
+        remaining.remove(best)
+        order.append(best)
+        for i in remaining:
+            redundancy[i] = max(redundancy[i], jaccard(word_sets[i], word_sets[best]))
+    return order
+
+
+def build_context(candidates, budget=None, max_chunks=None, mmr_lambda=CONTEXT_MMR_LAMBDA,
+                  dedup_threshold=CONTEXT_DEDUP_THRESHOLD):
+    """Pick and join candidate rows (best first, each with 'content') into a prompt context.
+
+    Returns (context, selected_rows, report) where report counts the tokens
+    of the context against the baseline of joining the top max_chunks
+    candidates as they came back from retrieval.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    max_chunks = max_chunks or CONTEXT_MAX_CHUNKS
+
+    baseline = SEPARATOR.join(row["content"] for row in candidates[:max_chunks])
+
+    # 1. Drop duplicates, keeping the better-ranked copy
+    kept, word_sets, duplicates = [], [], 0
+    for row in candidates:
+        words = set(tokenize(row["content"]))
+        if any(jaccard(words, other) >= dedup_threshold for other in word_sets) or not row["content"].strip():
+            duplicates += 1
+            continue
+        kept.append(row)
+        word_sets.append(words)
+
+    # 2. Diversify; rank 0 has relevance 1, the last candidate close to 0
+    relevance = [1.0 - rank / len(kept) for rank in range(len(kept))]
+    order = mmr_order(word_sets, relevance, mmr_lambda)
+
+    # 3. Fill the token budget
+    selected, parts, used = [], [], 0
+    separator_tokens = count_tokens(SEPARATOR)
+    for i in order:
+        if len(selected) == max_chunks:
+            break
+        content = kept[i]["content"]
+        tokens = count_tokens(content) + (separator_tokens if parts else 0)
+        if used + tokens > budget:
+            if selected:
+                continue
+            content = truncate_to_tokens(content, budget)
+            tokens = count_tokens(content)
+        selected.append(kept[i])
+        parts.append(content)
+        used += tokens
+
+    context = SEPARATOR.join(parts)
+    baseline_tokens = count_tokens(baseline)
+    context_tokens = count_tokens(context)
+    report = {
+        "candidates": len(candidates),
+        "duplicates_dropped": duplicates,
+        "chunks_used": len(selected),
+        "baseline_tokens": baseline_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": baseline_tokens - context_tokens,
+        "token_budget": budget,
+    }
+    _stats.record(report)
+    return context, selected, report
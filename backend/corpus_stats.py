@@ -0,0 +1,58 @@
+"""
+Cached corpus statistics.
+
+pdf_corpus_stats (chunk count per document) and pdf_corpus_version (total
+chunks and a version number bumped on every ingestion or deletion) are kept
+up to date by triggers on pdf_chunks. Readers go through a short in-process
+TTL cache, so the query path costs at most one small read every
+CORPUS_STATS_TTL seconds instead of a COUNT over the whole table.
+"""
+import os
+import threading
+import time
+from db import get_supabase_client
+
+CORPUS_STATS_TTL = float(os.getenv("CORPUS_STATS_TTL", "5"))
+
+_stats = None
+_fetched_at = 0.0
+_lock = threading.Lock()
+
+
+def _fetch_corpus_stats(supabase):
+    version_response = supabase.table('pdf_corpus_version').select('version, total_chunks, updated_at').limit(1).execute()
+    if not version_response.data:
+        raise RuntimeError("pdf_corpus_version has no row; run setup_database.sql")
+    version_row = version_response.data[0]
+    documents_response = supabase.table('pdf_corpus_stats').select('source, chunk_count').execute()
+    return {
+        "version": version_row['version'],
+        "total_chunks": version_row['total_chunks'],
+        "updated_at": version_row['updated_at'],
+        "documents": {row['source']: row['chunk_count'] for row in documents_response.data or []},
+    }
+
+
+def get_corpus_stats(supabase=None, max_age=None):
+    """Return {'version', 'total_chunks', 'updated_at', 'documents'}, or None if unavailable"""
+    global _stats, _fetched_at
+    max_age = CORPUS_STATS_TTL if max_age is None else max_age
+    with _lock:
+        if _stats is not None and time.monotonic() - _fetched_at <= max_age:
+            return _stats
+    try:
+        stats = _fetch_corpus_stats(supabase or get_supabase_client())
+    except Exception as e:
+        print(f"⚠️ Could not read corpus statistics: {e}")
+        return None
+    with _lock:
+        _stats = stats
+        _fetched_at = time.monotonic()
+    return stats
+
+
+def invalidate_corpus_stats():
+    """Drop the cached statistics after this process changes the corpus"""
+    global _stats
+    with _lock:
+        _stats = None
@@ -0,0 +1,136 @@
+"""
+Shared, pooled Supabase clients.
+
+create_client() builds fresh HTTP sessions every time it is called, so each
+upload, query and health check used to pay a new TCP/TLS handshake. This
+module keeps one client per process whose PostgREST session is an httpx
+connection pool with keep-alive, plus an async PostgREST client for use
+inside FastAPI handlers.
+"""
+import asyncio
+import os
+import threading
+import httpx
+from dotenv import load_dotenv
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+from postgrest.utils import SyncClient
+from supabase import Client
+from supabase.lib.client_options import ClientOptions
+
+load_dotenv()
+
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "60"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "true").lower() == "true" and _http2_available()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=SUPABASE_POOL_SIZE,
+        max_keepalive_connections=SUPABASE_POOL_SIZE,
+        keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout():
+    return httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT)
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    """PostgREST client whose session is a bounded keep-alive connection pool"""
+
+    def create_session(self, base_url, headers, timeout):
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=_limits(),
+            http2=SUPABASE_HTTP2
+        )
+
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client sharing the same pool settings"""
+
+    def create_session(self, base_url, headers, timeout):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=_limits(),
+            http2=SUPABASE_HTTP2
+        )
+
+
+class PooledSupabaseClient(Client):
+    """Supabase client that builds its PostgREST client on a pooled session"""
+
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=None):
+        return PooledPostgrestClient(rest_url, headers=headers, schema=schema, timeout=timeout)
+
+
+def _credentials():
+    return os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY")
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_client_loop = None
+
+
+def get_supabase_client():
+    """Return the process-wide Supabase client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                url, key = _credentials()
+                _client = PooledSupabaseClient(url, key, ClientOptions(postgrest_client_timeout=_timeout()))
+                print(f"🔌 Created pooled Supabase client (pool size {SUPABASE_POOL_SIZE}, "
+                      f"http2={'on' if SUPABASE_HTTP2 else 'off'})")
+    return _client
+
+
+def get_async_postgrest_client():
+    """Return the async PostgREST client for the running event loop"""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    # httpx async pools are bound to the loop that created them
+    if _async_client is None or _async_client_loop is not loop:
+        url, key = _credentials()
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set")
+        _async_client = PooledAsyncPostgrestClient(
+            f"{url}/rest/v1",
+            headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+            timeout=_timeout()
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_clients():
+    """Close pooled connections on shutdown"""
+    global _client, _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+        _async_client_loop = None
+    with _client_lock:
+        if _client is not None and _client._postgrest is not None:
+            _client._postgrest.session.close()
+        _client = None
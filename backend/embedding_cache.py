@@ -0,0 +1,239 @@
+"""
+Persistent embedding cache shared by the ingestion and query paths.
+
+Embeddings are stored in a local SQLite file keyed by a hash of the model
+name and the normalized text, so re-uploads and repeated questions skip the
+embeddings API entirely. The cache is capped at EMBEDDING_CACHE_MAX_ENTRIES
+rows and evicts the least recently used entries beyond that. The entry count
+is kept in the file by triggers, so worker processes sharing the file all
+enforce the cap against the same number. Lookups only refresh an entry's
+last use once it is EMBEDDING_CACHE_TOUCH_SECONDS old, in one UPDATE per
+call, so repeated hits rarely take SQLite's write lock.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings.sqlite3")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+# Recency granularity of the LRU: a hit on an entry used more recently than this writes nothing
+EMBEDDING_CACHE_TOUCH_SECONDS = float(os.getenv("EMBEDDING_CACHE_TOUCH_SECONDS", "300"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normalize unicode and whitespace so trivially different inputs share an entry"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embedding vectors"""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                 touch_seconds=EMBEDDING_CACHE_TOUCH_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_seconds = touch_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used)")
+        # Single-row entry count maintained by triggers; created and backfilled
+        # in one transaction so a concurrent writer cannot slip in between
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_count (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    entries INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO embedding_count (id, entries) SELECT 0, COUNT(*) FROM embeddings"
+            )
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_count_insert AFTER INSERT ON embeddings
+                BEGIN UPDATE embedding_count SET entries = entries + 1; END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_count_delete AFTER DELETE ON embeddings
+                BEGIN UPDATE embedding_count SET entries = entries - 1; END
+            """)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def get_many(self, model, texts):
+        """Return cached embeddings in input order, None for misses"""
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        stale = []   # found keys whose last use is old enough to refresh
+        now = time.time()
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    found[key] = array("f", blob).tolist()
+                    if now - last_used >= self.touch_seconds:
+                        stale.append(key)
+            if stale:
+                self._touch(stale, now)
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for result in results if result is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def _touch(self, keys, now):
+        """Refresh last_used in one transaction; skipped if the file stays locked by another writer"""
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            # Busy: recency is approximate anyway, the next hit refreshes it
+            return
+        try:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                                   [now, *batch])
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def put_many(self, model, texts, embeddings):
+        """Store embeddings, evicting least recently used entries over the cap"""
+        now = time.time()
+        rows = {cache_key(model, text): array("f", embedding).tobytes()
+                for text, embedding in zip(texts, embeddings)}
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so the count read below
+            # includes every other process's inserts
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, model, embedding, last_used) VALUES (?, ?, ?, ?)",
+                    [(key, model, blob, now) for key, blob in rows.items()]
+                )
+                excess = self._count() - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                    )
+                    self.evictions += excess
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _count(self):
+        return self._conn.execute("SELECT entries FROM embedding_count").fetchone()[0]
+
+    def count(self):
+        """Entries in the cache file, across all processes using it"""
+        with self._lock:
+            return self._count()
+
+    def get_or_compute(self, model, texts, compute):
+        """Return embeddings for texts, calling compute(missing_texts) only for misses"""
+        texts = list(texts)
+        results = self.get_many(model, texts)
+        missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+            self.put_many(model, missing, [computed[text] for text in missing])
+            results = [computed[text] if result is None else result
+                       for text, result in zip(texts, results)]
+        return results
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.count(),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Return the process-wide cache, or None when caching is disabled or unavailable"""
+    global _cache, _cache_failed
+    if not EMBEDDING_CACHE_ENABLED or _cache_failed:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = EmbeddingCache()
+                print(f"🗃️ Embedding cache ready at {EMBEDDING_CACHE_PATH} ({_cache.count()} entries)")
+            except Exception as e:
+                print(f"⚠️ Embedding cache unavailable, continuing without it: {e}")
+                _cache_failed = True
+        return _cache
+
+
+def cached_embeddings(model, texts, compute):
+    """Embed texts through the shared cache when it is available"""
+    cache = get_embedding_cache()
+    if cache is None:
+        return compute(list(texts))
+    return cache.get_or_compute(model, texts, compute)
+
+
+def lookup_cached_embeddings(model, texts):
+    """Cached embeddings in input order, None for misses; nothing is computed"""
+    cache = get_embedding_cache()
+    if cache is None:
+        return [None] * len(texts)
+    return cache.get_many(model, texts)
+
+
+def store_cached_embeddings(model, texts, embeddings):
+    cache = get_embedding_cache()
+    if cache is not None:
+        cache.put_many(model, texts, embeddings)
@@ -0,0 +1,221 @@
+"""
+Embedding providers.
+
+EMBEDDING_PROVIDER selects where embeddings come from:
+    openai  text-embedding-ada-002 through the OpenAI API (1536 dimensions)
+    local   a sentence-transformers model loaded once per process and run
+            on CPU (all-MiniLM-L6-v2 by default, 384 dimensions)
+
+Every provider goes through the shared embedding cache, and the provider's
+dimension is checked against the pdf_chunks.embedding vector(N) column at
+startup so a mismatched configuration fails fast instead of at insert time.
+"""
+import os
+import threading
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from embedding_cache import cached_embeddings, lookup_cached_embeddings, store_cached_embeddings
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+# 0 leaves torch's default thread count alone
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+OPENAI_MODEL_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class EmbeddingDimensionError(Exception):
+    """Raised when the provider dimension does not match the database column"""
+
+
+class EmbeddingProvider:
+    """Interface for turning texts into embedding vectors"""
+
+    name = None
+
+    def __init__(self, model):
+        self.model = model
+
+    @property
+    def cache_namespace(self):
+        return f"{self.name}:{self.model}"
+
+    @property
+    def dimension(self):
+        raise NotImplementedError
+
+    @property
+    def loaded(self):
+        return True
+
+    def warm(self):
+        """Prepare the provider so the first request does not pay start-up costs"""
+
+    def embed(self, texts):
+        """Embed a list of texts, returning one list of floats per text"""
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = "openai"
+
+    def __init__(self, model=OPENAI_EMBEDDING_MODEL):
+        super().__init__(model)
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+
+    @property
+    def dimension(self):
+        return int(os.getenv("EMBEDDING_DIMENSION", OPENAI_MODEL_DIMENSIONS.get(self.model, 1536)))
+
+    def embed(self, texts):
+        response = openai.Embedding.create(
+            input=texts,
+            model=self.model
+        )
+        # The API may return items out of order, so sort on the index it reports
+        data = sorted(response['data'], key=lambda item: item['index'])
+        return [item['embedding'] for item in data]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """sentence-transformers model kept in memory for the life of the process"""
+
+    name = "local"
+
+    def __init__(self, model=LOCAL_EMBEDDING_MODEL, batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+                 threads=EMBEDDING_THREADS):
+        super().__init__(model)
+        self.batch_size = batch_size
+        self.threads = threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def _load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError:
+                        raise RuntimeError(
+                            "EMBEDDING_PROVIDER=local requires the sentence-transformers package"
+                        )
+                    if self.threads > 0:
+                        import torch
+                        torch.set_num_threads(self.threads)
+                    print(f"🧠 Loading local embedding model {self.model}...")
+                    self._model = SentenceTransformer(self.model, device="cpu")
+        return self._model
+
+    @property
+    def dimension(self):
+        return self._load().get_sentence_embedding_dimension()
+
+    def warm(self):
+        # Run one encode so lazy initialisation happens before the first request
+        self._load().encode(["warm up"], show_progress_bar=False)
+        print(f"✅ Local embedding model {self.model} ready ({self.dimension} dimensions)")
+
+    def embed(self, texts):
+        vectors = self._load().encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+
+PROVIDERS = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    LocalEmbeddingProvider.name: LocalEmbeddingProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_embedding_provider():
+    """Return the process-wide provider selected by EMBEDDING_PROVIDER"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                if EMBEDDING_PROVIDER not in PROVIDERS:
+                    raise ValueError(
+                        f"Unknown EMBEDDING_PROVIDER '{EMBEDDING_PROVIDER}', expected one of {list(PROVIDERS)}"
+                    )
+                _provider = PROVIDERS[EMBEDDING_PROVIDER]()
+    return _provider
+
+
+def embed_texts(texts):
+    """Embed a list of texts with the configured provider, through the cache"""
+    provider = get_embedding_provider()
+    return cached_embeddings(provider.cache_namespace, texts, provider.embed)
+
+
+def embed_text(text):
+    return embed_texts([text])[0]
+
+
+def lookup_embeddings(texts):
+    """Embeddings of texts already in the cache, None for the rest; the provider is not called"""
+    provider = get_embedding_provider()
+    return lookup_cached_embeddings(provider.cache_namespace, texts)
+
+
+def embed_uncached(texts):
+    """Embed texts that lookup_embeddings missed and add them to the cache"""
+    provider = get_embedding_provider()
+    embeddings = provider.embed(list(texts))
+    store_cached_embeddings(provider.cache_namespace, texts, embeddings)
+    return embeddings
+
+
+def get_column_dimension(supabase):
+    """Return N for the pdf_chunks.embedding vector(N) column, or None if unknown"""
+    try:
+        response = supabase.rpc('pdf_chunks_embedding_dimension', {}).execute()
+        if response.data:
+            return int(response.data)
+    except Exception as e:
+        print(f"⚠️ Could not read embedding column type, sampling a row instead: {e}")
+
+    # Older schemas without the helper function: infer from a stored vector
+    response = supabase.table('pdf_chunks').select('embedding').limit(1).execute()
+    if response.data:
+        embedding = response.data[0]['embedding']
+        if isinstance(embedding, str):
+            return len(embedding.strip('[]').split(','))
+        return len(embedding)
+    return None
+
+
+def verify_embedding_dimension(supabase):
+    """Check the provider against the database column, raising on a mismatch"""
+    provider = get_embedding_provider()
+    column_dimension = get_column_dimension(supabase)
+    if column_dimension is None:
+        print("⚠️ Could not determine the pdf_chunks.embedding dimension; skipping check")
+        return None
+    if column_dimension != provider.dimension:
+        raise EmbeddingDimensionError(
+            f"EMBEDDING_PROVIDER={provider.name} ({provider.model}) produces {provider.dimension}-dimensional "
+            f"embeddings but pdf_chunks.embedding is vector({column_dimension})"
+        )
+    print(f"✅ Embedding dimension {column_dimension} matches pdf_chunks.embedding")
+    return column_dimension
@@ -0,0 +1,154 @@
+"""
+Grounding scores for generated answers.
+
+Every answer sentence is scored by how much of it is supported by the
+chunks that were in the prompt:
+
+    token coverage   share of the sentence's content words found in the chunks
+    bigram coverage  share of its consecutive content-word pairs found there,
+                     which separates a restatement from the same words in a
+                     different order
+    similarity       optional (GROUNDING_EMBEDDINGS=true): best cosine
+                     similarity between the sentence embedding and a chunk
+                     embedding, which also credits paraphrases
+
+Chunk word and bigram sets are built once, when chunks are ingested or the
+first time they are retrieved, and kept in a bounded LRU keyed by chunk id,
+so scoring an answer only tokenizes the answer and does set lookups: its
+cost grows with the answer length, not the size of the context.
+"""
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from chunking import SENTENCE_END_PATTERN
+from lexical_index import tokenize
+
+GROUNDING_MIN_SUPPORT = float(os.getenv("GROUNDING_MIN_SUPPORT", "0.5"))
+GROUNDING_BIGRAM_WEIGHT = float(os.getenv("GROUNDING_BIGRAM_WEIGHT", "0.5"))
+GROUNDING_EMBEDDINGS = os.getenv("GROUNDING_EMBEDDINGS", "false").lower() == "true"
+GROUNDING_MIN_SIMILARITY = float(os.getenv("GROUNDING_MIN_SIMILARITY", "0.6"))
+GROUNDING_CACHE_SIZE = int(os.getenv("GROUNDING_CACHE_SIZE", "5000"))
+
+
+def split_sentences(text):
+    """Split text at sentence ends and blank lines, dropping empty pieces"""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+
+class ChunkFeatures:
+    """Content-word and content-bigram sets of one chunk"""
+
+    __slots__ = ("words", "bigrams")
+
+    def __init__(self, text):
+        tokens = tokenize(text)
+        self.words = frozenset(tokens)
+        self.bigrams = frozenset(zip(tokens, tokens[1:]))
+
+
+class GroundingIndex:
+    """LRU of per-chunk features plus answer scoring against them"""
+
+    def __init__(self, max_chunks=GROUNDING_CACHE_SIZE):
+        self.max_chunks = max_chunks
+        self._features = OrderedDict()   # chunk id (or content) -> ChunkFeatures
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(row):
+        return row.get("id", row["content"])
+
+    def add(self, rows):
+        """Precompute features for chunk rows ({'id', 'content'}), e.g. right after ingestion"""
+        for row in rows:
+            self.features(row)
+
+    def remove(self, chunk_ids):
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._features.pop(chunk_id, None)
+
+    def features(self, row):
+        key = self._key(row)
+        with self._lock:
+            features = self._features.get(key)
+            if features is not None:
+                self._features.move_to_end(key)
+                return features
+        features = ChunkFeatures(row["content"])
+        with self._lock:
+            self._features[key] = features
+            while len(self._features) > self.max_chunks:
+                self._features.popitem(last=False)
+        return features
+
+    def score_answer(self, answer, rows, use_embeddings=GROUNDING_EMBEDDINGS):
+        """Per-sentence support of answer by the context rows.
+
+        Returns {'sentences': [{'sentence', 'token_coverage', 'bigram_coverage',
+        'support', 'similarity', 'best_chunk', 'supported'}], 'supported_ratio',
+        'mean_support'}. support blends token and bigram coverage; best_chunk
+        is the position in rows of the chunk that covers the sentence most.
+        """
+        chunk_features = [self.features(row) for row in rows]
+        sentences = split_sentences(answer)
+        similarities = self._similarities(sentences, rows) if use_embeddings and rows else None
+
+        scored = []
+        for position, sentence in enumerate(sentences):
+            tokens = tokenize(sentence)
+            if not tokens:
+                continue
+            bigrams = list(zip(tokens, tokens[1:]))
+            token_hits = [sum(token in features.words for token in tokens) for features in chunk_features]
+            covered_tokens = sum(any(token in features.words for features in chunk_features) for token in tokens)
+            token_coverage = covered_tokens / len(tokens)
+            if bigrams:
+                covered_bigrams = sum(any(bigram in features.bigrams for features in chunk_features)
+                                      for bigram in bigrams)
+                bigram_coverage = covered_bigrams / len(bigrams)
+                support = (1 - GROUNDING_BIGRAM_WEIGHT) * token_coverage + GROUNDING_BIGRAM_WEIGHT * bigram_coverage
+            else:
+                bigram_coverage = None
+                support = token_coverage
+            similarity = float(similarities[position]) if similarities is not None else None
+            scored.append({
+                "sentence": sentence,
+                "token_coverage": round(token_coverage, 3),
+                "bigram_coverage": round(bigram_coverage, 3) if bigram_coverage is not None else None,
+                "support": round(support, 3),
+                "similarity": round(similarity, 3) if similarity is not None else None,
+                "best_chunk": max(range(len(rows)), key=token_hits.__getitem__) if rows else None,
+                "supported": support >= GROUNDING_MIN_SUPPORT or (
+                    similarity is not None and similarity >= GROUNDING_MIN_SIMILARITY),
+            })
+
+        return {
+            "sentences": scored,
+            "supported_ratio": round(sum(s["supported"] for s in scored) / len(scored), 3) if scored else 1.0,
+            "mean_support": round(sum(s["support"] for s in scored) / len(scored), 3) if scored else 1.0,
+        }
+
+    def _similarities(self, sentences, rows):
+        """Best cosine similarity of each sentence to any chunk"""
+        from embeddings import embed_texts
+        # Chunk texts were embedded at ingest, so these come from the embedding cache
+        vectors = np.asarray(embed_texts(sentences + [row["content"] for row in rows]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        sentence_vectors, chunk_vectors = vectors[:len(sentences)], vectors[len(sentences):]
+        return (sentence_vectors @ chunk_vectors.T).max(axis=1)
+
+
+_index = GroundingIndex()
+
+
+def get_grounding_index():
+    """Return the process-wide grounding index"""
+    return _index
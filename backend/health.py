@@ -0,0 +1,203 @@
+"""
+Cached dependency health checks.
+
+A background HealthProber refreshes database latency, an estimated row count
+and the embedding model status every HEALTH_PROBE_INTERVAL seconds. Health
+endpoints read the latest snapshot, so load balancer probes never touch the
+database or the model themselves. Where no background thread runs, a stale
+snapshot is served while one refresh runs on a worker thread.
+"""
+import asyncio
+import copy
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from corpus_stats import get_corpus_stats
+from admission import admission_stats
+from embedding_cache import get_embedding_cache
+from answer_cache import get_answer_cache
+from context_builder import get_context_stats
+from reranker import get_reranker
+from sessions import get_session_store
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+# Longest a request waits for the very first probe before reporting "unknown"
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+# A snapshot older than this many intervals means the prober has stalled
+HEALTH_STALE_INTERVALS = 3
+
+REQUIRED_ENV_VARS = ["SUPABASE_URL", "SUPABASE_ANON_KEY", "GROQ_API_KEY"]
+
+
+class HealthProber:
+    """Refreshes a health snapshot in the background (or lazily when not started)"""
+
+    def __init__(self, get_client, get_provider, interval=HEALTH_PROBE_INTERVAL):
+        self.get_client = get_client
+        self.get_provider = get_provider
+        self.interval = interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pending = None   # Future of the on-demand refresh, if one was started
+
+    def start(self):
+        """Start the background refresh loop (idempotent)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Health probe failed: {e}")
+            self._stop.wait(self.interval)
+
+    def refresh(self):
+        """Probe every dependency once and store the result"""
+        snapshot = {
+            "status": "healthy",
+            "timestamp": datetime.utcnow().isoformat(),
+            "server": "online",
+            "database": "unknown",
+            "embedding_model": "unknown",
+            "errors": []
+        }
+
+        # Database latency and row counts from the trigger-maintained corpus
+        # statistics, falling back to the planner's estimate
+        try:
+            supabase = self.get_client()
+            start_time = time.time()
+            response = supabase.table('pdf_chunks').select('id', count='estimated').limit(1).execute()
+            snapshot["database"] = "connected"
+            snapshot["db_response_time_ms"] = round((time.time() - start_time) * 1000, 2)
+            corpus_stats = get_corpus_stats(supabase, max_age=0)
+            if corpus_stats is not None:
+                snapshot["pdf_chunks_count"] = corpus_stats["total_chunks"]
+                snapshot["pdf_documents_count"] = len(corpus_stats["documents"])
+                snapshot["corpus_version"] = corpus_stats["version"]
+            else:
+                snapshot["pdf_chunks_count"] = response.count or 0
+                snapshot["pdf_chunks_count_is_estimate"] = True
+        except Exception as e:
+            snapshot["status"] = "degraded"
+            snapshot["database"] = "error"
+            snapshot["errors"].append(f"Database error: {str(e)}")
+
+        # The local model is loaded once at startup; only report its state here
+        try:
+            provider = self.get_provider()
+            snapshot["embedding_provider"] = provider.name
+            snapshot["embedding_model_name"] = provider.model
+            if provider.loaded:
+                snapshot["embedding_model"] = "loaded"
+                snapshot["embedding_dimensions"] = provider.dimension
+            else:
+                snapshot["embedding_model"] = "not loaded"
+        except Exception as e:
+            snapshot["status"] = "degraded"
+            snapshot["embedding_model"] = "error"
+            snapshot["errors"].append(f"Embedding model error: {str(e)}")
+
+        missing_vars = [var for var in REQUIRED_ENV_VARS if not os.getenv(var)]
+        if missing_vars:
+            snapshot["status"] = "degraded"
+            snapshot["errors"].append(f"Missing environment variables: {missing_vars}")
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def _refresh_in_background(self):
+        """Start one refresh on a daemon thread unless one is already running"""
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                pending = Future()
+
+                def run():
+                    try:
+                        pending.set_result(self.refresh())
+                    except BaseException as e:
+                        pending.set_exception(e)
+
+                threading.Thread(target=run, name="health-refresh", daemon=True).start()
+                self._pending = pending
+            return self._pending
+
+    async def snapshot(self):
+        """Return a copy of the latest snapshot with its age.
+
+        Without a background thread (e.g. on serverless platforms) a stale
+        snapshot starts a refresh on a worker thread and is returned as is,
+        so a slow database never holds up the request. Only when there is no
+        snapshot yet does the request wait, for at most HEALTH_PROBE_TIMEOUT.
+        """
+        with self._lock:
+            missing = self._snapshot is None
+            stale = missing or time.monotonic() - self._checked_at > self.interval
+        if stale and (self._thread is None or missing):
+            pending = self._refresh_in_background()
+            if missing:
+                try:
+                    await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending)), HEALTH_PROBE_TIMEOUT)
+                except Exception as e:
+                    print(f"⚠️ First health probe did not finish: {e!r}")
+        with self._lock:
+            if self._snapshot is None:
+                return {
+                    "status": "degraded",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "server": "online",
+                    "database": "unknown",
+                    "embedding_model": "unknown",
+                    "errors": ["Health probe has not completed yet"],
+                    "snapshot_age_seconds": None,
+                    "stale": True
+                }
+            snapshot = copy.deepcopy(self._snapshot)
+            age = time.monotonic() - self._checked_at
+        snapshot["snapshot_age_seconds"] = round(age, 2)
+        snapshot["stale"] = age > self.interval * HEALTH_STALE_INTERVALS
+        if snapshot["stale"]:
+            snapshot["status"] = "degraded"
+            snapshot["errors"].append(f"Health snapshot is stale ({age:.0f}s old)")
+        return snapshot
+
+    async def report(self):
+        """The /health payload: the latest snapshot plus cache, reranker, context, session and admission stats"""
+        health_status = await self.snapshot()
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            health_status["embedding_cache"] = embedding_cache.stats()
+        answer_cache = get_answer_cache()
+        if answer_cache is not None:
+            health_status["answer_cache"] = answer_cache.stats()
+        reranker = get_reranker()
+        if reranker is not None:
+            health_status["reranker"] = reranker.stats()
+        # Tokens the context builder kept out of prompts since startup
+        health_status["context"] = get_context_stats().stats()
+        health_status["sessions"] = get_session_store().stats()
+        # Queue depth and wait times per stage
+        health_status["admission"] = admission_stats()
+        return health_status
+
+    async def ready(self):
+        """Return (is_ready, snapshot) for readiness probes"""
+        snapshot = await self.snapshot()
+        is_ready = (snapshot["database"] == "connected"
+                    and snapshot["embedding_model"] != "error"
+                    and not snapshot["stale"])
+        return is_ready, snapshot
@@ -0,0 +1,287 @@
+"""
+Hierarchical navigable small world (HNSW) graph for approximate cosine search.
+
+The graph only stores neighbour lists; vectors stay in the caller's
+(memory-mapped) matrix of L2-normalised rows, so similarity is a dot
+product. Rows are inserted incrementally in order, and the graph is saved
+as a single .npz file.
+
+When the hnswlib package is installed, create_hnsw_index and
+load_hnsw_index return NativeHNSWIndex instead: the same interface over
+hnswlib's C++ graph (pinned in requirements-hnsw.txt), which builds more
+than ten times faster on a single core and is saved as a .bin file.
+
+    M                maximum neighbours per node on upper layers (2*M on layer 0)
+    ef_construction  candidate list size while inserting; higher builds a better graph
+    ef_search        candidate list size while querying; higher trades latency for recall
+"""
+import heapq
+import math
+import os
+import pickle
+import random
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # optional: fall back to the pure-Python graph
+    hnswlib = None
+
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+
+class HNSWIndex:
+    """HNSW graph over rows 0..n-1 of a normalised float32 matrix"""
+
+    suffix = ".npz"
+
+    def __init__(self, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH, seed=42):
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_multiplier = 1 / math.log(m)
+        self.vectors = None
+        self.levels = []       # row -> top layer of that node
+        self.layers = []       # layer -> {row: [neighbour rows]}
+        self.entry_point = None
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def _similarities(self, query, rows):
+        return self.vectors[rows] @ query
+
+    def _search_layer(self, query, entry_points, ef, layer):
+        """Greedy best-first search of one layer, returning up to ef (similarity, row) pairs"""
+        graph = self.layers[layer]
+        visited = set(entry_points)
+        entry_similarities = self._similarities(query, entry_points)
+        candidates = [(-similarity, row) for similarity, row in zip(entry_similarities.tolist(), entry_points)]
+        heapq.heapify(candidates)
+        results = [(similarity, row) for similarity, row in zip(entry_similarities.tolist(), entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_similarity, row = heapq.heappop(candidates)
+            if -negative_similarity < results[0][0] and len(results) >= ef:
+                break
+            neighbours = [neighbour for neighbour in graph.get(row, ()) if neighbour not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+            for similarity, neighbour in zip(self._similarities(query, neighbours).tolist(), neighbours):
+                if len(results) < ef or similarity > results[0][0]:
+                    heapq.heappush(candidates, (-similarity, neighbour))
+                    heapq.heappush(results, (similarity, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select_neighbours(self, candidates, limit):
+        """Keep candidates that are closer to the new node than to any kept neighbour.
+
+        This spreads edges across directions instead of linking only to one
+        tight cluster, which is what keeps recall high on clustered data.
+        """
+        rows = [row for _, row in candidates]
+        vectors = self.vectors[rows]
+        pairwise = (vectors @ vectors.T).tolist()
+        selected = []
+        for i, (similarity, row) in enumerate(candidates):
+            if len(selected) == limit:
+                break
+            if any(pairwise[i][j] > similarity for j in selected):
+                continue
+            selected.append(i)
+        selected = [rows[i] for i in selected]
+        if len(selected) < limit:
+            # Top up with the nearest rejected candidates
+            chosen = set(selected)
+            for _, row in candidates:
+                if len(selected) == limit:
+                    break
+                if row not in chosen:
+                    selected.append(row)
+        return selected
+
+    def add(self, vectors, count):
+        """Insert rows len(self)..count-1 of vectors (the full matrix, which may have grown)"""
+        # A plain ndarray view of a memmap avoids the subclass overhead on every gather
+        self.vectors = np.asarray(vectors)
+        for row in range(len(self.levels), count):
+            self._insert(row)
+
+    def _insert(self, row):
+        query = self.vectors[row]
+        level = int(-math.log(1.0 - self._random.random()) * self.level_multiplier)
+        self.levels.append(level)
+        while len(self.layers) <= level:
+            self.layers.append({})
+        for layer in range(level + 1):
+            self.layers[layer][row] = []
+
+        if self.entry_point is None:
+            self.entry_point = row
+            return
+
+        entry_points = [self.entry_point]
+        top_level = self.levels[self.entry_point]
+        for layer in range(top_level, level, -1):
+            entry_points = [self._search_layer(query, entry_points, 1, layer)[0][1]]
+
+        for layer in range(min(level, top_level), -1, -1):
+            candidates = self._search_layer(query, entry_points, self.ef_construction, layer)
+            limit = self.m0 if layer == 0 else self.m
+            neighbours = self._select_neighbours(candidates, self.m)
+            graph = self.layers[layer]
+            graph[row] = neighbours
+            for neighbour in neighbours:
+                links = graph[neighbour]
+                links.append(row)
+                if len(links) > limit:
+                    similarities = self._similarities(self.vectors[neighbour], links)
+                    ranked = sorted(zip(similarities.tolist(), links), reverse=True)
+                    graph[neighbour] = self._select_neighbours(ranked, limit)
+            entry_points = [candidate for _, candidate in candidates]
+
+        if level > top_level:
+            self.entry_point = row
+
+    def search(self, query, k, ef=None):
+        """Return up to k (similarity, row) pairs for a normalised query, best first"""
+        if self.entry_point is None or k <= 0:
+            return []
+        ef = max(ef or self.ef_search, k)
+        entry_points = [self.entry_point]
+        for layer in range(self.levels[self.entry_point], 0, -1):
+            entry_points = [self._search_layer(query, entry_points, 1, layer)[0][1]]
+        return self._search_layer(query, entry_points, ef, 0)[:k]
+
+    def copy(self):
+        """Independent copy of the graph (sharing the vectors), so inserts can go on while it is searched"""
+        index = HNSWIndex(m=self.m, ef_construction=self.ef_construction, ef_search=self.ef_search)
+        index.vectors = self.vectors
+        index.levels = list(self.levels)
+        index.layers = [{row: list(links) for row, links in graph.items()} for graph in self.layers]
+        index.entry_point = self.entry_point
+        index._random.setstate(self._random.getstate())
+        return index
+
+    def save(self, path):
+        """Write the graph atomically as flat numpy arrays"""
+        arrays = {
+            "params": np.array([self.m, self.ef_construction,
+                                -1 if self.entry_point is None else self.entry_point], dtype=np.int64),
+            "levels": np.array(self.levels, dtype=np.int8),
+        }
+        for layer, graph in enumerate(self.layers):
+            rows = sorted(graph)
+            arrays[f"rows_{layer}"] = np.array(rows, dtype=np.int64)
+            arrays[f"offsets_{layer}"] = np.cumsum([0] + [len(graph[row]) for row in rows]).astype(np.int64)
+            arrays[f"links_{layer}"] = np.array([link for row in rows for link in graph[row]], dtype=np.int64)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, vectors=None, ef_search=HNSW_EF_SEARCH):
+        """Load a saved graph; ef_search is a query-time setting and is not stored"""
+        data = np.load(path)
+        m, ef_construction, entry_point = data["params"].tolist()
+        index = cls(m=m, ef_construction=ef_construction, ef_search=ef_search)
+        index.levels = data["levels"].tolist()
+        index.entry_point = None if entry_point < 0 else entry_point
+        layer = 0
+        while f"rows_{layer}" in data:
+            rows = data[f"rows_{layer}"].tolist()
+            offsets = data[f"offsets_{layer}"].tolist()
+            links = data[f"links_{layer}"].tolist()
+            index.layers.append({row: links[offsets[i]:offsets[i + 1]] for i, row in enumerate(rows)})
+            layer += 1
+        index.vectors = vectors
+        return index
+
+
+class NativeHNSWIndex:
+    """hnswlib graph with the HNSWIndex interface; labels are matrix rows"""
+
+    suffix = ".bin"
+
+    def __init__(self, dimension, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH,
+                 seed=42, capacity=1024):
+        self.dimension = dimension
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.vectors = None   # unused: hnswlib keeps its own copy of the vectors
+        self._index = hnswlib.Index(space="ip", dim=dimension)
+        self._index.init_index(max_elements=capacity, ef_construction=ef_construction, M=m, random_seed=seed)
+
+    def __len__(self):
+        return self._index.get_current_count()
+
+    def add(self, vectors, count):
+        """Insert rows len(self)..count-1 of vectors (the full matrix, which may have grown)"""
+        start = len(self)
+        if count <= start:
+            return
+        capacity = self._index.get_max_elements()
+        if count > capacity:
+            self._index.resize_index(max(count, 2 * capacity))
+        self._index.add_items(np.ascontiguousarray(vectors[start:count], dtype=np.float32),
+                              np.arange(start, count))
+
+    def search(self, query, k, ef=None):
+        """Return up to k (similarity, row) pairs for a normalised query, best first"""
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        self._index.set_ef(max(ef or self.ef_search, k))
+        rows, distances = self._index.knn_query(np.asarray(query, dtype=np.float32).reshape(1, -1), k=k)
+        # The inner-product space reports distance as 1 - dot product
+        return [(1.0 - float(distance), int(row)) for row, distance in zip(rows[0], distances[0])]
+
+    def copy(self):
+        index = NativeHNSWIndex.__new__(NativeHNSWIndex)
+        index.__dict__.update(self.__dict__)
+        index._index = pickle.loads(pickle.dumps(self._index))
+        return index
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        self._index.save_index(tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, dimension, ef_search=HNSW_EF_SEARCH):
+        index = cls.__new__(cls)
+        index.dimension = dimension
+        index.ef_search = ef_search
+        index.vectors = None
+        index._index = hnswlib.Index(space="ip", dim=dimension)
+        index._index.load_index(path)
+        index.m = index._index.M
+        index.ef_construction = index._index.ef_construction
+        return index
+
+
+HNSW_INDEX_CLASS = NativeHNSWIndex if hnswlib is not None else HNSWIndex
+
+
+def create_hnsw_index(dimension):
+    """Empty graph for vectors of this dimension, native when hnswlib is installed"""
+    if HNSW_INDEX_CLASS is NativeHNSWIndex:
+        return NativeHNSWIndex(dimension)
+    return HNSWIndex()
+
+
+def load_hnsw_index(path, dimension):
+    if HNSW_INDEX_CLASS is NativeHNSWIndex:
+        return NativeHNSWIndex.load(path, dimension)
+    return HNSWIndex.load(path)
@@ -0,0 +1,172 @@
+"""
+In-process ingestion job queue.
+
+Uploads are accepted immediately and processed by a bounded pool of worker
+threads so that the HTTP request does not stay open while a large PDF is
+extracted, embedded and stored.
+"""
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from admission import StageFullError, StageMetrics
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "16"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "200"))
+
+
+class QueueFullError(StageFullError):
+    """Raised when the ingestion queue cannot accept another job"""
+
+
+class IngestionJob:
+    """Progress record for a single queued upload"""
+
+    def __init__(self, filename, path, **options):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.options = options
+        self.stage = "queued"
+        self.total_chunks = 0
+        self.processed_chunks = 0
+        self.failed_chunks = 0
+        self.errors = []
+        self.result = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.queued_at = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage):
+        with self._lock:
+            self.stage = stage
+
+    def update_progress(self, processed_chunks, failed_chunks, total_chunks):
+        with self._lock:
+            self.processed_chunks = processed_chunks
+            self.failed_chunks = failed_chunks
+            self.total_chunks = total_chunks
+
+    def add_error(self, error):
+        with self._lock:
+            self.errors.append(str(error))
+
+    @property
+    def done(self):
+        return self.stage in ("completed", "failed")
+
+    def to_dict(self):
+        with self._lock:
+            elapsed = None
+            chunks_per_second = None
+            if self.started_at:
+                end = self.finished_at or datetime.utcnow()
+                elapsed = (end - self.started_at).total_seconds()
+                if elapsed > 0:
+                    chunks_per_second = round(self.processed_chunks / elapsed, 2)
+            return {
+                "job_id": self.id,
+                "filename": self.filename,
+                "stage": self.stage,
+                "chunks_done": self.processed_chunks,
+                "chunks_failed": self.failed_chunks,
+                "total_chunks": self.total_chunks,
+                "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+                "chunks_per_second": chunks_per_second,
+                "errors": list(self.errors),
+                "result": self.result,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            }
+
+
+class JobQueue:
+    """Bounded queue of ingestion jobs served by a fixed pool of worker threads"""
+
+    def __init__(self, handler, workers=INGEST_WORKERS, max_depth=INGEST_QUEUE_DEPTH,
+                 history_limit=JOB_HISTORY_LIMIT):
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.history_limit = history_limit
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._threads = []
+        self._started = False
+        # Workers are the extraction stage for uploads; report it like the other stages
+        self.metrics = StageMetrics("extraction", workers, max_depth)
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"👷 Started {self.workers} ingestion workers (queue depth {self.max_depth})")
+
+    def submit(self, job):
+        """Enqueue a job, raising QueueFullError when every worker is busy and the queue is at capacity"""
+        self.start()
+        try:
+            job.queued_at = self.metrics.admit()
+        except StageFullError as e:
+            raise QueueFullError(e.stage, e.retry_after)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.metrics.abandon()
+            with self._jobs_lock:
+                del self._jobs[job.id]
+            raise QueueFullError(self.metrics.name, self.metrics.retry_after())
+        with self._jobs_lock:
+            self._trim_history()
+        return job
+
+    def get(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return self.metrics.stats()
+
+    def _trim_history(self):
+        # Forget the oldest finished jobs once the history limit is exceeded
+        excess = len(self._jobs) - self.history_limit
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:excess]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            started = self.metrics.start(job.queued_at)
+            job.started_at = datetime.utcnow()
+            job.set_stage("processing")
+            try:
+                job.result = self.handler(job)
+                job.set_stage("completed")
+            except Exception as e:
+                print(f"❌ Ingestion job {job.id} failed: {e}")
+                job.add_error(e)
+                job.set_stage("failed")
+            finally:
+                job.finished_at = datetime.utcnow()
+                self.metrics.finish(started)
+                self._queue.task_done()
@@ -0,0 +1,327 @@
+"""
+In-process BM25 lexical index over stored chunks.
+
+The index is updated as chunks are inserted and deleted and persisted as an
+append-only log of JSON lines next to the other local caches. Each line
+records the chunks added (with their term frequencies, so nothing is
+re-tokenized on load) and the chunk ids removed by one update. Worker
+processes read only the lines appended since their last look, so picking up
+another worker's ingestion costs time in proportion to that ingestion, not
+to the corpus. Once the log holds more than twice as many records as there
+are live chunks it is rewritten as a compact snapshot, stored term by term
+so a cold load fills each postings list in one step. It answers keyword
+queries in milliseconds without touching the database, both as the fallback
+when vector search finds nothing and as the lexical half of hybrid retrieval.
+
+Usage:
+    python lexical_index.py rebuild    # index every chunk already in pdf_chunks
+"""
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+LEXICAL_INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "lexical_index.jsonl")
+)
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# The log is compacted only once it holds at least this many records
+LEXICAL_COMPACT_MIN_RECORDS = 1000
+# Chunks, and then terms, per line when writing a snapshot
+SNAPSHOT_RECORD_SIZE = 1000
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'but', 'by', 'can', 'could', 'did', 'do',
+    'does', 'for', 'from', 'had', 'has', 'have', 'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its',
+    'may', 'might', 'of', 'on', 'or', 'should', 'that', 'the', 'their', 'there', 'these', 'this',
+    'those', 'to', 'was', 'were', 'what', 'when', 'where', 'which', 'who', 'why', 'will', 'with',
+    'would', 'you', 'your'
+}
+
+
+def tokenize(text):
+    """Lowercased word tokens without stop words"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring, keyed by chunk id"""
+
+    def __init__(self, path=LEXICAL_INDEX_PATH, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)   # term -> {chunk_id: term frequency}
+        self.documents = {}                 # chunk_id -> {"content", "source", "length"}
+        self.total_length = 0
+        self._file_id = None     # (device, inode) of the log read so far
+        self._offset = 0         # bytes of that log already applied
+        self._records = 0        # chunk additions and removals in that log
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, chunk_id, content, source=None, frequencies=None):
+        """Index (or re-index) a chunk, returning its term frequencies"""
+        if frequencies is None:
+            frequencies = Counter(tokenize(content))
+        with self._lock:
+            if chunk_id in self.documents:
+                self.remove(chunk_id)
+            for term, frequency in frequencies.items():
+                self.postings[term][chunk_id] = frequency
+            length = sum(frequencies.values())
+            self.documents[chunk_id] = {"content": content, "source": source, "length": length}
+            self.total_length += length
+        return frequencies
+
+    def remove(self, chunk_id):
+        with self._lock:
+            document = self.documents.pop(chunk_id, None)
+            if document is None:
+                return
+            self.total_length -= document["length"]
+            for term in set(tokenize(document["content"])):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def search(self, query, k=5, sources=None):
+        """Return up to k (chunk_id, score) pairs, best first, optionally only from the given sources.
+
+        Only the query terms' postings are copied under the lock; scoring runs
+        outside it, so searches do not queue behind each other or a log replay.
+        """
+        with self._lock:
+            self.reload_if_changed()
+            count = len(self.documents)
+            if count == 0:
+                return []
+            average_length = self.total_length / count
+            documents = self.documents
+            term_postings = [dict(self.postings[term]) for term in set(tokenize(query)) if term in self.postings]
+        scores = defaultdict(float)
+        for postings in term_postings:
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings.items():
+                # Documents are replaced, never changed in place; one removed
+                # since the copy is skipped
+                document = documents.get(chunk_id)
+                if document is None or (sources and document["source"] not in sources):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * document["length"] / average_length)
+                scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def get(self, chunk_id):
+        with self._lock:
+            return self.documents.get(chunk_id)
+
+    def _apply(self, record):
+        for chunk_id in record.get("remove", ()):
+            self.remove(chunk_id)
+        for document in record.get("add", ()):
+            self.add(document["id"], document["content"], document.get("source"), document["terms"])
+        # Snapshot lines: documents first, then whole postings lists
+        for chunk_id, source, length, content in record.get("documents", ()):
+            self.documents[chunk_id] = {"content": content, "source": source, "length": length}
+            self.total_length += length
+        for term, (chunk_ids, frequencies) in record.get("postings", {}).items():
+            self.postings[term].update(zip(chunk_ids, frequencies))
+        self._records += (len(record.get("remove", ())) + len(record.get("add", ()))
+                          + len(record.get("documents", ())))
+
+    def _reset(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.total_length = 0
+        self._file_id = None
+        self._offset = 0
+        self._records = 0
+
+    def reload_if_changed(self):
+        """Apply the lines another worker process has appended since the last call.
+
+        A log that was replaced (compacted or rebuilt) is read from the start.
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return
+            file_id = (stat.st_dev, stat.st_ino)
+            if file_id != self._file_id or stat.st_size < self._offset:
+                self._reset()
+                self._file_id = file_id
+            if stat.st_size == self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+            # A writer may be midway through a line; leave it for the next call
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                self._apply(json.loads(line))
+            self._offset += len(complete)
+
+    def append(self, added_rows=(), removed_ids=()):
+        """Apply an update and append it to the log; the caller holds the file lock and has reloaded"""
+        with self._lock:
+            record = {"remove": list(removed_ids), "add": []}
+            for chunk_id in record["remove"]:
+                self.remove(chunk_id)
+            for row in added_rows:
+                source = (row.get('metadata') or {}).get('source')
+                frequencies = self.add(row['id'], row['content'], source)
+                record["add"].append({"id": row['id'], "content": row['content'], "source": source,
+                                      "terms": frequencies})
+            self._records += len(record["remove"]) + len(record["add"])
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(line)
+            stat = os.stat(self.path)
+            self._file_id = (stat.st_dev, stat.st_ino)
+            self._offset = stat.st_size
+
+    def needs_compaction(self):
+        return self._records >= LEXICAL_COMPACT_MIN_RECORDS and self._records > 2 * len(self.documents)
+
+    def save(self):
+        """Write the live chunks as a fresh log, replacing the old one atomically"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            items = list(self.documents.items())
+            terms = list(self.postings.items())
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for start in range(0, len(items), SNAPSHOT_RECORD_SIZE):
+                    record = {"documents": [
+                        [chunk_id, document["source"], document["length"], document["content"]]
+                        for chunk_id, document in items[start:start + SNAPSHOT_RECORD_SIZE]
+                    ]}
+                    f.write(json.dumps(record) + "\n")
+                for start in range(0, len(terms), SNAPSHOT_RECORD_SIZE):
+                    record = {"postings": {
+                        term: [list(postings), list(postings.values())]
+                        for term, postings in terms[start:start + SNAPSHOT_RECORD_SIZE]
+                    }}
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp_path, self.path)
+            stat = os.stat(self.path)
+            self._file_id = (stat.st_dev, stat.st_ino)
+            self._offset = stat.st_size
+            self._records = len(items)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index():
+    """Return the process-wide index, loading it from disk on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = BM25Index()
+                try:
+                    index.reload_if_changed()
+                    if len(index):
+                        print(f"📚 Loaded lexical index with {len(index)} chunks")
+                except Exception as e:
+                    print(f"⚠️ Could not load lexical index, starting empty: {e}")
+                _index = index
+    return _index
+
+
+@contextmanager
+def _log_lock(path):
+    """Hold the cross-process lock that writers of the log at path take turns on"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def update_lexical_index(added_rows=(), removed_ids=()):
+    """Apply inserted pdf_chunks rows and deleted ids, then append them to the log.
+
+    The log is locked while it is written, and lines appended by other
+    workers are applied first, so concurrent ingestions do not drop each
+    other's changes.
+    """
+    index = get_lexical_index()
+    with index._lock, _log_lock(index.path):
+        index.reload_if_changed()
+        index.append(added_rows, removed_ids)
+        if index.needs_compaction():
+            index.save()
+            print(f"🧹 Compacted lexical index log to {len(index)} chunks")
+
+
+def search_lexical(query, k=5, sources=None):
+    """Return up to k {'id', 'content', 'metadata', 'score'} rows ranked by BM25"""
+    index = get_lexical_index()
+    sources = set(sources) if sources else None
+    results = []
+    for chunk_id, score in index.search(query, k, sources):
+        document = index.get(chunk_id)
+        results.append({
+            "id": chunk_id,
+            "content": document["content"],
+            "metadata": {"source": document["source"]},
+            "score": score
+        })
+    return results
+
+
+def rebuild_lexical_index(supabase=None, page_size=1000):
+    """Index every chunk currently stored in pdf_chunks.
+
+    The log lock is held from the first read to the save, so an ingestion
+    waits for the rebuild instead of appending lines the new log would drop.
+    """
+    from db import get_supabase_client
+    supabase = supabase or get_supabase_client()
+    index = BM25Index()
+    with _log_lock(index.path):
+        start = 0
+        while True:
+            response = (supabase.table('pdf_chunks')
+                        .select('id, content, metadata')
+                        .order('id')
+                        .range(start, start + page_size - 1)
+                        .execute())
+            for row in response.data or []:
+                index.add(row['id'], row['content'], (row.get('metadata') or {}).get('source'))
+            if not response.data or len(response.data) < page_size:
+                break
+            start += page_size
+        index.save()
+    print(f"✅ Rebuilt lexical index with {len(index)} chunks at {index.path}")
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        rebuild_lexical_index()
+    else:
+        print(__doc__)
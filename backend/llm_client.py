@@ -0,0 +1,181 @@
+"""
+Async, pooled client for the OpenAI-compatible chat completions API (Groq).
+
+One httpx.AsyncClient per event loop keeps connections alive between
+questions (HTTP/2 when the h2 package is installed), every request has
+connect and read timeouts, and rate limits and transient failures are
+retried with jittered exponential backoff that honours Retry-After.
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+# Maximum wait between bytes; a streamed answer may take longer overall
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+# A Retry-After longer than this fails the request instead of holding it open
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def default_model():
+    return os.getenv("GROQ_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+
+
+class LLMError(Exception):
+    """Raised when the completion API fails after retries"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, or the server's Retry-After plus a little jitter"""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, LLM_RETRY_BASE_DELAY)
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+class LLMClient:
+    """Chat completions over a keep-alive connection pool bound to the running event loop"""
+
+    def __init__(self, base_url=LLM_BASE_URL, api_key=None, max_retries=LLM_MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self._session = None
+        self._session_loop = None
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        # httpx async pools are bound to the loop that created them
+        if self._session is None or self._session_loop is not loop:
+            self._session = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+                http2=LLM_HTTP2
+            )
+            self._session_loop = loop
+        return self._session
+
+    def _headers(self):
+        api_key = self.api_key or os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise LLMError("GROQ_API_KEY not found in environment variables")
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+
+    def _payload(self, messages, stream, params):
+        payload = {
+            "model": default_model(),
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 1000,
+            **params
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def _send(self, payload, stream):
+        """POST with retries, returning a 200 response (streamed responses are left open)"""
+        client = self._client()
+        headers = self._headers()
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                request = client.build_request("POST", "/chat/completions", json=payload, headers=headers)
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                error = LLMError(f"LLM request failed: {e.__class__.__name__}: {e}")
+            else:
+                if response.status_code == 200:
+                    return response
+                body = (await response.aread()).decode("utf-8", "replace")
+                await response.aclose()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = LLMError(f"Groq API error: {response.status_code} - {body}",
+                                 status_code=response.status_code, retry_after=retry_after)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise error
+
+            if attempt == self.max_retries or (retry_after is not None and retry_after > LLM_RETRY_MAX_DELAY):
+                raise error
+            delay = backoff_delay(attempt, retry_after)
+            print(f"⚠️ {error} (attempt {attempt + 1}/{self.max_retries + 1}). Retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def complete(self, messages, **params):
+        """Return the assistant message content for a chat completion"""
+        response = await self._send(self._payload(messages, False, params), stream=False)
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def stream(self, messages, **params):
+        """Yield content tokens as they arrive.
+
+        Only the initial request is retried; once tokens have been yielded a
+        failure is raised to the caller.
+        """
+        response = await self._send(self._payload(messages, True, params), stream=True)
+        try:
+            # OpenAI-compatible SSE: one "data: {json}" line per delta, then "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+            self._session_loop = None
+
+
+_client = LLMClient()
+
+
+def get_llm_client():
+    """Return the process-wide LLM client"""
+    return _client
+
+
+async def close_llm_client():
+    """Close pooled LLM connections on shutdown"""
+    await _client.aclose()
@@ -1,17 +1,29 @@
+import json
 import os
-import tempfile
-import time
 from datetime import datetime
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from typing import List
 from dotenv import load_dotenv
-from upload_pdf import extract_text_from_pdf, split_text
-from store_embeddings import get_embedding, get_supabase_client
-from rag_chat import chat
 
+# Backend modules read their settings when imported, so .env must be loaded first
 load_dotenv()
 
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+from upload_pdf import iter_pdf_pages, save_upload_to_tempfile, UploadTooLargeError
+from chunking import chunk_pages
+from pipeline import prefetch
+from store_embeddings import sync_document, summarize_ingestion, get_supabase_client
+from rag_chat import chat, chat_batch, stream_chat, ASK_BATCH_MAX_QUESTIONS
+from health import HealthProber
+from db import close_clients
+from llm_client import close_llm_client
+from admission import StageFullError
+from jobs import IngestionJob, JobQueue, QueueFullError
+from embeddings import get_embedding_provider, verify_embedding_dimension, EmbeddingDimensionError
+from reranker import get_reranker
+from sessions import get_session_store
+
 app = FastAPI(title="Chat to PDF RAG API")
 
 # Simplified CORS - Allow all origins for maximum compatibility
@@ -23,72 +35,116 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+def process_upload_job(job):
+    """Extract, chunk and store an uploaded PDF (runs on an ingestion worker)"""
+    try:
+        # Extraction, chunking, embedding and inserts run as overlapping stages
+        job.set_stage("ingesting")
+        print(f"📄 [{job.id}] Extracting and embedding {job.filename}...")
+        chunks = chunk_pages(prefetch(iter_pdf_pages(job.path)))
+        stats = sync_document(chunks, source=job.filename, file_hash=job.options["file_hash"],
+                              progress=job.update_progress)
+        
+        if stats["total_chunks"] == 0:
+            raise ValueError("No text content found in PDF")
+        
+        for batch in stats["failed_batches"]:
+            job.add_error(f"{batch['stage']} failed for chunks {batch['chunk_indexes']}: {batch['error']}")
+        
+        print(f"🎉 [{job.id}] Processed {job.filename} in {stats['elapsed_seconds']}s "
+              f"({stats['chunks_per_second']} chunks/s)")
+        
+        return summarize_ingestion(stats, job.filename)
+    
+    finally:
+        # Clean up temp file
+        print(f"🗑️ Cleaning up temporary file: {job.path}")
+        os.unlink(job.path)
+
+ingestion_queue = JobQueue(process_upload_job)
+
+health_prober = HealthProber(get_supabase_client, get_embedding_provider)
+
+def too_busy(error):
+    """429 for a request turned away by admission control"""
+    print(f"🚦 Rejected request: {error}")
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+@app.on_event("startup")
+async def start_ingestion_workers():
+    ingestion_queue.start()
+
+@app.on_event("startup")
+async def start_health_prober():
+    health_prober.start()
+
+@app.on_event("shutdown")
+async def close_database_clients():
+    await close_clients()
+    await close_llm_client()
+
+@app.on_event("startup")
+async def prepare_embedding_provider():
+    """Warm the embedding model and check it against the vector(N) column"""
+    get_embedding_provider().warm()
+    try:
+        verify_embedding_dimension(get_supabase_client())
+    except EmbeddingDimensionError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Could not verify embedding dimension at startup: {e}")
+
+@app.on_event("startup")
+async def prepare_reranker():
+    """Load the cross-encoder up front when reranking is enabled"""
+    reranker = get_reranker()
+    if reranker is not None:
+        try:
+            reranker.warm()
+        except Exception as e:
+            print(f"⚠️ Could not load reranking model, answers will use retrieval order: {e}")
+
 @app.post("/upload")
 @app.post("/upload/")
 async def upload_pdf(file: UploadFile = File(...)):
-    """Upload and process PDF file"""
+    """Accept a PDF and queue it for background processing"""
     print(f"\n📤 Received upload request for: {file.filename}")
     
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files allowed")
     
-    # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_file_path = tmp_file.name
+    # Save uploaded file temporarily; the ingestion worker removes it when done
+    try:
+        tmp_file_path, file_hash = await save_upload_to_tempfile(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
     print(f"💾 Saved temporary file: {tmp_file_path}")
     
+    job = IngestionJob(file.filename, tmp_file_path, file_hash=file_hash)
     try:
-        # Extract text and create chunks
-        print("📄 Extracting text from PDF...")
-        text = extract_text_from_pdf(tmp_file_path)
-        print(f"📝 Extracted {len(text)} characters")
-        
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="No text content found in PDF")
-        
-        chunks = split_text(text)
-        print(f"✂️ Split into {len(chunks)} chunks")
-        
-        # Store embeddings using Supabase client
-        supabase = get_supabase_client()
-        
-        successful_chunks = 0
-        for i, chunk in enumerate(chunks):
-            try:
-                print(f"🔄 Processing chunk {i+1}/{len(chunks)}")
-                embedding = get_embedding(chunk)
-                
-                response = supabase.table('pdf_chunks').insert({
-                    'content': chunk,
-                    'embedding': embedding,
-                    'metadata': {"source": file.filename, "chunk_index": i}
-                }).execute()
-                
-                successful_chunks += 1
-                
-            except Exception as chunk_error:
-                print(f"❌ Error storing chunk {i+1}: {chunk_error}")
-        
-        print(f"🎉 Successfully processed {successful_chunks}/{len(chunks)} chunks")
-        
-        return {
-            "message": f"Successfully processed {successful_chunks}/{len(chunks)} chunks from {file.filename}",
-            "total_chunks": len(chunks),
-            "successful_chunks": successful_chunks,
-            "status": "success"
-        }
+        ingestion_queue.submit(job)
+    except QueueFullError as e:
+        os.unlink(tmp_file_path)
+        raise too_busy(e)
     
-    except Exception as e:
-        print(f"❌ Error processing PDF: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    print(f"📥 Queued ingestion job {job.id} (queue depth: {ingestion_queue.depth})")
     
-    finally:
-        # Clean up temp file
-        print(f"🗑️ Cleaning up temporary file: {tmp_file_path}")
-        os.unlink(tmp_file_path)
+    return JSONResponse(status_code=202, content={
+        "message": f"Accepted {file.filename} for processing",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "status": "queued"
+    })
+
+@app.get("/jobs/{job_id}")
+@app.get("/jobs/{job_id}/")
+async def get_job(job_id: str):
+    """Report progress of a queued upload"""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
 
 @app.get("/upload")
 @app.get("/upload/")
@@ -105,7 +161,7 @@ async def upload_pdf_get():
 @app.post("/update")
 @app.post("/update/")
 async def update_pdf(file: UploadFile = File(...)):
-    """Update/replace PDF file - same as upload but with different endpoint"""
+    """Update/replace PDF file - only changed chunks are re-embedded"""
     return await upload_pdf(file)
 
 @app.get("/update")
@@ -122,65 +178,131 @@ async def update_pdf_get():
 
 @app.post("/ask")
 @app.post("/ask/")
-async def ask_question(question: str = Form(...)):
-    """Ask a question about the uploaded PDF"""
+async def ask_question(question: str = Form(...), sources: List[str] = Form(None),
+                       session_id: str = Form(None)):
+    """Ask a question about the uploaded PDFs, optionally only the given sources (file names).
+
+    With a session_id the question is answered as a follow-up in that
+    conversation; an unknown or expired id (e.g. "new") starts a new one,
+    whose id is returned.
+    """
+    session = get_session_store().get_or_create(session_id) if session_id else None
     try:
-        answer = chat(question)
-        return {"answer": answer, "question": question, "status": "success"}
+        answer = await chat(question, sources=sources, session=session)
+        body = {"answer": answer, "question": question, "sources": sources, "status": "success"}
+        if session is not None:
+            body["session_id"] = session.id
+        return body
+    except StageFullError as e:
+        raise too_busy(e)
     except Exception as e:
         print(f"❌ Error in ask endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
 
-@app.get("/health")
-@app.get("/health/")
-async def health_check():
-    """Comprehensive health check endpoint"""
-    health_status = {
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "server": "online",
-        "database": "unknown",
-        "embedding_model": "unknown",
-        "errors": []
-    }
-    
-    # Check database connection
+@app.post("/ask/batch")
+@app.post("/ask/batch/")
+async def ask_batch(questions: List[str] = Form(...), sources: List[str] = Form(None)):
+    """Answer several questions (repeated questions fields) in one request, in input order"""
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch, got {len(questions)}")
+    started = datetime.utcnow()
     try:
-        supabase = get_supabase_client()
-        start_time = time.time()
-        resp = supabase.table('pdf_chunks').select('id').limit(1).execute()
-        db_response_time = round((time.time() - start_time) * 1000, 2)
-        
-        health_status["database"] = "connected"
-        health_status["db_response_time_ms"] = db_response_time
-        
-        # Check if table has data
-        count_resp = supabase.table('pdf_chunks').select('id', count='exact').execute()
-        health_status["pdf_chunks_count"] = count_resp.count if hasattr(count_resp, 'count') else 0
-        
+        results = await chat_batch(questions, sources=sources)
+    except StageFullError as e:
+        raise too_busy(e)
     except Exception as e:
-        health_status["status"] = "degraded"
-        health_status["database"] = "error"
-        health_status["errors"].append(f"Database error: {str(e)}")
-    
-    # Check embedding model
+        print(f"❌ Error in ask batch endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating answers: {str(e)}")
+    return {
+        "results": results,
+        "sources": sources,
+        "elapsed_seconds": round((datetime.utcnow() - started).total_seconds(), 3),
+        "status": "success" if all(result["status"] == "success" for result in results) else "partial"
+    }
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/ask/stream")
+@app.post("/ask/stream/")
+async def ask_question_stream(question: str = Form(...), sources: List[str] = Form(None),
+                              session_id: str = Form(None)):
+    """Ask a question and receive the answer token by token as Server-Sent Events"""
+    session = get_session_store().get_or_create(session_id) if session_id else None
+    tokens = stream_chat(question, sources=sources, session=session)
+    # Wait for the first token before starting the response, so a request
+    # turned away by admission control can still be answered with 429
+    first_token = None
+    first_error = None
     try:
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        test_embedding = model.encode("test")
-        health_status["embedding_model"] = "loaded"
-        health_status["embedding_dimensions"] = len(test_embedding)
+        first_token = await tokens.__anext__()
+    except StageFullError as e:
+        raise too_busy(e)
+    except StopAsyncIteration:
+        pass
     except Exception as e:
-        health_status["status"] = "degraded"
-        health_status["embedding_model"] = "error"
-        health_status["errors"].append(f"Embedding model error: {str(e)}")
-    
-    # Check environment variables
-    required_env_vars = ["SUPABASE_URL", "SUPABASE_ANON_KEY", "GROQ_API_KEY"]
-    missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-    if missing_vars:
-        health_status["status"] = "degraded"
-        health_status["errors"].append(f"Missing environment variables: {missing_vars}")
+        first_error = e
+
+    async def events():
+        try:
+            if first_error is not None:
+                raise first_error
+            if first_token is not None:
+                yield sse_event("token", {"token": first_token})
+                async for token in tokens:
+                    yield sse_event("token", {"token": token})
+            done = {"question": question, "sources": sources}
+            if session is not None:
+                done["session_id"] = session.id
+            yield sse_event("done", done)
+        except Exception as e:
+            print(f"❌ Error in ask stream endpoint: {str(e)}")
+            yield sse_event("error", {"detail": f"Error generating answer: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so tokens reach the browser immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/sessions/{session_id}")
+@app.delete("/sessions/{session_id}/")
+async def end_session(session_id: str):
+    """Forget a conversation's history and cached retrieval"""
+    if not get_session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"session_id": session_id, "status": "deleted"}
+
+@app.get("/livez")
+@app.get("/livez/")
+async def liveness():
+    """Liveness probe: the process is up and serving; never touches dependencies"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+@app.get("/readyz/")
+async def readiness():
+    """Readiness probe answered from the background health snapshot"""
+    is_ready, snapshot = await health_prober.ready()
+    body = {
+        "status": "ready" if is_ready else "not ready",
+        "database": snapshot["database"],
+        "embedding_model": snapshot["embedding_model"],
+        "snapshot_age_seconds": snapshot["snapshot_age_seconds"]
+    }
+    return JSONResponse(status_code=200 if is_ready else 503, content=body)
+
+@app.get("/health")
+@app.get("/health/")
+async def health_check():
+    """Detailed health status from the cached background probe"""
+    health_status = await health_prober.report()
+    health_status["ingestion_queue_depth"] = ingestion_queue.depth
+    # Uploads are extracted by the ingestion workers
+    health_status["admission"] = {"extraction": ingestion_queue.stats(), **health_status["admission"]}
     
     return health_status
 
@@ -253,8 +375,12 @@ async def health_page():
             <div class="section">
                 <h2>🔗 API Endpoints</h2>
                 <div class="metric"><span>POST /upload/</span><span>Upload PDF files</span></div>
-                <div class="metric"><span>POST /ask/</span><span>Ask questions about PDF</span></div>
+                <div class="metric"><span>GET /jobs/{{job_id}}</span><span>Upload progress</span></div>
+                <div class="metric"><span>POST /ask/</span><span>Ask questions about PDF (optional session_id)</span></div>
+                <div class="metric"><span>POST /ask/stream</span><span>Streamed answers (SSE)</span></div>
+                <div class="metric"><span>POST /ask/batch</span><span>Many questions in one request</span></div>
                 <div class="metric"><span>GET /health/</span><span>JSON health status</span></div>
+                <div class="metric"><span>GET /livez, /readyz</span><span>Liveness and readiness probes</span></div>
                 <div class="metric"><span>GET /</span><span>API information</span></div>
             </div>
             
@@ -276,8 +402,14 @@ async def root():
         "endpoints": {
             "POST /upload/": "Upload PDF files",
             "POST /update/": "Update/replace PDF files", 
-            "POST /ask/": "Ask questions about PDF",
+            "GET /jobs/{job_id}": "Upload processing progress",
+            "POST /ask/": "Ask questions about PDF (optional sources to search only those files)",
+            "POST /ask/stream": "Ask questions and stream the answer as Server-Sent Events",
+            "POST /ask/batch": "Ask many questions at once (repeated questions fields, optional sources)",
+            "DELETE /sessions/{session_id}": "End a conversation started with session_id on /ask",
             "GET /health/": "JSON health status",
+            "GET /livez": "Liveness probe",
+            "GET /readyz": "Readiness probe",
             "GET /health/page/": "HTML health page",
             "GET /": "API information"
         },
@@ -0,0 +1,137 @@
+"""
+Bounded producer/consumer stages for ingestion.
+
+Each stage runs on its own threads and hands its output to the next stage
+through a bounded queue. A stage that gets ahead blocks on the full queue
+(backpressure) instead of buffering the whole document, so extraction,
+embedding and database writes overlap and a document takes about as long
+as its slowest stage rather than the sum of all of them. The first error
+in any stage stops the others and is raised from join().
+"""
+import os
+import queue
+import threading
+
+# Items (pages or chunk batches) buffered between two stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class Pipeline:
+    """A chain of thread-backed stages connected by bounded queues"""
+
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._threads = []
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _put(self, outbox, item):
+        """Block until there is room; False if the pipeline was stopped meanwhile"""
+        while not self._stopped.is_set():
+            try:
+                outbox.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def stop(self):
+        """Make every stage give up at its next queue operation"""
+        self._stopped.set()
+
+    def items(self, inbox):
+        """Yield items from a stage's queue until that stage is done or the pipeline stops"""
+        while not self._stopped.is_set():
+            try:
+                item = inbox.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                # Leave the marker for the other workers of this stage
+                self._put(inbox, _DONE)
+                return
+            yield item
+
+    def _spawn(self, name, target):
+        def run():
+            try:
+                target()
+            except BaseException as e:
+                with self._error_lock:
+                    if self._error is None:
+                        self._error = e
+                self.stop()
+
+        thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def source(self, name, iterable):
+        """Iterate iterable on a background thread, returning the queue it fills"""
+        outbox = queue.Queue(maxsize=self.queue_size)
+
+        def produce():
+            try:
+                for item in iterable:
+                    if not self._put(outbox, item):
+                        return
+                self._put(outbox, _DONE)
+            finally:
+                # Let generators release their resources (e.g. extraction processes)
+                if hasattr(iterable, "close"):
+                    iterable.close()
+
+        self._spawn(name, produce)
+        return outbox
+
+    def stage(self, name, fn, inbox, workers=1, sink=False):
+        """Run fn on workers threads, each consuming from inbox.
+
+        fn receives an iterator over the items its thread takes from inbox
+        and yields results for the next stage, so a worker can carry state
+        between items (e.g. accumulate rows into larger inserts). A sink's fn
+        just consumes the iterator. Returns the queue of results, or None for
+        a sink.
+        """
+        outbox = None if sink else queue.Queue(maxsize=self.queue_size)
+        remaining = [workers]
+        remaining_lock = threading.Lock()
+
+        def work():
+            results = fn(self.items(inbox))
+            if outbox is not None:
+                for result in results:
+                    if not self._put(outbox, result):
+                        return
+            with remaining_lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and outbox is not None:
+                self._put(outbox, _DONE)
+
+        for i in range(workers):
+            self._spawn(f"{name}-{i}", work)
+        return outbox
+
+    def join(self):
+        """Wait for every stage to finish, raising the first stage error"""
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def prefetch(iterable, queue_size=PIPELINE_QUEUE_SIZE):
+    """Yield the items of iterable while a background thread produces the next ones"""
+    pipeline = Pipeline(queue_size)
+    inbox = pipeline.source("prefetch", iterable)
+    try:
+        yield from pipeline.items(inbox)
+    finally:
+        # Stop the producer if the consumer gives up early
+        pipeline.stop()
+    pipeline.join()
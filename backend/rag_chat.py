@@ -1,178 +1,274 @@
+import asyncio
+import contextlib
 import os
-import requests
-import openai
+import time
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 load_dotenv()
 
-# Initialize OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from embeddings import embed_uncached, get_embedding_provider, lookup_embeddings
+from answer_cache import answer_cache_key, get_answer_cache
+from lexical_index import search_lexical
+from vector_store import get_vector_store
+from llm_client import get_llm_client
+from admission import StageFullError, get_stage
+from context_builder import CONTEXT_CANDIDATES, build_context
+from reranker import RERANK_CANDIDATES, get_reranker
+from grounding import get_grounding_index
+from sessions import SESSION_DRIFT_THRESHOLD, SESSION_MAX_CANDIDATES, get_session_store
 
-def get_supabase_client():
-    """Get Supabase client connection"""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_ANON_KEY")
-    return create_client(url, key)
+# Fuse vector results with BM25 keyword results instead of using BM25 only as a fallback
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "false").lower() == "true"
+RRF_K = int(os.getenv("RRF_K", "60"))
 
-def get_embedding(text):
-    """Generate embeddings using OpenAI's API"""
+# POST /ask/batch limits: questions per request, and answers generated at once per batch
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "100"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "4"))
+
+def get_embeddings(texts):
+    """Generate embeddings for uncached questions with the configured provider"""
     try:
-        response = openai.Embedding.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        return response['data'][0]['embedding']
+        return embed_uncached(texts)
     except Exception as e:
         print(f"❌ Error generating embedding: {e}")
         raise
 
-def call_groq_api(messages):
+async def embed_queries(texts):
+    """Embed questions for retrieval, taking a query_embedding slot only for cache misses.
+
+    Cached questions never wait for a slot. Raises StageFullError (answered
+    with 429) when the query embedding queue is full.
+    """
+    texts = list(texts)
+    embeddings = await asyncio.to_thread(lookup_embeddings, texts)
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if missing:
+        computed = dict(zip(missing, await get_stage("query_embedding").run(get_embeddings, missing)))
+        embeddings = [computed[text] if embedding is None else embedding
+                      for text, embedding in zip(texts, embeddings)]
+    return embeddings
+
+async def embed_query(text):
+    return (await embed_queries([text]))[0]
+
+async def call_groq_api(messages):
     """Call Groq API for chat completion"""
-    groq_api_key = os.getenv("GROQ_API_KEY")
-    groq_model = os.getenv("GROQ_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
-    
-    if not groq_api_key:
-        raise Exception("GROQ_API_KEY not found in environment variables")
-    
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {groq_api_key}"
-    }
-    
-    payload = {
-        "model": groq_model,
-        "messages": messages,
-        "temperature": 0.7,
-        "max_tokens": 1000
-    }
-    
-    response = requests.post(url, json=payload, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
-    else:
-        raise Exception(f"Groq API error: {response.status_code} - {response.text}")
+    return await get_llm_client().complete(messages)
 
-def validate_pdf_content_relevance(query, chunks):
-    """Check if the retrieved chunks contain relevant information for the query"""
-    if not chunks:
-        return False
-    
-    # More flexible keyword matching for better relevance detection
-    query_words = set(query.lower().split())
-    
-    # Remove very common words that don't indicate relevance
-    stop_words = {'what', 'how', 'where', 'when', 'why', 'is', 'are', 'was', 'were', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-    meaningful_query_words = query_words - stop_words
-    
-    # If query has no meaningful words, be more permissive
-    if not meaningful_query_words:
-        return True
-    
-    for chunk in chunks:
-        chunk_words = set(chunk.lower().split())
-        
-        # Check for direct keyword matches
-        if len(meaningful_query_words.intersection(chunk_words)) > 0:
-            return True
-        
-        # Check for partial matches (for compound words, HTML tags, etc.)
-        for query_word in meaningful_query_words:
-            for chunk_word in chunk_words:
-                if query_word in chunk_word or chunk_word in query_word:
-                    if len(query_word) > 2 and len(chunk_word) > 2:  # Avoid matching very short words
-                        return True
-    
-    # If it's a technical query and we have any content, be more permissive
-    # This helps with technical documents like HTML cheatsheets
-    if len(meaningful_query_words) <= 3 and chunks:
-        return True
-        
-    return False
+async def stream_groq_api(messages):
+    """Call Groq API with stream=True, yielding content tokens as they arrive"""
+    async for token in get_llm_client().stream(messages):
+        yield token
 
-def get_similar_chunks(query, k=5):
-    print(f"🔍 Searching for chunks related to: {query}")
-    query_embedding = get_embedding(query)
-    supabase = get_supabase_client()
+def reciprocal_rank_fusion(result_lists, k, rrf_k=RRF_K):
+    """Merge ranked lists of chunk rows by summed 1 / (rrf_k + rank), keyed on chunk id"""
+    scores = {}
+    rows = {}
+    for results in result_lists:
+        for rank, row in enumerate(results, start=1):
+            scores[row['id']] = scores.get(row['id'], 0.0) + 1.0 / (rrf_k + rank)
+            rows.setdefault(row['id'], row)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [rows[chunk_id] for chunk_id in ranked[:k]]
+
+async def get_similar_chunks(query, k=5, sources=None, query_embedding=None):
+    """Return (rows, searched): up to k chunk rows for the query, best first, from the given sources if any.
+
+    searched is False when the vector search failed, so no rows may only mean
+    the store was unreachable rather than that nothing matches. query_embedding
+    skips embedding the query when the caller already has it.
+    """
+    scope = f" in {', '.join(sources)}" if sources else ""
+    print(f"🔍 Searching for chunks related to: {query}{scope}")
+    vector_store = get_vector_store()
     
-    # First, check if we have any data in the table
-    try:
-        count_response = supabase.table('pdf_chunks').select('id', count='exact').execute()
-        total_chunks = count_response.count if hasattr(count_response, 'count') else 0
-        print(f"📊 Total chunks in database: {total_chunks}")
+    # First, check if we have any data (cached corpus statistics, no table scan)
+    # Blocking lookups run in worker threads so the event loop keeps serving
+    total_chunks = await asyncio.to_thread(vector_store.count, sources)
+    if total_chunks is not None:
+        print(f"📊 Total chunks in {vector_store.name} store{scope}: {total_chunks}")
         
         if total_chunks == 0:
             print("⚠️ No PDF chunks found in database. Please upload a PDF first.")
-            return []
-    except Exception as e:
-        print(f"❌ Error checking chunk count: {e}")
-        return []
+            return [], True
+    
+    if query_embedding is None:
+        query_embedding = await embed_query(query)
     
     # Try vector similarity search with lower threshold for better recall
+    vector_rows = []
+    searched = False
     try:
         print("🔄 Attempting vector similarity search...")
-        response = supabase.rpc('search_pdf_chunks', {
-            'query_embedding': query_embedding,
-            'match_threshold': 0.2,  # Lower threshold for better recall
-            'match_count': k
-        }).execute()
-        
-        if response.data and len(response.data) > 0:
-            chunks = [row['content'] for row in response.data]
-            print(f"✅ Found {len(chunks)} similar chunks via vector search")
-            return chunks  # Return vector search results without additional filtering
+        vector_rows = await vector_store.asearch(
+            query_embedding,
+            match_threshold=0.2,  # Lower threshold for better recall
+            match_count=k,
+            sources=sources
+        )
+        searched = True
+        if vector_rows:
+            print(f"✅ Found {len(vector_rows)} similar chunks via vector search")
         else:
             print("⚠️ Vector search returned no results")
     except Exception as e:
         print(f"❌ Vector search failed: {e}")
     
-    # Fallback: Get all chunks and apply loose relevance filtering
+    if vector_rows and not HYBRID_RETRIEVAL:
+        return vector_rows, searched
+    
+    # Keyword search over the local BM25 index, either as the fallback or as
+    # the lexical half of hybrid retrieval
     try:
-        print("🔄 Using fallback: retrieving all chunks...")
-        response = supabase.table('pdf_chunks').select('content').execute()
-        
-        if response.data and len(response.data) > 0:
-            all_chunks = [row['content'] for row in response.data]
-            print(f"📄 Retrieved {len(all_chunks)} total chunks")
-            
-            # Apply more permissive relevance check
-            if validate_pdf_content_relevance(query, all_chunks):
-                print(f"✅ All chunks are considered relevant for the query")
-                return all_chunks[:k]  # Return limited chunks
-            else:
-                print("⚠️ No chunks found relevant after filtering")
-                # For very small datasets, return all chunks anyway
-                if len(all_chunks) <= 5:
-                    print("🔄 Small dataset detected, returning all chunks")
-                    return all_chunks
-                return []
-        else:
-            print("⚠️ No chunks found in fallback")
-            return []
+        lexical_rows = await asyncio.to_thread(search_lexical, query, k, sources)
     except Exception as e:
-        print(f"❌ Fallback search also failed: {e}")
-        return []
-
-def chat(query):
-    print(f"\n🤖 Processing query: {query}")
+        print(f"❌ Lexical search failed: {e}")
+        lexical_rows = []
+    
+    if vector_rows:
+        rows = reciprocal_rank_fusion([vector_rows, lexical_rows], k)
+        print(f"🔀 Fused {len(vector_rows)} vector and {len(lexical_rows)} keyword results into {len(rows)} chunks")
+        return rows, searched
     
-    # Get relevant chunks from PDF
-    chunks = get_similar_chunks(query)
+    if lexical_rows:
+        print(f"✅ Found {len(lexical_rows)} chunks via keyword search")
+    else:
+        print("⚠️ No chunks matched the query keywords")
+    return lexical_rows, searched
+
+async def _assemble_context(query, candidates, wait_for_rerank=False):
+    """Rerank (if enabled) and pack candidates into the prompt context.
+
+    Returns (context, rows used in it, retrieval), where retrieval is
+    {'reranked', 'searched', 'context'}: reranked is None when reranking is
+    disabled and False when it was skipped, and context is build_context's
+    report of the tokens used and saved. A full rerank queue skips reranking unless
+    wait_for_rerank is set, in which case the rerank waits for a slot.
+    """
+    reranked = None
+    reranker = get_reranker()
+    if reranker is not None:
+        stage = get_stage("rerank")
+        try:
+            run = stage.run_waiting if wait_for_rerank else stage.run
+            candidates = await run(reranker.rerank, query, candidates)
+            reranked = True
+            print(f"🎯 Reranked to {len(candidates)} chunks (best score {candidates[0]['rerank_score']:.2f})")
+        except Exception as e:
+            # Retrieval order is still usable, so a busy or failing reranker only costs precision
+            print(f"⚠️ Reranking skipped: {e}")
+            reranked = False
+            candidates = candidates[:CONTEXT_CANDIDATES]
+    context, selected, report = build_context(candidates)
+    print(f"✂️ Context: {report['chunks_used']} of {report['candidates']} chunks, {report['context_tokens']} tokens "
+          f"({report['tokens_saved']} saved of {report['baseline_tokens']}, "
+          f"{report['duplicates_dropped']} duplicates dropped)")
+    return context, selected, {"reranked": reranked, "searched": True, "context": report}
+
+def _candidate_count():
+    return RERANK_CANDIDATES if get_reranker() is not None else CONTEXT_CANDIDATES
+
+async def get_context(query, sources=None, query_embedding=None, wait_for_rerank=False):
+    """Retrieve candidates and assemble the prompt context.
+
+    Returns (context, rows used in it, retrieval) as _assemble_context does,
+    or (None, [], retrieval) if nothing matched; retrieval['searched'] then
+    says whether the vector search ran, so the empty result can be trusted.
+    """
+    candidates, searched = await get_similar_chunks(query, k=_candidate_count(), sources=sources,
+                                                    query_embedding=query_embedding)
+    if not candidates:
+        return None, [], {"reranked": None, "searched": searched, "context": None}
+    return await _assemble_context(query, candidates, wait_for_rerank)
+
+async def _corpus_version():
+    try:
+        return await asyncio.to_thread(get_vector_store().version)
+    except Exception as e:
+        print(f"⚠️ Could not read the corpus version: {e}")
+        return None
+
+async def get_session_context(query, session, sources=None):
+    """Like get_context, but reuse the session's cached candidates while the topic and corpus hold"""
+    retrieval_text = session.retrieval_text(query)
+    query_embedding, corpus_version = await asyncio.gather(embed_query(retrieval_text), _corpus_version())
     
-    if not chunks:
-        return "The context does not provide the answer to the question. Therefore, I cannot answer this question from the context."
+    similarity = session.topic_similarity(query_embedding, sources, corpus_version)
+    searched = True
+    if similarity is not None and similarity >= SESSION_DRIFT_THRESHOLD:
+        candidates = session.rescore(query_embedding, _candidate_count())
+        print(f"♻️ Re-scored {len(session.candidates)} cached candidates (topic similarity {similarity:.2f})")
+    else:
+        if similarity is not None:
+            print(f"🧭 Topic changed (similarity {similarity:.2f}), searching again")
+        elif session.candidates and corpus_version != session.corpus_version:
+            print("🧭 Documents changed since the last retrieval, searching again")
+        candidates, searched = await get_similar_chunks(
+            retrieval_text, k=max(SESSION_MAX_CANDIDATES, _candidate_count()), sources=sources,
+            query_embedding=query_embedding
+        )
+        # The vectors the store already holds, so nothing is embedded again
+        try:
+            stored = await get_vector_store().aget_embeddings([row['id'] for row in candidates]) if candidates else {}
+        except Exception as e:
+            print(f"⚠️ Candidates not cached for follow-ups: {e}")
+            stored = {}
+        cached = [row for row in candidates if row['id'] in stored]
+        session.remember_candidates(cached, [stored[row['id']] for row in cached], query_embedding, sources,
+                                    corpus_version)
+        candidates = candidates[:_candidate_count()]
     
-    context = "\n".join(chunks)
-    print(f"📝 Using context from {len(chunks)} chunks (total length: {len(context)} characters)")
+    if not candidates:
+        return None, [], {"reranked": None, "searched": searched, "context": None}
+    return await _assemble_context(retrieval_text, candidates)
+
+NO_ANSWER = "The context does not provide the answer to the question. Therefore, I cannot answer this question from the context."
+
+def get_answer_cache_key(query, sources=None):
+    """Cache key for this question at the current corpus version, or None if the version is unknown"""
+    corpus_version = get_vector_store().version()
+    if corpus_version is None:
+        return None
+    groq_model = os.getenv("GROQ_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+    model = f"{groq_model}|{get_embedding_provider().cache_namespace}"
+    reranker = get_reranker()
+    if reranker is not None:
+        model += f"|rerank:{reranker.model}"
+    return answer_cache_key(query, sources, model, corpus_version)
+
+async def _cached_answer(query, sources, session=None):
+    """Return (cache_key, cached_answer); either may be None"""
+    answer_cache = get_answer_cache()
+    if answer_cache is None or (session is not None and session.history):
+        return None, None
+    try:
+        cache_key = await asyncio.to_thread(get_answer_cache_key, query, sources)
+    except Exception as e:
+        print(f"⚠️ Answer cache skipped: {e}")
+        return None, None
+    if cache_key is None:
+        return None, None
+    answer = answer_cache.get(cache_key)
+    if answer is not None:
+        print("⚡ Answer served from cache")
+    return cache_key, answer
+
+def _remember_answer(cache_key, answer):
+    if cache_key is not None:
+        get_answer_cache().put(cache_key, answer)
 
-    # Create messages for Groq API
+def build_messages(query, context, history=()):
+    """Create messages for Groq API, after any earlier (question, answer) turns of the conversation"""
     messages = [
         {
             "role": "system", 
             "content": "You are a helpful assistant. Answer questions based on the provided PDF content. Be helpful and informative when the content contains relevant information."
-        },
+        }
+    ]
+    for previous_question, previous_answer in history:
+        messages.append({"role": "user", "content": previous_question})
+        messages.append({"role": "assistant", "content": previous_answer})
+    messages.append(
         {
             "role": "user", 
             "content": f"""Here is content from a PDF document:
@@ -185,89 +281,231 @@ Please provide a helpful answer based on the information above. Use the specific
 
 Answer:"""
         }
-    ]
-    
+    )
+    return messages
+
+async def _check_answer(answer, rows):
+    """Log how well each answer sentence is supported by the context chunks (never blocks the answer)"""
+    if "context does not provide" in answer.lower():
+        return
     try:
-        print(f"🚀 Generating response using Groq API...")
-        answer = call_groq_api(messages)
-        print("✅ Response generated successfully")
-        
-        # Only validate if the answer seems to go completely off-topic
-        if "context does not provide" in answer.lower():
-            return answer
-        
-        # For technical content, be very permissive
-        if validate_answer_against_context(answer, context):
-            return answer
-        else:
-            print("⚠️ Generated answer seems to go beyond PDF context, but allowing due to technical content")
-            # For now, let's allow the answer to see what the model actually generates
-            return answer
-        
+        report = await asyncio.to_thread(get_grounding_index().score_answer, answer, rows)
     except Exception as e:
-        error_msg = f"Error generating response with Groq API: {str(e)}"
-        print(f"❌ {error_msg}")
-        return "The context does not provide the answer to the question. Therefore, I cannot answer this question from the context."
-
-def validate_answer_against_context(answer, context):
-    """Validate that the answer is grounded in the provided context"""
-    # Check if answer contains the fallback message
-    if "The context does not provide the answer" in answer:
-        return True
+        print(f"⚠️ Grounding check skipped: {e}")
+        return
+    sentences = report["sentences"]
+    supported = sum(sentence["supported"] for sentence in sentences)
+    print(f"🧭 Grounding: {supported}/{len(sentences)} sentences supported "
+          f"(mean support {report['mean_support']:.2f})")
+    for sentence in sentences:
+        if not sentence["supported"]:
+            print(f"⚠️ Weakly supported ({sentence['support']:.2f}): {sentence['sentence'][:80]}")
+
+async def chat(query, sources=None, session=None):
+    """Answer query, as the next turn of session (a sessions.Session) if given"""
+    print(f"\n🤖 Processing query: {query}")
+    
+    async with _session_turn(session):
+        # Repeated questions against an unchanged corpus are answered from cache;
+        # follow-ups depend on the conversation, so only a session's first turn is
+        cache_key, answer = await _cached_answer(query, sources, session)
+        if answer is not None:
+            _end_turn(session, query, answer)
+            return answer
+        return await _answer(query, sources, cache_key, session=session)
+
+async def _retrieve_context(query, sources, session, query_embedding=None, wait_for_rerank=False):
+    if session is not None:
+        return await get_session_context(query, session, sources=sources)
+    return await get_context(query, sources=sources, query_embedding=query_embedding,
+                             wait_for_rerank=wait_for_rerank)
+
+@contextlib.asynccontextmanager
+async def _session_turn(session):
+    """Hold the session for one turn, then recount its memory even if the turn failed"""
+    if session is None:
+        yield
+        return
+    async with session.lock:
+        try:
+            yield
+        finally:
+            # Cached candidates may have been stored before a failure
+            get_session_store().touch(session)
+
+def _end_turn(session, query, answer):
+    if session is not None:
+        session.add_turn(query, answer)
+
+async def _answer(query, sources, cache_key, query_embedding=None, timings=None, generation_limit=None,
+                  session=None, retrieval_limit=None, details=None):
+    """Retrieve, generate, check and cache an answer that was not in the cache.
+
+    If given, timings gets the retrieval and generation times in milliseconds,
+    details gets whether the context was reranked and its token report, and
+    generation_limit (a semaphore) is held while the answer is generated.
+    retrieval_limit (a semaphore) is held during retrieval, whose rerank then
+    waits for a slot instead of being skipped when the rerank queue is full.
+    """
+    # Get relevant chunks from PDF (only from the given documents, if any)
+    async with retrieval_limit or contextlib.nullcontext():
+        started = time.perf_counter()
+        context, rows, retrieval = await _retrieve_context(query, sources, session, query_embedding,
+                                                           wait_for_rerank=retrieval_limit is not None)
+    if timings is not None:
+        timings["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if details is not None:
+        details["reranked"] = retrieval["reranked"]
+        details["context"] = retrieval["context"]
     
-    # For technical content, be much more permissive with validation
-    answer_lower = answer.lower()
-    context_lower = context.lower()
+    if not context:
+        # Only an empty result from a working vector search is worth caching;
+        # after a failed search it may just mean the store was unreachable
+        if retrieval["searched"]:
+            _remember_answer(cache_key, NO_ANSWER)
+        _end_turn(session, query, NO_ANSWER)
+        return NO_ANSWER
     
-    # If context contains HTML/technical terms and answer discusses them, allow it
-    technical_terms = ['html', 'tag', 'element', 'attribute', 'code', 'css', 'javascript', 'web', 'document', 'page', 'head', 'body', 'div', 'span', 'form', 'input', 'select', 'option']
-    context_has_tech = any(term in context_lower for term in technical_terms)
-    answer_has_tech = any(term in answer_lower for term in technical_terms)
+    # A full generation queue raises StageFullError instead of answering
+    async with generation_limit or contextlib.nullcontext():
+        started = time.perf_counter()
+        async with get_stage("generation").slot():
+            try:
+                print(f"🚀 Generating response using Groq API...")
+                history = session.history if session is not None else ()
+                answer = await call_groq_api(build_messages(query, context, history))
+                print("✅ Response generated successfully")
+            except Exception as e:
+                # Failures are not cached, so the next ask retries the API
+                error_msg = f"Error generating response with Groq API: {str(e)}"
+                print(f"❌ {error_msg}")
+                return NO_ANSWER
+            finally:
+                if timings is not None:
+                    timings["generation_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    await _check_answer(answer, rows)
+    _remember_answer(cache_key, answer)
+    _end_turn(session, query, answer)
+    return answer
+
+async def stream_chat(query, sources=None, session=None):
+    """Like chat, but yield the answer token by token as Groq generates it.
+
+    Cache hits and the no-context answer are yielded as a single token. A
+    failure before the first token yields the no-context answer like chat;
+    a failure mid-answer is raised so the caller can report it. A full
+    embedding or generation queue raises StageFullError before any token.
+    """
+    print(f"\n🤖 Streaming query: {query}")
     
-    if context_has_tech and answer_has_tech:
-        print(f"✅ Technical content detected - allowing answer")
-        return True
+    # A follow-up on the same session waits until this answer is complete
+    async with _session_turn(session):
+        async for token in _stream_turn(query, sources, session):
+            yield token
+
+async def _stream_turn(query, sources, session):
+    cache_key, answer = await _cached_answer(query, sources, session)
+    if answer is not None:
+        _end_turn(session, query, answer)
+        yield answer
+        return
     
-    # Check for HTML-specific patterns
-    html_patterns = ['<', '>', 'creates', 'sets', 'tag', 'cheatsheet', 'basic']
-    context_has_html = any(pattern in context_lower for pattern in html_patterns)
-    answer_has_html = any(pattern in answer_lower for pattern in html_patterns)
+    context, rows, retrieval = await _retrieve_context(query, sources, session)
     
-    if context_has_html and len(answer.strip()) > 10:  # If we have HTML context and a substantial answer
-        print(f"✅ HTML patterns detected - allowing answer")
-        return True
+    if not context:
+        if retrieval["searched"]:
+            _remember_answer(cache_key, NO_ANSWER)
+        _end_turn(session, query, NO_ANSWER)
+        yield NO_ANSWER
+        return
     
-    # Much more lenient word overlap check
-    answer_words = set(answer.lower().split())
-    context_words = set(context.lower().split())
+    tokens = []
+    # The generation slot is held until the last token has been sent
+    async with get_stage("generation").slot():
+        try:
+            print(f"🚀 Streaming response from Groq API...")
+            history = session.history if session is not None else ()
+            async for token in stream_groq_api(build_messages(query, context, history)):
+                tokens.append(token)
+                yield token
+        except Exception as e:
+            print(f"❌ Error streaming response with Groq API: {str(e)}")
+            if tokens:
+                raise
+            yield NO_ANSWER
+            return
     
-    # Remove common words but keep technical terms
-    common_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those'}
-    answer_words_filtered = answer_words - common_words
-    context_words_filtered = context_words - common_words
+    answer = "".join(tokens)
+    print("✅ Response streamed successfully")
+    await _check_answer(answer, rows)
+    _remember_answer(cache_key, answer)
+    _end_turn(session, query, answer)
+
+async def chat_batch(queries, sources=None, concurrency=ASK_BATCH_CONCURRENCY):
+    """Answer many questions over the same scope, returning results in input order.
+
+    Cached answers are served first. The remaining questions are embedded
+    in one batched call, then each is retrieved and answered concurrently,
+    with at most concurrency answers being generated at once. Retrievals
+    are bounded too, and their reranks wait for a slot rather than being
+    skipped, so every question gets the same treatment. Each result is
+    {'question', 'answer', 'status', 'cached', 'reranked', 'context', 'timings'};
+    reranked is None when reranking is disabled or the question was not
+    retrieved, and False if the reranker failed. context is the token report
+    of the question's prompt context (None if it was not retrieved). A question turned away by
+    the generation stage gets status 'busy' and retry_after instead of
+    failing the whole batch.
+    """
+    print(f"\n🤖 Processing batch of {len(queries)} questions")
+    results = [{"question": query, "answer": None, "status": "success", "cached": False, "reranked": None,
+                "context": None, "timings": {}} for query in queries]
     
-    if len(answer_words_filtered) == 0:
-        return True
+    cache_keys = [None] * len(queries)
+    misses = []
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        cache_keys[i], answer = await _cached_answer(query, sources)
+        results[i]["timings"]["cache_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if answer is not None:
+            results[i].update(answer=answer, cached=True)
+        else:
+            misses.append(i)
     
-    overlap = len(answer_words_filtered.intersection(context_words_filtered))
-    overlap_ratio = overlap / len(answer_words_filtered)
+    if not misses:
+        return results
     
-    print(f"📊 Word overlap: {overlap}/{len(answer_words_filtered)} = {overlap_ratio:.2f}")
+    # One embedding call for every question not in the embedding cache
+    started = time.perf_counter()
+    embeddings = await embed_queries([queries[i] for i in misses])
+    embedding_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🧮 Embedded {len(misses)} questions in one batch ({embedding_ms} ms)")
     
-    # Very low threshold for technical documents (just 20%)
-    if overlap_ratio >= 0.2:
-        print(f"✅ Sufficient word overlap - allowing answer")
-        return True
+    generation_slots = asyncio.Semaphore(concurrency)
+    # With reranking on, a batch keeps at most twice the rerank stage's slots
+    # busy, so it neither floods the rerank queue nor leaves the model idle
+    reranking = get_reranker() is not None
+    retrieval_slots = asyncio.Semaphore(2 * get_stage("rerank").concurrency if reranking else concurrency)
     
-    # If we have chunks and it's a short answer, be permissive
-    if len(context.strip()) > 100 and len(answer.strip()) < 200:
-        print(f"✅ Short answer with good context - allowing answer")
-        return True
+    async def answer_one(i, query_embedding):
+        result = results[i]
+        result["timings"]["embedding_ms"] = embedding_ms
+        started = time.perf_counter()
+        try:
+            result["answer"] = await _answer(queries[i], sources, cache_keys[i], query_embedding=query_embedding,
+                                             timings=result["timings"], generation_limit=generation_slots,
+                                             retrieval_limit=retrieval_slots, details=result)
+        except StageFullError as e:
+            result.update(status="busy", error=str(e), retry_after=e.retry_after)
+        except Exception as e:
+            print(f"❌ Error answering batch question {i + 1}: {e}")
+            result.update(status="error", error=str(e))
+        result["timings"]["total_ms"] = round((time.perf_counter() - started) * 1000 + embedding_ms, 1)
     
-    print(f"❌ Answer validation failed")
-    return False
+    await asyncio.gather(*(answer_one(i, embedding) for i, embedding in zip(misses, embeddings)))
+    return results
 
 if __name__ == "__main__":
     query = input("Ask something about the PDF: ")
-    answer = chat(query)
+    answer = asyncio.run(chat(query))
     print("\nAnswer:", answer)
\ No newline at end of file
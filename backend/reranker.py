@@ -0,0 +1,128 @@
+"""
+Optional cross-encoder reranking of retrieved chunks.
+
+With RERANK_ENABLED=true, retrieval over-fetches RERANK_CANDIDATES chunks
+and a small cross-encoder (sentence-transformers CrossEncoder, loaded once
+per process and run on CPU) scores every (question, chunk) pair in one
+batched predict call. Only the RERANK_TOP_K best chunks go on to the
+prompt, so the LLM reads a few closely matching chunks instead of many
+loosely related ones. Scores are cached by question and chunk content
+hash, so repeated questions over unchanged chunks skip the model.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from embedding_cache import normalize_text
+from embeddings import EMBEDDING_THREADS
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+# Longer (question, chunk) pairs are truncated to this many model tokens
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+
+
+class CrossEncoderReranker:
+    """Cross-encoder kept in memory for the life of the process, with an LRU score cache"""
+
+    def __init__(self, model=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE, max_length=RERANK_MAX_LENGTH,
+                 cache_size=RERANK_CACHE_SIZE, threads=EMBEDDING_THREADS):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self.threads = threads
+        self.hits = 0
+        self.misses = 0
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._scores = OrderedDict()   # (question, content hash) -> score
+        self._scores_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def _load(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                    except ImportError:
+                        raise RuntimeError("RERANK_ENABLED=true requires the sentence-transformers package")
+                    if self.threads > 0:
+                        import torch
+                        torch.set_num_threads(self.threads)
+                    print(f"🧠 Loading reranking model {self.model}...")
+                    self._model = CrossEncoder(self.model, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def warm(self):
+        self._load().predict([("warm up", "warm up")], show_progress_bar=False)
+        print(f"✅ Reranking model {self.model} ready")
+
+    def score(self, query, texts):
+        """Relevance score for each text against the query (higher is better)"""
+        question = normalize_text(query).casefold()
+        keys = [(question, hashlib.sha256(text.encode("utf-8")).hexdigest()) for text in texts]
+
+        scores = {}
+        with self._scores_lock:
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[key] = self._scores[key]
+            self.hits += len(scores)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in scores}
+        if missing:
+            # One batched forward pass for every uncached pair
+            predicted = self._load().predict(
+                [(query, text) for text in missing.values()],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            with self._scores_lock:
+                self.misses += len(missing)
+                for key, value in zip(missing, predicted):
+                    scores[key] = self._scores[key] = float(value)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def rerank(self, query, rows, top_k=RERANK_TOP_K):
+        """Return the top_k rows by cross-encoder score, each with a rerank_score"""
+        scores = self.score(query, [row["content"] for row in rows])
+        ranked = sorted(zip(scores, range(len(rows))), reverse=True)[:top_k]
+        return [{**rows[i], "rerank_score": score} for score, i in ranked]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model,
+            "loaded": self.loaded,
+            "cached_scores": len(self._scores),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """Return the process-wide reranker, or None when reranking is disabled"""
+    global _reranker
+    if not RERANK_ENABLED:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+        return _reranker
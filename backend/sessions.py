@@ -0,0 +1,187 @@
+"""
+Server-side conversation sessions.
+
+A session keeps the last SESSION_MAX_TURNS question/answer pairs, which are
+sent to the LLM as history, and the candidate chunks of its last retrieval
+together with their stored embeddings. A follow-up question is embedded
+with the previous question for context. While that embedding stays close
+to the one that produced the cached candidates (cosine similarity of at
+least SESSION_DRIFT_THRESHOLD), the candidates are re-scored locally with
+one matrix-vector product and the vector store is not queried. When the
+topic drifts, the document scope changes or the corpus version moves on
+(chunks were added or deleted), retrieval runs again and replaces the
+cached candidates.
+
+Sessions live in this process's memory: idle sessions expire after
+SESSION_TTL seconds, and the least recently used are evicted beyond
+SESSION_MAX_SESSIONS or SESSION_MAX_MEMORY_MB. The store is ordered by last
+use and keeps a running memory total, so eviction only looks at the
+oldest sessions. Deployments with several worker processes need sticky
+routing for sessions to be found again. Concurrent requests on one session
+take turns, each holding the session's lock from retrieval to its answer.
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+import numpy as np
+
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "6"))
+SESSION_MAX_CANDIDATES = int(os.getenv("SESSION_MAX_CANDIDATES", "20"))
+SESSION_DRIFT_THRESHOLD = float(os.getenv("SESSION_DRIFT_THRESHOLD", "0.7"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_MEMORY_MB = float(os.getenv("SESSION_MAX_MEMORY_MB", "64"))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class Session:
+    """History and cached retrieval of one conversation"""
+
+    def __init__(self, session_id=None, max_turns=SESSION_MAX_TURNS):
+        self.id = session_id or uuid.uuid4().hex
+        self.history = deque(maxlen=max_turns)   # (question, answer)
+        self.candidates = []
+        self.candidate_embeddings = None        # normalised, one row per candidate
+        self.topic_embedding = None
+        self.sources = None
+        self.corpus_version = None              # vector store version the candidates came from
+        self.last_used = time.time()
+        self.accounted_bytes = 0                # size_bytes as last counted by the SessionStore
+        self.lock = asyncio.Lock()              # held for a whole turn, so turns do not interleave
+
+    def retrieval_text(self, query):
+        """The text embedded for retrieval: a follow-up is read together with the previous question"""
+        if not self.history:
+            return query
+        return f"{self.history[-1][0]} {query}"
+
+    def topic_similarity(self, query_embedding, sources, corpus_version):
+        """Cosine similarity to the retrieval behind the cached candidates, or None if they cannot be reused"""
+        if self.topic_embedding is None or not self.candidates:
+            return None
+        if sorted(set(sources or [])) != sorted(set(self.sources or [])):
+            return None
+        # An unknown version cannot prove the candidates still exist
+        if corpus_version is None or corpus_version != self.corpus_version:
+            return None
+        return float(_normalize(query_embedding) @ self.topic_embedding)
+
+    def remember_candidates(self, candidates, embeddings, query_embedding, sources, corpus_version):
+        self.candidates = list(candidates)
+        self.candidate_embeddings = _normalize(embeddings) if candidates else None
+        self.topic_embedding = _normalize(query_embedding)
+        self.sources = sources
+        self.corpus_version = corpus_version
+
+    def rescore(self, query_embedding, k):
+        """Cached candidates ordered by similarity to query_embedding, best first"""
+        similarities = self.candidate_embeddings @ _normalize(query_embedding)
+        order = np.argsort(-similarities)[:k]
+        return [{**self.candidates[i], "similarity": float(similarities[i])} for i in order]
+
+    def add_turn(self, question, answer):
+        self.history.append((question, answer))
+
+    @property
+    def size_bytes(self):
+        """Approximate memory held by the session"""
+        size = sum(len(question) + len(answer) for question, answer in self.history)
+        size += sum(len(row.get("content", "")) for row in self.candidates)
+        if self.candidate_embeddings is not None:
+            size += self.candidate_embeddings.nbytes
+        return size
+
+
+class SessionStore:
+    """In-memory sessions with LRU, TTL and memory caps"""
+
+    def __init__(self, max_sessions=SESSION_MAX_SESSIONS, ttl=SESSION_TTL,
+                 max_bytes=int(SESSION_MAX_MEMORY_MB * 1024 * 1024)):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self._sessions = OrderedDict()   # least recently used first
+        self._bytes = 0                  # sum of accounted_bytes over the stored sessions
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id=None):
+        """Return the live session with this id, or a new session if it is unknown or expired"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.last_used > self.ttl:
+                self._remove(session)
+                self.expirations += 1
+                session = None
+            if session is None:
+                session = Session()
+                self._sessions[session.id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session.id)
+            self._evict(now)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            self._remove(session)
+            return True
+
+    def touch(self, session):
+        """Record that the session changed, re-applying the caps to its new size"""
+        with self._lock:
+            session.last_used = time.time()
+            if self._sessions.get(session.id) is session:
+                self._sessions.move_to_end(session.id)
+                size = session.size_bytes
+                self._bytes += size - session.accounted_bytes
+                session.accounted_bytes = size
+            self._evict(session.last_used)
+
+    def _remove(self, session):
+        del self._sessions[session.id]
+        self._bytes -= session.accounted_bytes
+
+    def _evict(self, now):
+        # Sessions are ordered by last use, so the expired ones are all at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl:
+                break
+            self._remove(oldest)
+            self.expirations += 1
+        # Keep the most recently used session even if it alone is over the memory cap
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._sessions.values())))
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "memory_bytes": self._bytes,
+                "max_memory_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_store = SessionStore()
+
+
+def get_session_store():
+    """Return the process-wide session store"""
+    return _store
@@ -1,67 +1,404 @@
+import hashlib
 import os
-import openai
+import threading
+import time
+from collections import defaultdict
+from itertools import islice
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from upload_pdf import extract_text_from_pdf, split_text
 
 load_dotenv()
 
-# Initialize OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from db import get_supabase_client
+from upload_pdf import iter_pdf_pages, hash_file
+from chunking import chunk_pages
+from embeddings import embed_text, embed_texts
+from corpus_stats import invalidate_corpus_stats
+from lexical_index import update_lexical_index
+from vector_store import get_vector_store
+from admission import get_stage
+from pipeline import Pipeline, prefetch
+from grounding import get_grounding_index
 
-def get_supabase_client():
-    """Get Supabase client connection"""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_ANON_KEY")
-    return create_client(url, key)
+# Batching configuration for the ingestion path
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "100"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "3"))
+BATCH_RETRY_DELAY = float(os.getenv("BATCH_RETRY_DELAY", "1.0"))
+# Threads per ingestion pipeline stage; embedding calls are also capped process-wide
+# by the admission embedding stage (EMBEDDING_CONCURRENCY)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+INSERT_WORKERS = int(os.getenv("INSERT_WORKERS", "2"))
 
 def get_embedding(text):
-    """Generate embeddings using OpenAI's API"""
+    """Generate an embedding with the configured provider"""
     print(f"🔄 Generating embedding for text (length: {len(text)} chars)")
     try:
-        response = openai.Embedding.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        embedding = response['data'][0]['embedding']
+        embedding = embed_text(text)
         print(f"✅ Generated embedding with {len(embedding)} dimensions")
         return embedding
     except Exception as e:
         print(f"❌ Error generating embedding: {e}")
         raise
 
-def process_pdf_and_store(path):
-    print(f"📄 Processing PDF: {path}")
-    text = extract_text_from_pdf(path)
-    print(f"📝 Extracted {len(text)} characters from PDF")
-    
-    chunks = split_text(text)
-    print(f"✂️ Split into {len(chunks)} chunks")
-    
-    # Get Supabase client
-    supabase = get_supabase_client()
+def get_embeddings(texts):
+    """Generate embeddings for a list of texts in one provider call, skipping cache hits.
+
+    The call waits for a slot in the embedding stage, so ingestion never
+    runs more than EMBEDDING_CONCURRENCY embedding calls at once. Questions
+    use the separate query_embedding stage and do not wait behind it.
+    """
+    return get_stage("embedding").call(embed_texts, texts)
+
+def _with_retries(operation, description):
+    """Run operation, retrying with exponential backoff on failure"""
+    for attempt in range(1, BATCH_MAX_RETRIES + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == BATCH_MAX_RETRIES:
+                raise
+            delay = BATCH_RETRY_DELAY * (2 ** (attempt - 1))
+            print(f"⚠️ {description} failed (attempt {attempt}/{BATCH_MAX_RETRIES}): {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def hash_text(text):
+    """Stable content hash used to identify files and chunks"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _batched(items, size):
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+def store_chunks(chunks, source, supabase=None, progress=None, file_hash=None, inserted=None):
+    """Embed and store chunks in batches.
+
+    chunks may be any iterable, including a generator that is still
+    extracting later pages. Items are either chunk texts or chunk dicts from
+    chunking.chunk_pages; any keys besides content (page, offsets,
+    chunk_index) go into metadata. Chunking, embedding and inserts run as a
+    pipeline.Pipeline: chunks are grouped into batches of
+    EMBEDDING_BATCH_SIZE on one thread, EMBEDDING_WORKERS threads embed
+    batches and INSERT_WORKERS threads write rows with multi-row inserts of
+    up to INSERT_BATCH_SIZE, with bounded queues in between. A batch that
+    still fails after retries is reported in the result instead of aborting
+    the rest of the document. If given, progress is called with
+    (successful_chunks, failed_chunks, total_chunks) after every batch, and
+    the inserted rows (with their ids) are appended to inserted if given.
+    """
+    if supabase is None:
+        supabase = get_supabase_client()
+
+    stats = {
+        "total_chunks": 0,
+        "successful_chunks": 0,
+        "failed_chunks": 0,
+        "failed_batches": [],
+        "embedding_seconds": 0.0,
+        "insert_seconds": 0.0,
+    }
+    # Stage threads update stats, progress and inserted under this lock
+    stats_lock = threading.Lock()
+    started = time.perf_counter()
+
+    def report_progress():
+        if progress is not None:
+            progress(stats["successful_chunks"], stats["failed_chunks"], stats["total_chunks"])
+
+    def counted_batches():
+        numbered = ({"chunk_index": position, **({"content": item} if isinstance(item, str) else item)}
+                    for position, item in enumerate(chunks))
+        for batch in _batched(numbered, EMBEDDING_BATCH_SIZE):
+            with stats_lock:
+                stats["total_chunks"] += len(batch)
+            yield batch
+
+    def embed_batches(batches):
+        for batch in batches:
+            indexes = [chunk["chunk_index"] for chunk in batch]
+            texts = [chunk["content"] for chunk in batch]
+            print(f"🔄 Embedding chunks {indexes[0] + 1}-{indexes[-1] + 1}")
+
+            embed_started = time.perf_counter()
+            try:
+                embeddings = _with_retries(
+                    lambda: get_embeddings(texts),
+                    f"Embedding of chunks {indexes[0] + 1}-{indexes[-1] + 1}"
+                )
+            except Exception as e:
+                print(f"❌ Error embedding chunks {indexes[0] + 1}-{indexes[-1] + 1}: {e}")
+                with stats_lock:
+                    stats["failed_chunks"] += len(batch)
+                    stats["failed_batches"].append({"stage": "embedding", "chunk_indexes": indexes, "error": str(e)})
+                    report_progress()
+                continue
+            finally:
+                with stats_lock:
+                    stats["embedding_seconds"] += time.perf_counter() - embed_started
+
+            rows = []
+            for chunk, embedding in zip(batch, embeddings):
+                metadata = {key: value for key, value in chunk.items() if key != "content"}
+                metadata.update({"source": source, "chunk_hash": hash_text(chunk["content"])})
+                if file_hash:
+                    metadata["file_hash"] = file_hash
+                rows.append({
+                    'content': chunk["content"],
+                    'embedding': embedding,
+                    'metadata': metadata
+                })
+            yield rows
+
+    def insert(rows):
+        insert_started = time.perf_counter()
+        try:
+            response = _with_retries(
+                lambda: supabase.table('pdf_chunks').insert(rows).execute(),
+                f"Insert of {len(rows)} rows"
+            )
+            error = None
+        except Exception as e:
+            error = e
+        with stats_lock:
+            if error is None:
+                stats["successful_chunks"] += len(rows)
+                if inserted is not None:
+                    # Keep the embeddings we sent; PostgREST returns vectors as strings
+                    inserted.extend({**returned, 'embedding': sent['embedding']}
+                                    for returned, sent in zip(response.data or [], rows))
+            else:
+                indexes = [row['metadata']['chunk_index'] for row in rows]
+                print(f"❌ Error inserting chunks {min(indexes) + 1}-{max(indexes) + 1}: {error}")
+                stats["failed_chunks"] += len(rows)
+                stats["failed_batches"].append({"stage": "insert", "chunk_indexes": indexes, "error": str(error)})
+            stats["insert_seconds"] += time.perf_counter() - insert_started
+            report_progress()
+
+    def insert_rows(row_batches):
+        # Each writer accumulates embedded batches into inserts of INSERT_BATCH_SIZE rows
+        pending_rows = []
+        for rows in row_batches:
+            pending_rows.extend(rows)
+            while len(pending_rows) >= INSERT_BATCH_SIZE:
+                insert(pending_rows[:INSERT_BATCH_SIZE])
+                del pending_rows[:INSERT_BATCH_SIZE]
+        if pending_rows:
+            insert(pending_rows)
+
+    pipeline = Pipeline()
+    batches = pipeline.source("chunking", counted_batches())
+    row_batches = pipeline.stage("embedding", embed_batches, batches, workers=EMBEDDING_WORKERS)
+    pipeline.stage("insert", insert_rows, row_batches, workers=INSERT_WORKERS, sink=True)
+    pipeline.join()
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["embedding_seconds"] = round(stats["embedding_seconds"], 3)
+    stats["insert_seconds"] = round(stats["insert_seconds"], 3)
+    stats["chunks_per_second"] = round(stats["successful_chunks"] / elapsed, 2) if elapsed > 0 else 0.0
+    return stats
+
+def get_document_chunks(source, supabase=None, page_size=1000):
+    """Return [{'id', 'chunk_hash', 'file_hash', 'total_chunks'}] for every stored chunk of a source"""
+    if supabase is None:
+        supabase = get_supabase_client()
 
-    successful_chunks = 0
-    for i, chunk in enumerate(chunks):
+    rows = []
+    start = 0
+    while True:
+        response = (supabase.table('pdf_chunks')
+                    .select('id, metadata')
+                    .eq('metadata->>source', source)
+                    .order('id')
+                    .range(start, start + page_size - 1)
+                    .execute())
+        for row in response.data or []:
+            metadata = row.get('metadata') or {}
+            rows.append({
+                "id": row['id'],
+                "chunk_hash": metadata.get('chunk_hash'),
+                "file_hash": metadata.get('file_hash'),
+                "total_chunks": metadata.get('total_chunks')
+            })
+        if not response.data or len(response.data) < page_size:
+            return rows
+        start += page_size
+
+def delete_chunks(ids, supabase=None):
+    """Delete stored chunks by id in batches, returning how many were removed"""
+    if supabase is None:
+        supabase = get_supabase_client()
+
+    deleted = 0
+    for batch_start in range(0, len(ids), INSERT_BATCH_SIZE):
+        batch = ids[batch_start:batch_start + INSERT_BATCH_SIZE]
+        _with_retries(
+            lambda: supabase.table('pdf_chunks').delete().in_('id', batch).execute(),
+            f"Delete of {len(batch)} rows"
+        )
+        deleted += len(batch)
+    return deleted
+
+def mark_document_complete(source, file_hash, total_chunks, supabase=None):
+    """Stamp every stored chunk of source with the file hash and chunk count of a finished ingestion"""
+    if supabase is None:
+        supabase = get_supabase_client()
+
+    _with_retries(
+        lambda: supabase.rpc('mark_pdf_document_complete', {
+            'doc_source': source,
+            'doc_file_hash': file_hash,
+            'doc_total_chunks': total_chunks
+        }).execute(),
+        f"Marking {source} complete"
+    )
+
+def _update_derived_indexes(added_rows, removed_ids):
+    """Apply rows added to and removed from pdf_chunks to the caches and indexes derived from it"""
+    invalidate_corpus_stats()
+    # The lexical index and local vector store are derived data; a
+    # failure here only degrades search until they are rebuilt
+    try:
+        update_lexical_index(added_rows, removed_ids)
+    except Exception as e:
+        print(f"⚠️ Could not update lexical index: {e}")
+    try:
+        get_vector_store().update(added_rows, removed_ids)
+    except Exception as e:
+        print(f"⚠️ Could not update {get_vector_store().name} vector store: {e}")
+    # Word and bigram sets for grounding checks of answers over these chunks
+    grounding_index = get_grounding_index()
+    grounding_index.remove(removed_ids)
+    grounding_index.add(added_rows)
+
+def sync_document(chunks, source, file_hash, supabase=None, progress=None):
+    """Bring the stored chunks of a document in line with a new version of it.
+
+    Chunks are matched on chunk_hash: only new chunks are embedded and
+    inserted, and stored chunks that no longer appear are deleted, so the
+    cost is proportional to the size of the change. Once every chunk is
+    stored, all of the document's rows are stamped with file_hash and the
+    chunk count (mark_document_complete); re-uploading a file whose rows all
+    carry that marker is a no-op. If any batch fails, the previous
+    version's chunks are kept and the marker is not set, so the next upload
+    of the same file fills in what is missing. An upload that yields no
+    chunks at all changes nothing, so the caller can reject it.
+    """
+    if supabase is None:
+        supabase = get_supabase_client()
+
+    existing = get_document_chunks(source, supabase)
+    if existing and all(row["file_hash"] == file_hash and row["total_chunks"] == len(existing)
+                        for row in existing):
+        print(f"⏭️ {source} is unchanged ({len(existing)} chunks already stored)")
+        return {
+            "total_chunks": len(existing),
+            "successful_chunks": 0,
+            "unchanged_chunks": len(existing),
+            "deleted_chunks": 0,
+            "failed_chunks": 0,
+            "failed_batches": [],
+            "embedding_seconds": 0.0,
+            "insert_seconds": 0.0,
+            "elapsed_seconds": 0.0,
+            "chunks_per_second": 0.0,
+            "unchanged": True
+        }
+
+    # Stored ids by chunk hash; each matching new chunk claims one of them
+    stored_ids = defaultdict(list)
+    for row in existing:
+        stored_ids[row["chunk_hash"]].append(row["id"])
+
+    counts = {"total": 0, "unchanged": 0}
+
+    # Unchanged chunks keep their stored metadata; their page and offsets
+    # may be stale if earlier text moved, which only affects citations
+    def changed_chunks():
+        for chunk_index, chunk in enumerate(chunks):
+            counts["total"] += 1
+            if isinstance(chunk, str):
+                chunk = {"content": chunk}
+            ids = stored_ids.get(hash_text(chunk["content"]))
+            if ids:
+                ids.pop()
+                counts["unchanged"] += 1
+            else:
+                yield {**chunk, "chunk_index": chunk_index}
+
+    inserted = []
+    stale_ids = []
+    deleted = 0
+    try:
+        stats = store_chunks(changed_chunks(), source, supabase=supabase, progress=progress,
+                             file_hash=file_hash, inserted=inserted)
+        if counts["total"] == 0:
+            # A scanned, empty or unreadable upload must not wipe the stored version
+            print(f"⚠️ No chunks extracted from {source}; keeping its {len(existing)} stored chunks")
+        elif stats["failed_chunks"]:
+            print(f"⚠️ {stats['failed_chunks']} chunks of {source} were not stored; "
+                  f"keeping its previous chunks until an upload completes")
+        else:
+            stale_ids = [chunk_id for ids in stored_ids.values() for chunk_id in ids]
+            if stale_ids:
+                deleted = delete_chunks(stale_ids, supabase)
+    finally:
+        # Rows inserted before a pipeline error are in pdf_chunks as well, so
+        # the derived indexes must learn about them even when this raises
+        if inserted or stale_ids:
+            _update_derived_indexes(inserted, stale_ids)
+
+    if counts["total"] and not stats["failed_chunks"]:
         try:
-            print(f"🔄 Processing chunk {i+1}/{len(chunks)} (length: {len(chunk)} chars)")
-            embedding = get_embedding(chunk)
-            
-            # Insert using Supabase client
-            response = supabase.table('pdf_chunks').insert({
-                'content': chunk,
-                'embedding': embedding,
-                'metadata': {"source": "upload", "chunk_index": i}
-            }).execute()
-            
-            successful_chunks += 1
-            print(f"✅ Stored chunk {i+1} successfully")
-            
+            mark_document_complete(source, file_hash, counts["total"], supabase)
         except Exception as e:
-            print(f"❌ Error storing chunk {i+1}: {e}")
+            print(f"⚠️ Could not mark {source} complete; the next upload will compare it chunk by chunk: {e}")
+
+    print(f"🔁 Synced {source}: {stats['successful_chunks']} added, "
+          f"{counts['unchanged']} unchanged, {deleted} deleted")
+
+    stats["total_chunks"] = counts["total"]
+    stats["unchanged_chunks"] = counts["unchanged"]
+    stats["deleted_chunks"] = deleted
+    stats["unchanged"] = False
+    return stats
+
+def summarize_ingestion(stats, source):
+    """Build the API response body for a finished ingestion"""
+    if stats.get("unchanged"):
+        message = f"{source} is unchanged; {stats['total_chunks']} chunks already stored"
+    else:
+        message = (f"Successfully processed {source}: {stats['successful_chunks']} chunks added, "
+                   f"{stats.get('unchanged_chunks', 0)} unchanged, {stats.get('deleted_chunks', 0)} removed")
+    return {
+        "message": message,
+        "total_chunks": stats["total_chunks"],
+        "successful_chunks": stats["successful_chunks"],
+        "unchanged_chunks": stats.get("unchanged_chunks", 0),
+        "deleted_chunks": stats.get("deleted_chunks", 0),
+        "failed_chunks": stats["failed_chunks"],
+        "failed_batches": stats["failed_batches"],
+        "throughput": {
+            "elapsed_seconds": stats["elapsed_seconds"],
+            "embedding_seconds": stats["embedding_seconds"],
+            "insert_seconds": stats["insert_seconds"],
+            "chunks_per_second": stats["chunks_per_second"]
+        },
+        "status": "success" if stats["failed_chunks"] == 0 else "partial"
+    }
+
+def process_pdf_and_store(path):
+    print(f"📄 Processing PDF: {path}")
+    # Pages are extracted on their own thread while earlier chunks are embedded and stored
+    chunks = chunk_pages(prefetch(iter_pdf_pages(path)))
+    
+    stats = sync_document(chunks, source=os.path.basename(path), file_hash=hash_file(path))
     
-    print(f"🎉 Successfully stored {successful_chunks}/{len(chunks)} chunks")
-    return successful_chunks
+    print(f"🎉 Successfully stored {stats['successful_chunks']}/{stats['total_chunks']} chunks "
+          f"in {stats['elapsed_seconds']}s ({stats['chunks_per_second']} chunks/s)")
+    return stats['successful_chunks']
 
 if __name__ == "__main__":
-    process_pdf_and_store("yourfile.pdf")
\ No newline at end of file
+    process_pdf_and_store("yourfile.pdf")
@@ -0,0 +1,116 @@
+"""
+Pick pgvector index settings for pdf_chunks from its row count.
+
+    fewer than HNSW_MIN_ROWS rows   ivfflat with lists = rows / 1000 (at least 10)
+                                    and probes = sqrt(lists)
+    HNSW_MIN_ROWS rows or more      hnsw with m and ef_construction scaled to
+                                    the table, and a matching hnsw.ef_search
+
+ivfflat is cheap to build and rebuild while a corpus is small and changing;
+its centroids are computed from existing rows, so it must be rebuilt as the
+table grows. HNSW costs more to build but keeps recall and latency steady at
+millions of rows and needs no retraining. Query-time settings are attached
+to search_pdf_chunks and search_pdf_chunks_scoped with ALTER FUNCTION ...
+SET, so every call uses them.
+
+Usage:
+    python tune_vector_index.py              # print the SQL for the current row count
+    python tune_vector_index.py 2500000      # print the SQL for a given row count
+    python tune_vector_index.py --apply      # run it (needs pip install psycopg2-binary and SUPABASE_HOST etc.)
+"""
+import math
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HNSW_MIN_ROWS = int(os.getenv("HNSW_MIN_ROWS", "100000"))
+# Every function whose queries can use the embedding index
+SEARCH_FUNCTIONS = (
+    "search_pdf_chunks(vector, float, int)",
+    "search_pdf_chunks_scoped(vector, text[], float, int)",
+)
+
+
+def recommend_vector_index(row_count):
+    """Return {'method', 'params', 'query_settings', 'sql'} for a table of row_count rows"""
+    if row_count < HNSW_MIN_ROWS:
+        lists = max(10, row_count // 1000)
+        probes = max(1, round(math.sqrt(lists)))
+        method = "ivfflat"
+        params = {"lists": lists}
+        query_settings = {"ivfflat.probes": probes}
+        using = f"ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})"
+    else:
+        m, ef_construction = (16, 64) if row_count < 1_000_000 else (24, 128)
+        method = "hnsw"
+        params = {"m": m, "ef_construction": ef_construction}
+        query_settings = {"hnsw.ef_search": 100 if row_count < 1_000_000 else 200}
+        using = f"hnsw (embedding vector_cosine_ops) WITH (m = {m}, ef_construction = {ef_construction})"
+
+    statements = [
+        "DROP INDEX IF EXISTS pdf_chunks_embedding_idx;",
+        f"CREATE INDEX pdf_chunks_embedding_idx ON pdf_chunks USING {using};",
+    ]
+    for function in SEARCH_FUNCTIONS:
+        statements.append(f"ALTER FUNCTION {function} RESET ALL;")
+        statements += [f"ALTER FUNCTION {function} SET {name} = {value};"
+                       for name, value in query_settings.items()]
+    statements.append("ANALYZE pdf_chunks;")
+    return {"method": method, "params": params, "query_settings": query_settings, "sql": statements}
+
+
+def get_row_count():
+    from corpus_stats import get_corpus_stats
+    stats = get_corpus_stats()
+    if stats is None:
+        raise RuntimeError("Could not read corpus statistics; pass the row count explicitly")
+    return stats["total_chunks"]
+
+
+def apply_statements(statements):
+    """Run the statements over a direct Postgres connection (PostgREST cannot run DDL)"""
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("--apply needs psycopg2; install it with: pip install psycopg2-binary") from None
+    conn = psycopg2.connect(
+        host=os.getenv("SUPABASE_HOST"),
+        database=os.getenv("SUPABASE_DB"),
+        user=os.getenv("SUPABASE_USER"),
+        password=os.getenv("SUPABASE_PASSWORD"),
+        port=os.getenv("SUPABASE_PORT")
+    )
+    try:
+        with conn, conn.cursor() as cur:
+            # Index builds on large tables take longer than the default statement timeout
+            cur.execute("SET statement_timeout = 0;")
+            for statement in statements:
+                print(f"🔄 {statement}")
+                cur.execute(statement)
+    finally:
+        conn.close()
+
+
+def main(argv):
+    apply = "--apply" in argv
+    counts = [arg for arg in argv if arg != "--apply"]
+    try:
+        row_count = int(counts[0]) if counts else get_row_count()
+        recommendation = recommend_vector_index(row_count)
+        print(f"📊 {row_count} rows → {recommendation['method']} {recommendation['params']}, "
+              f"query settings {recommendation['query_settings']}")
+        print()
+        print("\n".join(recommendation["sql"]))
+        if apply:
+            print()
+            apply_statements(recommendation["sql"])
+            print("✅ Vector index rebuilt")
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,12 +1,100 @@
+import hashlib
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pypdf import PdfReader
 
-def extract_text_from_pdf(path):
+# Page extraction is CPU-bound; use a process pool for large PDFs when > 1
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "1"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+# Uploads are copied to disk in fixed-size blocks and capped at MAX_UPLOAD_MB
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "100"))
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size"""
+
+async def save_upload_to_tempfile(upload, max_bytes=None, block_size=None, suffix='.pdf'):
+    """Stream an uploaded file to a temporary file.
+
+    The upload is read block_size bytes at a time so peak memory does not
+    depend on the file size, and the size limit is enforced as the bytes
+    arrive. The partial file is removed if the limit is exceeded.
+    Returns (path, sha256 hex digest of the content).
+    """
+    max_bytes = int(MAX_UPLOAD_MB * 1024 * 1024) if max_bytes is None else max_bytes
+    block_size = block_size or UPLOAD_BLOCK_SIZE
+
+    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp_file:
+            while True:
+                block = await upload.read(block_size)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"File exceeds the maximum upload size of {max_bytes / (1024 * 1024):g} MB"
+                    )
+                digest.update(block)
+                tmp_file.write(block)
+    except BaseException:
+        os.unlink(tmp_file.name)
+        raise
+    return tmp_file.name, digest.hexdigest()
+
+def hash_file(path, block_size=None):
+    """Return the sha256 hex digest of a file, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size or UPLOAD_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _extract_page_range(path, start, stop):
+    """Extract pages [start, stop) in a worker process"""
     reader = PdfReader(path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
-
-def split_text(text, chunk_size=500):
-    words = text.split()
-    return [' '.join(words[i:i+chunk_size]) for i in range(0, len(words), chunk_size)]
\ No newline at end of file
+    return [(n + 1, reader.pages[n].extract_text() or "") for n in range(start, stop)]
+
+def iter_pdf_pages(path, workers=None, pages_per_task=None):
+    """Yield (page_number, text) for every page of the PDF, in page order.
+
+    With workers > 1 the pages are split into ranges of pages_per_task and
+    extracted across a process pool. Results are still yielded in page order,
+    and early pages are yielded as soon as their range is done so callers can
+    start chunking before the whole document has been read.
+    """
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    pages_per_task = pages_per_task or PDF_PAGES_PER_TASK
+
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+
+    if workers <= 1 or page_count <= pages_per_task:
+        for n, page in enumerate(reader.pages, start=1):
+            yield n, page.extract_text() or ""
+        return
+
+    ranges = deque((start, min(start + pages_per_task, page_count))
+                   for start in range(0, page_count, pages_per_task))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # Keep a bounded window of ranges in flight so a slow consumer does
+        # not cause the whole document to be buffered in memory
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                start, stop = ranges.popleft()
+                in_flight.append(executor.submit(_extract_page_range, path, start, stop))
+            for page in in_flight.popleft().result():
+                yield page
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def extract_text_from_pdf(path, workers=None):
+    return "".join(text for _, text in iter_pdf_pages(path, workers=workers))
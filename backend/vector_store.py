@@ -0,0 +1,639 @@
+"""
+Vector stores for similarity search.
+
+VECTOR_STORE selects where get_similar_chunks looks up neighbours:
+    supabase  the search_pdf_chunks RPC against pgvector (one round trip per query)
+    local     float32 embeddings in a memory-mapped matrix on local disk, with
+              chunk ids, content and metadata in a JSON-lines sidecar log
+
+The local store is a search mirror of pdf_chunks: ingestion still writes
+the chunks to Supabase, which assigns their ids, and then copies the new
+rows here. It keeps every row L2-normalised so cosine similarity is a
+single matrix-vector product, and picks the top k with argpartition. The
+matrix is mapped read-only, so any number of worker processes share the
+same pages through the OS page cache instead of each holding a copy.
+Writers append vectors to the matrix and one line per update to the
+sidecar under a file lock. Readers apply only the lines added since their
+last look and publish the result as an immutable snapshot, so searches run
+in parallel without holding a lock. Deleted rows are masked out of searches
+and dropped when the store is compacted into a new generation of files.
+
+LOCAL_VECTOR_INDEX=hnsw adds an HNSW graph (hnsw_index.py, native hnswlib
+when installed) saved next to the matrix, for corpora where a full scan per
+query is too slow. A background thread inserts new rows into a private copy
+of the graph and publishes a fresh copy for searches, so updates and
+searches never wait for it. Rows the graph does not cover yet, including
+every row right after a compaction while the graph is rebuilt, are scanned
+exactly.
+
+Usage:
+    python vector_store.py rebuild    # copy every chunk in pdf_chunks into the local store
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import uuid
+import weakref
+import asyncio
+import heapq
+import numpy as np
+from hnsw_index import HNSW_INDEX_CLASS, HNSWIndex, create_hnsw_index, load_hnsw_index
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "supabase")
+LOCAL_VECTOR_STORE_PATH = os.getenv(
+    "LOCAL_VECTOR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "vectors")
+)
+# exact: brute-force scan of the whole matrix; hnsw: approximate search on an HNSW graph
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "exact")
+# Compact the matrix once this fraction of its rows are deleted
+VECTOR_STORE_COMPACT_RATIO = float(os.getenv("VECTOR_STORE_COMPACT_RATIO", "0.25"))
+# Rows per sidecar line, and per matrix write, when compacting
+SIDECAR_RECORD_SIZE = 1000
+
+
+def parse_embedding(embedding):
+    """pgvector columns come back from PostgREST as '[0.1,0.2,...]' strings"""
+    if isinstance(embedding, str):
+        return json.loads(embedding)
+    return embedding
+
+
+class VectorStore:
+    """Interface for nearest-neighbour search over stored chunks"""
+
+    name = None
+
+    def count(self, sources=None):
+        """Number of searchable chunks (in the given sources), or None if unknown"""
+        raise NotImplementedError
+
+    def version(self):
+        """Value that changes whenever the stored chunks change, or None if unknown"""
+        raise NotImplementedError
+
+    def search(self, query_embedding, match_threshold=0.2, match_count=5, sources=None):
+        """Return up to match_count rows {'id', 'content', 'metadata', 'similarity'}
+        with cosine similarity above match_threshold, most similar first.
+        If sources is given, only chunks of those documents are searched."""
+        raise NotImplementedError
+
+    async def asearch(self, query_embedding, match_threshold=0.2, match_count=5, sources=None):
+        """search() for async callers; runs in a worker thread unless overridden"""
+        return await asyncio.to_thread(self.search, query_embedding, match_threshold, match_count, sources)
+
+    def get_embeddings(self, ids):
+        """Stored embeddings of the given chunk ids as {id: vector}; unknown ids are left out"""
+        raise NotImplementedError
+
+    async def aget_embeddings(self, ids):
+        """get_embeddings() for async callers; runs in a worker thread unless overridden"""
+        return await asyncio.to_thread(self.get_embeddings, ids)
+
+    def update(self, added_rows=(), removed_ids=()):
+        """Mirror inserted pdf_chunks rows (with embeddings) and deleted ids"""
+
+
+class SupabaseVectorStore(VectorStore):
+    """pgvector search through the search_pdf_chunks function"""
+
+    name = "supabase"
+
+    def __init__(self, get_client=None):
+        if get_client is None:
+            from db import get_supabase_client as get_client
+        self.get_client = get_client
+
+    def count(self, sources=None):
+        from corpus_stats import get_corpus_stats
+        stats = get_corpus_stats(self.get_client())
+        if stats is None:
+            return None
+        if sources:
+            return sum(stats["documents"].get(source, 0) for source in sources)
+        return stats["total_chunks"]
+
+    def version(self):
+        from corpus_stats import get_corpus_stats
+        stats = get_corpus_stats(self.get_client())
+        return None if stats is None else stats["version"]
+
+    def search(self, query_embedding, match_threshold=0.2, match_count=5, sources=None):
+        params = {
+            'query_embedding': list(query_embedding),
+            'match_threshold': match_threshold,
+            'match_count': match_count
+        }
+        function = self._function(params, sources)
+        response = self.get_client().rpc(function, params).execute()
+        return response.data or []
+
+    def get_embeddings(self, ids):
+        response = self.get_client().table('pdf_chunks').select('id, embedding').in_('id', list(ids)).execute()
+        return {row['id']: parse_embedding(row['embedding']) for row in response.data or []}
+
+    async def aget_embeddings(self, ids):
+        from db import get_async_postgrest_client
+        response = await (get_async_postgrest_client().from_('pdf_chunks')
+                          .select('id, embedding').in_('id', list(ids)).execute())
+        return {row['id']: parse_embedding(row['embedding']) for row in response.data or []}
+
+    async def asearch(self, query_embedding, match_threshold=0.2, match_count=5, sources=None):
+        # Same RPC over the pooled async PostgREST client, so no thread is held
+        from db import get_async_postgrest_client
+        params = {
+            'query_embedding': list(query_embedding),
+            'match_threshold': match_threshold,
+            'match_count': match_count
+        }
+        function = self._function(params, sources)
+        response = await get_async_postgrest_client().rpc(function, params).execute()
+        return response.data or []
+
+    @staticmethod
+    def _function(params, sources):
+        if sources:
+            params['sources'] = list(sources)
+            return 'search_pdf_chunks_scoped'
+        return 'search_pdf_chunks'
+
+    # pdf_chunks is the store itself, so there is nothing to mirror
+
+
+class LocalSnapshot:
+    """Contents of the local store at one point of its sidecar log.
+
+    Searches read a snapshot without locking; a reload builds a new one. The
+    ids and rows lists only ever grow until a compaction starts new ones, so
+    snapshots share them and read only their first count entries.
+    """
+
+    def __init__(self):
+        self.file_id = None        # (device, inode) of the sidecar read so far
+        self.offset = 0            # bytes of that sidecar already applied
+        self.sidecar_id = None     # changes whenever the sidecar is rewritten
+        self.generation = 0        # numbers the matrix (and graph) files of this sidecar
+        self.dimension = None
+        self.ids = []              # row -> chunk id
+        self.rows = []             # row -> {"content", "metadata"}
+        self.count = 0
+        self.live = np.zeros(0, dtype=bool)
+        self.live_count = 0
+        self.source_rows = {}      # source -> array of live rows
+        self.matrix = None
+
+    @property
+    def deleted(self):
+        return self.count - self.live_count
+
+
+class LocalVectorStore(VectorStore):
+    """Memory-mapped float32 matrix with an append-only sidecar of chunk ids and metadata.
+
+    This is a local mirror of pdf_chunks for searching, not a standalone
+    chunk store: ingestion still writes to Supabase, which assigns the ids,
+    and update() copies the new rows here.
+    """
+
+    name = "local"
+    _warned = False
+
+    def __init__(self, path=LOCAL_VECTOR_STORE_PATH, index_type=LOCAL_VECTOR_INDEX):
+        if index_type not in ("exact", "hnsw"):
+            raise ValueError(f"Unknown LOCAL_VECTOR_INDEX '{index_type}', expected 'exact' or 'hnsw'")
+        self.path = path
+        self.index_type = index_type
+        self.meta_path = os.path.join(path, "meta.jsonl")
+        self._snapshot = LocalSnapshot()
+        self._row_of = {}           # chunk id -> live row, kept in step with the latest snapshot
+        self._source_members = {}   # source -> set of live rows
+        self._reload_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._graph = None          # (sidecar id, HNSW graph) that searches read, never modified
+        self._working_graph = None  # (sidecar id, graph, saved file mtime) that the indexer inserts into
+        self._graph_lock = threading.Lock()
+        self._indexer = None
+        self._indexer_wake = threading.Event()
+        self._indexer_stop = threading.Event()
+        if index_type == "hnsw" and HNSW_INDEX_CLASS is HNSWIndex and not LocalVectorStore._warned:
+            LocalVectorStore._warned = True
+            print("⚠️ hnswlib is not installed; using the much slower pure-Python HNSW graph")
+
+    def matrix_path(self, generation):
+        return os.path.join(self.path, f"vectors-{generation}.f32")
+
+    def graph_path(self, generation):
+        return os.path.join(self.path, f"hnsw-{generation}{HNSW_INDEX_CLASS.suffix}")
+
+    def count(self, sources=None):
+        snapshot = self.snapshot()
+        if sources:
+            return sum(len(snapshot.source_rows.get(source, ())) for source in sources)
+        return snapshot.live_count
+
+    def version(self):
+        # Every update appends to the sidecar and every rewrite gives it a new id
+        snapshot = self.snapshot()
+        if snapshot.sidecar_id is None:
+            return None
+        return f"{snapshot.sidecar_id}:{snapshot.offset}"
+
+    def snapshot(self):
+        """The current contents, reading the sidecar only when it has changed on disk"""
+        snapshot = self._snapshot
+        try:
+            stat = os.stat(self.meta_path)
+        except OSError:
+            return snapshot
+        if (stat.st_dev, stat.st_ino) == snapshot.file_id and stat.st_size == snapshot.offset:
+            return snapshot
+        with self._reload_lock:
+            self._reload()
+            return self._snapshot
+
+    def _reload(self):
+        """Apply the sidecar lines written since the current snapshot; the caller holds _reload_lock"""
+        previous = self._snapshot
+        try:
+            stat = os.stat(self.meta_path)
+        except OSError:
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id == previous.file_id and stat.st_size == previous.offset:
+            return
+        if file_id != previous.file_id or stat.st_size < previous.offset:
+            # Rewritten by a compaction or rebuild: start again with new lists
+            previous = LocalSnapshot()
+            self._row_of = {}
+            self._source_members = {}
+        with open(self.meta_path, "rb") as f:
+            f.seek(previous.offset)
+            data = f.read()
+        # A writer may be midway through a line; leave it for the next reload
+        complete = data[:data.rfind(b"\n") + 1]
+
+        snapshot = LocalSnapshot()
+        snapshot.file_id = file_id
+        snapshot.offset = previous.offset + len(complete)
+        snapshot.sidecar_id = previous.sidecar_id
+        snapshot.generation = previous.generation
+        snapshot.dimension = previous.dimension
+        snapshot.ids = ids = previous.ids
+        snapshot.rows = rows = previous.rows
+        removed_rows = []
+        touched = set()
+        for line in complete.splitlines():
+            record = json.loads(line)
+            if "generation" in record:
+                snapshot.sidecar_id = record["id"]
+                snapshot.generation = record["generation"]
+                snapshot.dimension = record["dimension"]
+            for chunk_id in record.get("remove", ()):
+                row = self._row_of.pop(chunk_id, None)
+                if row is not None:
+                    removed_rows.append(row)
+                    source = rows[row]["metadata"].get("source")
+                    self._source_members[source].discard(row)
+                    touched.add(source)
+            for chunk_id, content, metadata in record.get("add", ()):
+                row = len(ids)
+                ids.append(chunk_id)
+                rows.append({"content": content, "metadata": metadata})
+                # A re-added id replaces its previous row
+                replaced = self._row_of.get(chunk_id)
+                if replaced is not None:
+                    removed_rows.append(replaced)
+                    old_source = rows[replaced]["metadata"].get("source")
+                    self._source_members[old_source].discard(replaced)
+                    touched.add(old_source)
+                self._row_of[chunk_id] = row
+                source = metadata.get("source")
+                self._source_members.setdefault(source, set()).add(row)
+                touched.add(source)
+
+        snapshot.count = len(ids)
+        live = np.ones(snapshot.count, dtype=bool)
+        live[:previous.count] = previous.live
+        live[removed_rows] = False
+        snapshot.live = live
+        snapshot.live_count = len(self._row_of)
+        snapshot.source_rows = dict(previous.source_rows)
+        for source in touched:
+            members = self._source_members.get(source)
+            if members:
+                snapshot.source_rows[source] = np.array(sorted(members), dtype=np.int64)
+            else:
+                snapshot.source_rows.pop(source, None)
+                self._source_members.pop(source, None)
+        if snapshot.count:
+            snapshot.matrix = np.memmap(self.matrix_path(snapshot.generation), dtype=np.float32, mode="r",
+                                        shape=(snapshot.count, snapshot.dimension))
+        self._snapshot = snapshot
+        if self.index_type == "hnsw" and snapshot.count:
+            self._wake_indexer()
+
+    def _wake_indexer(self):
+        if self._indexer is None:
+            self._indexer = threading.Thread(target=self._run_indexer, name="hnsw-indexer", daemon=True)
+            self._indexer.start()
+            _indexed_stores.add(self)
+        self._indexer_wake.set()
+
+    def _run_indexer(self):
+        while True:
+            self._indexer_wake.wait()
+            self._indexer_wake.clear()
+            if self._indexer_stop.is_set():
+                return
+            try:
+                self.build_index()
+            except Exception as e:
+                print(f"❌ Updating the HNSW graph failed: {e}")
+
+    def stop_indexer(self):
+        """Stop the background indexer once its current build is done.
+
+        Run at exit: a daemon thread killed inside hnswlib aborts the process.
+        Rows it had not reached are inserted by the next build.
+        """
+        if self._indexer is not None:
+            self._indexer_stop.set()
+            self._indexer_wake.set()
+            self._indexer.join()
+
+    def build_index(self):
+        """Bring the HNSW graph up to the current rows and publish it for searches.
+
+        Normally run by the background indexer; call it directly to wait for
+        the graph, e.g. after a bulk load. Processes take turns through a
+        file lock, and each starts from the newest graph saved by any of
+        them, so a row is inserted only once. Returns the published graph.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with self._graph_lock, open(os.path.join(self.path, "hnsw.lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            snapshot = self.snapshot()
+            if not snapshot.count:
+                return None
+            graph_path = self.graph_path(snapshot.generation)
+            try:
+                saved_mtime = os.path.getmtime(graph_path)
+            except OSError:
+                saved_mtime = None
+            working = self._working_graph
+            if working is not None and working[0] == snapshot.sidecar_id and working[2] == saved_mtime:
+                index = working[1]
+            elif saved_mtime is not None:
+                index = load_hnsw_index(graph_path, snapshot.dimension)
+            else:
+                # New store, or the rows were just renumbered by a compaction
+                index = create_hnsw_index(snapshot.dimension)
+            # A graph saved by another process never covers rows missing from the sidecar
+            count = max(snapshot.count, len(index))
+            covered = len(index)
+            index.add(np.memmap(self.matrix_path(snapshot.generation), dtype=np.float32, mode="r",
+                                shape=(count, snapshot.dimension)), count)
+            if len(index) > covered:
+                index.save(graph_path)
+                saved_mtime = os.path.getmtime(graph_path)
+                # The sidecar may have been compacted while this graph was built
+                self._remove_old_generations(self.snapshot().generation)
+            self._working_graph = (snapshot.sidecar_id, index, saved_mtime)
+            published = self._graph
+            if published is None or published[0] != snapshot.sidecar_id or len(published[1]) != len(index):
+                self._graph = (snapshot.sidecar_id, index.copy())
+            return self._graph[1]
+
+    def current_index(self, snapshot):
+        """The published HNSW graph for the snapshot's rows, or None while there is none"""
+        graph = self._graph
+        if graph is None or graph[0] != snapshot.sidecar_id:
+            return None
+        return graph[1]
+
+    @staticmethod
+    def _exact_candidates(snapshot, query, start, match_threshold, match_count):
+        """Brute-force top match_count (similarity, row) pairs among rows start.."""
+        similarities = snapshot.matrix[start:] @ query
+        candidates = np.flatnonzero((similarities > match_threshold) & snapshot.live[start:])
+        if len(candidates) > match_count:
+            candidates = candidates[np.argpartition(-similarities[candidates], match_count - 1)[:match_count]]
+        return [(float(similarities[row]), start + int(row)) for row in candidates]
+
+    @staticmethod
+    def _scoped_candidates(snapshot, query, sources, match_threshold, match_count):
+        """Exact top match_count (similarity, row) pairs among the rows of the given sources"""
+        rows = [snapshot.source_rows[source] for source in sources if source in snapshot.source_rows]
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        similarities = snapshot.matrix[rows] @ query
+        candidates = np.flatnonzero(similarities > match_threshold)
+        if len(candidates) > match_count:
+            candidates = candidates[np.argpartition(-similarities[candidates], match_count - 1)[:match_count]]
+        return [(float(similarities[i]), int(rows[i])) for i in candidates]
+
+    def search(self, query_embedding, match_threshold=0.2, match_count=5, sources=None):
+        snapshot = self.snapshot()
+        if snapshot.matrix is None or match_count <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+        index = self.current_index(snapshot) if self.index_type == "hnsw" else None
+        if sources:
+            # Scoped queries only read the chosen documents' rows
+            found = self._scoped_candidates(snapshot, query, sources, match_threshold, match_count)
+        elif index is not None:
+            # The graph may lag the matrix by rows the indexer has not reached
+            # yet; those are scanned exactly. Deleted rows are still in the
+            # graph, so ask it for enough extra candidates to skip them.
+            graph_rows = min(len(index), snapshot.count)
+            ef = max(index.ef_search, match_count + min(snapshot.deleted, match_count))
+            found = [(similarity, row) for similarity, row in index.search(query, ef)
+                     if row < graph_rows and snapshot.live[row] and similarity > match_threshold]
+            found += self._exact_candidates(snapshot, query, graph_rows, match_threshold, match_count)
+        else:
+            found = self._exact_candidates(snapshot, query, 0, match_threshold, match_count)
+        return [{
+            "id": snapshot.ids[row],
+            "content": snapshot.rows[row]["content"],
+            "metadata": snapshot.rows[row]["metadata"],
+            "similarity": similarity
+        } for similarity, row in heapq.nlargest(match_count, found)]
+
+    def get_embeddings(self, ids):
+        # Rows are normalised, which is all a caller comparing cosine similarities needs
+        with self._reload_lock:
+            self._reload()
+            snapshot = self._snapshot
+            rows = {chunk_id: self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of}
+        if not rows:
+            return {}
+        return dict(zip(rows, np.asarray(snapshot.matrix[list(rows.values())])))
+
+    def update(self, added_rows=(), removed_ids=()):
+        """Append rows and deletions to the matrix and sidecar under a file lock shared with other processes"""
+        os.makedirs(self.path, exist_ok=True)
+        with self._write_lock, open(os.path.join(self.path, "lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self._reload_lock:
+                self._reload()
+                snapshot = self._snapshot
+                removed_ids = [chunk_id for chunk_id in dict.fromkeys(removed_ids) if chunk_id in self._row_of]
+
+            added_rows = [row for row in added_rows if row.get('embedding') is not None]
+            if not added_rows and not removed_ids:
+                return
+            if added_rows:
+                vectors = np.asarray([parse_embedding(row['embedding']) for row in added_rows],
+                                     dtype=np.float32)
+                if snapshot.dimension is None:
+                    snapshot = self._start_sidecar(snapshot.generation, vectors.shape[1])
+                elif vectors.shape[1] != snapshot.dimension:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match "
+                                     f"the local vector store ({snapshot.dimension})")
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.where(norms == 0, 1.0, norms)
+                matrix_path = self.matrix_path(snapshot.generation)
+                with open(matrix_path, "ab") as f:
+                    # Drop rows a failed writer appended without recording them in the sidecar
+                    f.truncate(snapshot.count * snapshot.dimension * 4)
+                    f.write(vectors.astype(np.float32).tobytes())
+            # The matrix is written first, so a reader never sees a sidecar row without its vector
+            record = {"remove": removed_ids,
+                      "add": [[row['id'], row['content'], row.get('metadata') or {}] for row in added_rows]}
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+            with self._reload_lock:
+                self._reload()
+                snapshot = self._snapshot
+            if snapshot.count and snapshot.deleted / snapshot.count >= VECTOR_STORE_COMPACT_RATIO:
+                self._compact(snapshot)
+                with self._reload_lock:
+                    self._reload()
+
+    def _start_sidecar(self, generation, dimension):
+        """Write the header of an empty store's sidecar and return the resulting snapshot"""
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"generation": generation, "dimension": dimension, "id": uuid.uuid4().hex}) + "\n")
+        with self._reload_lock:
+            self._reload()
+            return self._snapshot
+
+    def _compact(self, snapshot):
+        """Write the live rows as a new generation (readers keep their old mapping until they reload).
+
+        Compaction renumbers rows, so the indexer then builds the new
+        generation's graph from scratch while searches scan exactly.
+        """
+        keep = np.flatnonzero(snapshot.live)
+        generation = snapshot.generation + 1
+        with open(self.matrix_path(generation), "wb") as f:
+            for start in range(0, len(keep), SIDECAR_RECORD_SIZE):
+                f.write(np.ascontiguousarray(snapshot.matrix[keep[start:start + SIDECAR_RECORD_SIZE]]).tobytes())
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"generation": generation, "dimension": snapshot.dimension,
+                                "id": uuid.uuid4().hex}) + "\n")
+            for start in range(0, len(keep), SIDECAR_RECORD_SIZE):
+                f.write(json.dumps({"add": [
+                    [snapshot.ids[row], snapshot.rows[row]["content"], snapshot.rows[row]["metadata"]]
+                    for row in keep[start:start + SIDECAR_RECORD_SIZE].tolist()
+                ]}) + "\n")
+        os.replace(tmp_path, self.meta_path)
+        self._remove_old_generations(generation)
+        print(f"🧹 Compacted local vector store to {len(keep)} rows")
+
+    def _remove_old_generations(self, generation):
+        # Readers may still be opening the previous generation, so only older ones are removed
+        for name in os.listdir(self.path):
+            kind, _, number = name.partition(".")[0].partition("-")
+            if kind in ("vectors", "hnsw") and number.isdigit() and int(number) < generation - 1:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+
+# Local stores with a background indexer, stopped at exit
+_indexed_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _stop_indexers():
+    for store in list(_indexed_stores):
+        store.stop_indexer()
+
+
+STORES = {
+    SupabaseVectorStore.name: SupabaseVectorStore,
+    LocalVectorStore.name: LocalVectorStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store():
+    """Return the process-wide store selected by VECTOR_STORE"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if VECTOR_STORE not in STORES:
+                    raise ValueError(f"Unknown VECTOR_STORE '{VECTOR_STORE}', expected one of {list(STORES)}")
+                _store = STORES[VECTOR_STORE]()
+    return _store
+
+
+def rebuild_local_vector_store(supabase=None, path=LOCAL_VECTOR_STORE_PATH, page_size=1000):
+    """Copy every chunk currently stored in pdf_chunks into a fresh local store"""
+    from db import get_supabase_client
+    supabase = supabase or get_supabase_client()
+    if os.path.isdir(path):
+        # Also clears the single-file layout (vectors.f32, meta.json) of earlier versions
+        for name in os.listdir(path):
+            if name.startswith(("vectors", "meta", "hnsw")):
+                os.remove(os.path.join(path, name))
+    store = LocalVectorStore(path)
+    pending = []
+    start = 0
+    while True:
+        response = (supabase.table('pdf_chunks')
+                    .select('id, content, metadata, embedding')
+                    .order('id')
+                    .range(start, start + page_size - 1)
+                    .execute())
+        pending.extend(response.data or [])
+        # Each update is one sidecar line, so write in large slices
+        if len(pending) >= page_size * 20:
+            store.update(pending)
+            pending = []
+        if not response.data or len(response.data) < page_size:
+            break
+        start += page_size
+    store.update(pending)
+    if store.index_type == "hnsw":
+        store.build_index()
+    print(f"✅ Rebuilt local vector store with {store.count()} chunks at {path}")
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        rebuild_local_vector_store()
+    else:
+        print(__doc__)
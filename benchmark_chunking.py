@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chunking strategies against the legacy 500-word splitter
+
+Usage:
+    python benchmark_chunking.py                # synthetic 2000-page document
+    python benchmark_chunking.py manual.pdf     # pages extracted from a real PDF
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from chunking import chunk_pages, count_tokens
+
+WORDS = ("the system stores each document as vector chunks and answers questions "
+         "using retrieval augmented generation over the uploaded pdf content with "
+         "embeddings similarity search context prompt model latency index").split()
+
+def split_text(text, chunk_size=500):
+    """The original fixed 500-word splitter, kept here as the baseline"""
+    words = text.split()
+    return [' '.join(words[i:i+chunk_size]) for i in range(0, len(words), chunk_size)]
+
+def synthetic_pages(page_count=2000, sentences_per_page=40, seed=7):
+    """Generate pages of random sentences with realistic lengths"""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(1, page_count + 1):
+        sentences = []
+        for _ in range(sentences_per_page):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 30))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        pages.append((page, " ".join(sentences)))
+    return pages
+
+def pdf_pages(path):
+    from upload_pdf import iter_pdf_pages
+    return list(iter_pdf_pages(path))
+
+def run(name, chunker, text_chars):
+    started = time.perf_counter()
+    chunks = list(chunker())
+    elapsed = time.perf_counter() - started
+    sizes = [count_tokens(chunk["content"] if isinstance(chunk, dict) else chunk) for chunk in chunks]
+    print(f"{name:<28} {len(chunks):>8} {sum(sizes) / max(len(sizes), 1):>10.1f} "
+          f"{max(sizes, default=0):>8} {elapsed * 1000:>10.1f} {text_chars / elapsed / 1e6:>8.1f}")
+
+def main():
+    pages = pdf_pages(sys.argv[1]) if len(sys.argv) > 1 else synthetic_pages()
+    text = "\n".join(text for _, text in pages)
+    print(f"📄 {len(pages)} pages, {len(text) / 1e6:.1f}M characters, {count_tokens(text)} tokens")
+    print()
+    print(f"{'strategy':<28} {'chunks':>8} {'avg tok':>10} {'max tok':>8} {'time ms':>10} {'MB/s':>8}")
+    print("-" * 78)
+
+    run("legacy split_text (500 w)", lambda: split_text(text), len(text))
+    for strategy in ("tokens", "sentences", "pages"):
+        for chunk_size, overlap in ((500, 0), (500, 50), (250, 25)):
+            run(f"{strategy} {chunk_size}/{overlap}",
+                lambda: chunk_pages(pages, strategy, chunk_size, overlap), len(text))
+
+if __name__ == "__main__":
+    print("🧪 Chunking Benchmark")
+    print("=" * 40)
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark approximate vector search against exact search: recall@k and p50/p99 latency
+
+Usage:
+    python benchmark_vector_index.py              # local store, 10000 synthetic 384-d vectors
+    python benchmark_vector_index.py 50000        # local store, 50000 vectors
+    python benchmark_vector_index.py --supabase   # search_pdf_chunks RPC vs exact search over pdf_chunks
+
+The local graph is hnswlib's when it is installed (requirements-hnsw.txt),
+otherwise the pure-Python HNSWIndex.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from vector_store import LocalVectorStore, SupabaseVectorStore, rebuild_local_vector_store
+
+K = 10
+QUERY_COUNT = 200
+DIMENSION = 384
+EF_SEARCH_VALUES = (16, 32, 64, 128, 256)
+
+def synthetic_rows(row_count, dimension=DIMENSION, clusters=200, seed=7):
+    """Clustered vectors, which is closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    vectors = centers[rng.integers(0, clusters, row_count)] + 0.4 * rng.normal(size=(row_count, dimension))
+    rows = [{"id": i, "content": "", "metadata": {}, "embedding": vector}
+            for i, vector in enumerate(vectors.astype(np.float32))]
+    queries = centers[rng.integers(0, clusters, QUERY_COUNT)] + 0.4 * rng.normal(size=(QUERY_COUNT, dimension))
+    return rows, queries.astype(np.float32)
+
+def run(name, search, queries, truth):
+    """Time search over every query and score it against the exact results"""
+    latencies = []
+    recall = 0.0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recall += len(expected & {row["id"] for row in results}) / max(len(expected), 1)
+    print(f"{name:<28} {recall / len(queries):>10.4f} {np.percentile(latencies, 50):>10.2f} "
+          f"{np.percentile(latencies, 99):>10.2f}")
+
+def exact_truth(exact, queries):
+    return [{row["id"] for row in exact.search(query, -1.0, K)} for query in queries]
+
+def print_header():
+    print(f"{'search':<28} {f'recall@{K}':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    print("-" * 62)
+
+def benchmark_local(row_count):
+    rows, queries = synthetic_rows(row_count)
+    with tempfile.TemporaryDirectory() as directory:
+        exact = LocalVectorStore(os.path.join(directory, "exact"), index_type="exact")
+        exact.update(rows)
+
+        hnsw = LocalVectorStore(os.path.join(directory, "hnsw"), index_type="hnsw")
+        started = time.perf_counter()
+        hnsw.update(rows)
+        index = hnsw.build_index()
+        build_seconds = time.perf_counter() - started
+        print(f"📄 {row_count} vectors, {DIMENSION} dimensions, {QUERY_COUNT} queries")
+        print(f"🏗️ {type(index).__name__} build (M={index.m}, ef_construction={index.ef_construction}): "
+              f"{build_seconds:.1f}s ({row_count / build_seconds:.0f} rows/s)")
+        print()
+
+        truth = exact_truth(exact, queries)
+        print_header()
+        run("exact (argpartition)", lambda query: exact.search(query, -1.0, K), queries, truth)
+        for ef_search in EF_SEARCH_VALUES:
+            index.ef_search = ef_search
+            run(f"hnsw ef_search={ef_search}", lambda query: hnsw.search(query, -1.0, K), queries, truth)
+
+def benchmark_supabase():
+    with tempfile.TemporaryDirectory() as directory:
+        print("🔄 Copying pdf_chunks into a local exact store for ground truth...")
+        exact = rebuild_local_vector_store(path=os.path.join(directory, "exact"))
+        if exact.count() == 0:
+            print("⚠️ pdf_chunks is empty; upload some documents first")
+            return
+        # Queries are stored vectors with a little noise, so every query has true neighbours
+        rng = np.random.default_rng(7)
+        snapshot = exact.snapshot()
+        rows = rng.choice(np.flatnonzero(snapshot.live), size=min(QUERY_COUNT, exact.count()), replace=False)
+        queries = snapshot.matrix[rows] + 0.05 * rng.normal(size=(len(rows), snapshot.dimension)).astype(np.float32)
+        print(f"📄 {exact.count()} rows, {snapshot.dimension} dimensions, {len(queries)} queries")
+        print()
+
+        truth = exact_truth(exact, queries)
+        supabase_store = SupabaseVectorStore()
+        print_header()
+        run("exact (local)", lambda query: exact.search(query, -1.0, K), queries, truth)
+        run("search_pdf_chunks RPC", lambda query: supabase_store.search(query.tolist(), -1.0, K), queries, truth)
+
+if __name__ == "__main__":
+    print("🧪 Vector Index Benchmark")
+    print("=" * 40)
+    if "--supabase" in sys.argv:
+        benchmark_supabase()
+    else:
+        counts = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        benchmark_local(int(counts[0]) if counts else 10000)
@@ -9,6 +9,8 @@ const ModernChatPDF = () => {
   const [loading, setLoading] = useState(false);
   const [uploadStatus, setUploadStatus] = useState("");
   const [uploadedFileName, setUploadedFileName] = useState("");
+  // Server-side conversation, so follow-up questions keep their context
+  const [sessionId, setSessionId] = useState("");
   const [searchHistory, setSearchHistory] = useState([
     "What are the main points discussed?",
     "Summarize the conclusions",
@@ -116,8 +118,25 @@ const ModernChatPDF = () => {
         withCredentials: false
       });
       
+      // Uploads are processed in the background; poll the job until it finishes
+      if (response.data.job_id) {
+        const jobUrl = new URL(`/jobs/${response.data.job_id}`, baseUrl);
+        let job = response.data;
+        while (job.stage !== 'completed' && job.stage !== 'failed') {
+          await new Promise(resolve => setTimeout(resolve, 1000));
+          job = (await axios.get(jobUrl.toString(), { withCredentials: false })).data;
+          if (job.total_chunks) {
+            setUploadStatus(`Analyzing document... ${job.chunks_done}/${job.total_chunks} chunks`);
+          }
+        }
+        if (job.stage === 'failed') {
+          throw new Error(job.errors.join('; ') || 'Processing failed');
+        }
+      }
+      
       setUploadStatus("✨ Document ready for questions!");
       setUploadedFileName(file.name);
+      setSessionId("");
       
       const welcomeMessage = {
         type: 'ai',
@@ -154,7 +173,11 @@ const ModernChatPDF = () => {
     try {
       const formData = new FormData();
       formData.append("question", currentQuestion);
-      
+      // Only search the PDF this chat is about
+      formData.append("sources", uploadedFileName);
+      // "new" starts a conversation; the server returns its id with the answer
+      formData.append("session_id", sessionId || "new");
+
       // Completely reliable URL formatting
       let baseUrl = import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000';
       
@@ -164,33 +187,75 @@ const ModernChatPDF = () => {
       }
       
       // Create a URL object to handle proper path joining
-      const url = new URL('/ask', baseUrl);
+      const url = new URL('/ask/stream', baseUrl);
       
-      console.log("Making question request to:", url.toString()); // Debug log
+      console.log("Making streaming question request to:", url.toString()); // Debug log
       
-      const response = await axios.post(url.toString(), formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data'
-        },
-        withCredentials: false
-      });
+      // EventSource only supports GET, so read the SSE stream from fetch
+      const response = await fetch(url.toString(), { method: 'POST', body: formData });
+      if (!response.ok || !response.body) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.detail || `Request failed with status ${response.status}`);
+      }
       
-      const aiMessage = { 
-        type: 'ai', 
-        content: response.data.answer
+      // Tokens are appended to one AI message as they arrive
+      let started = false;
+      const appendToken = (token) => {
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setIsTyping(true);
+          setMessages(prev => [...prev, { type: 'ai', content: token, streaming: true }]);
+          return;
+        }
+        setMessages(prev => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: last.content + token }];
+        });
       };
-      setMessages(prev => [...prev, aiMessage]);
-      setTypingIndex(messages.length + 1); // Set typing index to the new message
+      
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let streamError = null;
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          let eventName = "message";
+          let data = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          }
+          if (!data) continue;
+          const payload = JSON.parse(data);
+          if (eventName === "token") appendToken(payload.token);
+          else if (eventName === "done" && payload.session_id) setSessionId(payload.session_id);
+          else if (eventName === "error") streamError = payload.detail;
+        }
+      }
+      
+      if (streamError) {
+        appendToken(started ? `\n\n❌ ${streamError}` : `❌ Error getting answer: ${streamError}`);
+      }
       
     } catch (error) {
       const errorMessage = { 
         type: 'ai', 
-        content: "❌ Error getting answer: " + (error.response?.data?.detail || error.message)
+        content: "❌ Error getting answer: " + error.message
       };
       setMessages(prev => [...prev, errorMessage]);
       setTypingIndex(messages.length + 1); // Set typing index to the error message
       console.error("Question error:", error);
     } finally {
+      setMessages(prev => prev.map(message => message.streaming ? { ...message, streaming: false } : message));
+      setIsTyping(false);
       setLoading(false);
     }
   };
@@ -210,6 +275,7 @@ const ModernChatPDF = () => {
     setMessages([]);
     setQuestion("");
     setUploadedFileName("");
+    setSessionId("");
     setFile(null);
     setUploadStatus("");
     setTypingIndex(-1);
@@ -488,7 +554,7 @@ const ModernChatPDF = () => {
                   }`}>
                     <p className="leading-relaxed whitespace-pre-wrap">
                       {renderMessageContent(message, index)}
-                      {message.type === 'ai' && index === typingIndex && (
+                      {message.type === 'ai' && (index === typingIndex || message.streaming) && (
                         <span className="inline-block w-1 h-4 ml-1 bg-indigo-500 animate-pulse"></span>
                       )}
                     </p>
@@ -5,6 +5,7 @@
 CREATE EXTENSION IF NOT EXISTS vector;
 
 -- Create the pdf_chunks table with 384-dimensional embeddings for sentence-transformers
+-- (EMBEDDING_PROVIDER=local). Use vector(1536) with EMBEDDING_PROVIDER=openai.
 CREATE TABLE IF NOT EXISTS pdf_chunks (
     id SERIAL PRIMARY KEY,
     content TEXT NOT NULL,
@@ -13,13 +14,37 @@ CREATE TABLE IF NOT EXISTS pdf_chunks (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create an index on the embedding column for faster similarity searches
+-- Create an index on the embedding column for faster similarity searches.
+-- lists = 100 suits roughly 100k rows; once the table has grown, run
+-- `python backend/tune_vector_index.py` to size ivfflat (or switch to HNSW,
+-- pgvector >= 0.5.0) for the current row count
 CREATE INDEX IF NOT EXISTS pdf_chunks_embedding_idx ON pdf_chunks 
 USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
 
 -- Create an index on created_at for time-based queries
 CREATE INDEX IF NOT EXISTS pdf_chunks_created_at_idx ON pdf_chunks (created_at);
 
+-- Create an index on the document source so re-uploads can find a file's chunks
+-- and scoped searches (search_pdf_chunks_scoped) read only that document's rows
+CREATE INDEX IF NOT EXISTS pdf_chunks_source_idx ON pdf_chunks ((metadata->>'source'));
+
+-- Stamp every chunk of a document with the file hash and chunk count of the
+-- version that was just ingested in full. A re-upload is skipped only when
+-- all of the document's rows carry this marker, so an interrupted ingestion
+-- is resumed instead of leaving the document truncated
+CREATE OR REPLACE FUNCTION mark_pdf_document_complete(
+    doc_source text,
+    doc_file_hash text,
+    doc_total_chunks int
+)
+RETURNS void
+LANGUAGE sql
+AS $$
+    UPDATE pdf_chunks
+    SET metadata = metadata || jsonb_build_object('file_hash', doc_file_hash, 'total_chunks', doc_total_chunks)
+    WHERE metadata->>'source' = doc_source;
+$$;
+
 -- Optional: Create a function to search for similar chunks
 CREATE OR REPLACE FUNCTION search_pdf_chunks(
     query_embedding vector(384),
@@ -43,4 +68,141 @@ AS $$
     WHERE 1 - (pdf_chunks.embedding <=> query_embedding) > match_threshold
     ORDER BY pdf_chunks.embedding <=> query_embedding
     LIMIT match_count;
-$$;
\ No newline at end of file
+$$;
+
+-- Search only the chunks of the given documents. The MATERIALIZED CTE makes
+-- the planner fetch the documents' rows through pdf_chunks_source_idx and
+-- rank just those exactly, instead of walking the global ANN index and
+-- discarding other documents' matches afterwards (which can return fewer
+-- than match_count rows for a small document in a large table).
+CREATE OR REPLACE FUNCTION search_pdf_chunks_scoped(
+    query_embedding vector(384),
+    sources text[],
+    match_threshold float DEFAULT 0.5,
+    match_count int DEFAULT 5
+)
+RETURNS TABLE (
+    id int,
+    content text,
+    metadata jsonb,
+    similarity float
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH scoped AS MATERIALIZED (
+        SELECT pdf_chunks.id, pdf_chunks.content, pdf_chunks.metadata, pdf_chunks.embedding
+        FROM pdf_chunks
+        WHERE pdf_chunks.metadata->>'source' = ANY(sources)
+    )
+    SELECT
+        scoped.id,
+        scoped.content,
+        scoped.metadata,
+        1 - (scoped.embedding <=> query_embedding) AS similarity
+    FROM scoped
+    WHERE 1 - (scoped.embedding <=> query_embedding) > match_threshold
+    ORDER BY scoped.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+
+-- Report N for the embedding vector(N) column so the API can check its
+-- embedding provider against the schema at startup
+CREATE OR REPLACE FUNCTION pdf_chunks_embedding_dimension()
+RETURNS int
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT atttypmod
+    FROM pg_attribute
+    WHERE attrelid = 'pdf_chunks'::regclass
+      AND attname = 'embedding';
+$$;
+
+-- Corpus statistics maintained by triggers, so the query path and health
+-- checks never need a COUNT over pdf_chunks
+CREATE TABLE IF NOT EXISTS pdf_corpus_stats (
+    source TEXT PRIMARY KEY,
+    chunk_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Single row; version increases with every ingestion or deletion
+CREATE TABLE IF NOT EXISTS pdf_corpus_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    total_chunks BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Backfill from existing rows (no-op once the version row exists)
+INSERT INTO pdf_corpus_stats (source, chunk_count)
+SELECT COALESCE(metadata->>'source', ''), COUNT(*)
+FROM pdf_chunks
+WHERE NOT EXISTS (SELECT 1 FROM pdf_corpus_version)
+GROUP BY 1
+ON CONFLICT (source) DO NOTHING;
+
+INSERT INTO pdf_corpus_version (id, version, total_chunks)
+SELECT TRUE, 1, (SELECT COUNT(*) FROM pdf_chunks)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION pdf_chunks_track_insert()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO pdf_corpus_stats (source, chunk_count, updated_at)
+    SELECT COALESCE(metadata->>'source', ''), COUNT(*), NOW()
+    FROM new_rows
+    GROUP BY 1
+    ON CONFLICT (source) DO UPDATE
+        SET chunk_count = pdf_corpus_stats.chunk_count + EXCLUDED.chunk_count,
+            updated_at = NOW();
+
+    UPDATE pdf_corpus_version
+    SET version = version + 1,
+        total_chunks = total_chunks + (SELECT COUNT(*) FROM new_rows),
+        updated_at = NOW();
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION pdf_chunks_track_delete()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    UPDATE pdf_corpus_stats
+    SET chunk_count = pdf_corpus_stats.chunk_count - removed.chunk_count,
+        updated_at = NOW()
+    FROM (
+        SELECT COALESCE(metadata->>'source', '') AS source, COUNT(*) AS chunk_count
+        FROM old_rows
+        GROUP BY 1
+    ) AS removed
+    WHERE pdf_corpus_stats.source = removed.source;
+
+    DELETE FROM pdf_corpus_stats WHERE chunk_count <= 0;
+
+    UPDATE pdf_corpus_version
+    SET version = version + 1,
+        total_chunks = GREATEST(total_chunks - (SELECT COUNT(*) FROM old_rows), 0),
+        updated_at = NOW();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS pdf_chunks_stats_insert ON pdf_chunks;
+CREATE TRIGGER pdf_chunks_stats_insert
+    AFTER INSERT ON pdf_chunks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pdf_chunks_track_insert();
+
+DROP TRIGGER IF EXISTS pdf_chunks_stats_delete ON pdf_chunks;
+CREATE TRIGGER pdf_chunks_stats_delete
+    AFTER DELETE ON pdf_chunks
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION pdf_chunks_track_delete();
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test that saturated stages turn requests away with 429 and a Retry-After hint
+instead of queueing them without bound
+"""
+import asyncio
+import os
+import sys
+import threading
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from fastapi.testclient import TestClient
+
+import vercel_app
+from admission import Stage, StageFullError
+
+def test_full_stage_rejects_with_retry_after():
+    stage = Stage("test", concurrency=1, queue_depth=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(stage.run(release.wait))
+        queued = asyncio.ensure_future(stage.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        try:
+            await stage.run(lambda: "rejected")
+        except StageFullError as e:
+            rejection = e
+        else:
+            raise AssertionError("Expected StageFullError")
+        # Callers that must not fail (ingestion, batches) wait for a slot instead
+        waiting = asyncio.ensure_future(stage.run_waiting(lambda: "waited"))
+        await asyncio.sleep(0.05)
+        release.set()
+        return rejection, await asyncio.gather(running, queued, waiting)
+
+    rejection, results = asyncio.run(scenario())
+    print(f"✅ Rejected: {rejection}")
+    assert rejection.stage == "test" and rejection.retry_after >= 1
+    assert results == [True, "queued", "waited"]
+    stats = stage.stats()
+    assert (stats["admitted"], stats["rejected"], stats["completed"]) == (3, 1, 3)
+    assert stats["running"] == stats["queued"] == 0
+
+def test_retry_after_grows_with_the_backlog():
+    stage = Stage("test", concurrency=2, queue_depth=10)
+    stage.service_seconds = 3.0
+    stage.queued, stage.running = 2, 2
+    assert stage.retry_after() == 6
+    stage.queued = 10
+    assert stage.retry_after() == 18
+
+def test_endpoint_returns_429_with_retry_after_header():
+    async def busy_chat(*args, **kwargs):
+        raise StageFullError("generation", 7)
+
+    with mock.patch.object(vercel_app, "chat", busy_chat):
+        response = TestClient(vercel_app.app).post("/ask", data={"question": "What is covered?"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+    assert "generation queue is full" in response.json()["detail"]
+
+if __name__ == "__main__":
+    print("🧪 Admission Control Test")
+    print("=" * 40)
+    test_full_stage_rejects_with_retry_after()
+    test_retry_after_grows_with_the_backlog()
+    test_endpoint_returns_429_with_retry_after_header()
+    print("✅ All admission control checks passed")
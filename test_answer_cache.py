@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test answer cache keying, TTL expiry and the persistent SQLite backend
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from answer_cache import AnswerCache, answer_cache_key
+
+MODEL = "chat-model|embedding-model"
+
+def test_key_ignores_formatting_but_not_scope_model_or_corpus():
+    key = answer_cache_key("What is the warranty period?", ["b.pdf", "a.pdf"], MODEL, "v1")
+    assert key == answer_cache_key("  what is the   WARRANTY period ", ["a.pdf", "b.pdf", "a.pdf"], MODEL, "v1")
+    assert key != answer_cache_key("What is the warranty period?", ["a.pdf"], MODEL, "v1")
+    assert key != answer_cache_key("What is the warranty period?", ["a.pdf", "b.pdf"], "other-model", "v1")
+    # Any ingestion moves the corpus version on, so old answers are never looked up again
+    assert key != answer_cache_key("What is the warranty period?", ["a.pdf", "b.pdf"], MODEL, "v2")
+    assert answer_cache_key("Q", None, MODEL, "v1") == answer_cache_key("Q", [], MODEL, "v1")
+
+def test_entries_expire_and_least_recently_used_are_evicted():
+    cache = AnswerCache(max_entries=2, ttl=0.1)
+    cache.put("a", "answer a")
+    cache.put("b", "answer b")
+    assert cache.get("a") == "answer a"
+    cache.put("c", "answer c")
+    assert cache.get("b") is None and cache.evictions == 1
+    time.sleep(0.15)
+    assert cache.get("a") is None and cache.get("c") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+def test_sqlite_backend_is_shared_and_survives_restarts():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "answers.sqlite3")
+        first = AnswerCache(max_entries=10, ttl=60, path=path)
+        first.put("question", "stored answer")
+        # Another worker process, or this one after a restart
+        second = AnswerCache(max_entries=10, ttl=60, path=path)
+        assert second.get("question") == "stored answer"
+
+        short_lived = AnswerCache(max_entries=10, ttl=0.05, path=path)
+        short_lived.put("fleeting", "soon gone")
+        time.sleep(0.1)
+        assert AnswerCache(max_entries=10, ttl=60, path=path).get("fleeting") is None
+
+if __name__ == "__main__":
+    print("🧪 Answer Cache Test")
+    print("=" * 40)
+    test_key_ignores_formatting_but_not_scope_model_or_corpus()
+    test_entries_expire_and_least_recently_used_are_evicted()
+    test_sqlite_backend_is_shared_and_survives_restarts()
+    print("✅ All answer cache checks passed")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test that every chunking strategy respects the chunk size, overlaps
+consecutive chunks and reports offsets that point back into the document
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from chunking import STRATEGIES, chunk_pages, count_tokens
+
+PAGES = [
+    (1, "The pump must be primed before use. Check the pressure gauge daily! "
+        "Replace the filter every month, or sooner in dusty sites."),
+    (2, "Warranty covers parts for two years. Labour is covered for one year only. "
+        "Claims need the original receipt."),
+    (3, "Contact support at the number on the label."),
+]
+DOCUMENT = "\n".join(text for _, text in PAGES)
+
+def test_offsets_point_back_into_the_document():
+    for strategy in STRATEGIES:
+        chunks = list(chunk_pages(PAGES, strategy=strategy, chunk_size=12, overlap=3))
+        assert chunks, strategy
+        for chunk in chunks:
+            assert chunk["content"] == DOCUMENT[chunk["start_offset"]:chunk["end_offset"]], (strategy, chunk)
+            assert chunk["token_count"] == count_tokens(chunk["content"]) <= 12
+            assert DOCUMENT.count("\n", 0, chunk["start_offset"]) + 1 == chunk["page"]
+        # Together the chunks cover every token of the document
+        covered = " ".join(chunk["content"] for chunk in chunks)
+        assert all(word in covered for word in DOCUMENT.split())
+        print(f"✅ {strategy}: {len(chunks)} chunks")
+
+def test_token_windows_overlap():
+    chunks = list(chunk_pages(PAGES, strategy="tokens", chunk_size=10, overlap=4))
+    assert all(chunk["token_count"] == 10 for chunk in chunks[:-1])
+    for previous, current in zip(chunks, chunks[1:]):
+        # The next window starts four tokens before the previous one ended
+        assert previous["start_offset"] < current["start_offset"] < previous["end_offset"]
+        assert count_tokens(DOCUMENT[current["start_offset"]:previous["end_offset"]]) == 4
+
+def test_page_chunks_never_span_pages():
+    for chunk in chunk_pages(PAGES, strategy="pages", chunk_size=50, overlap=0):
+        assert "\n" not in chunk["content"]
+    # Sentences may run on across a page break, pages must not
+    assert any("\n" in chunk["content"] for chunk in chunk_pages(PAGES, strategy="sentences", chunk_size=50, overlap=0))
+    assert [chunk["page"] for chunk in chunk_pages(PAGES, strategy="pages", chunk_size=50, overlap=0)] == [1, 2, 3]
+
+def test_long_sentences_are_split_and_empty_pages_skipped():
+    long_sentence = " ".join(f"word{i}" for i in range(25)) + "."
+    chunks = list(chunk_pages([(1, ""), (2, long_sentence), (3, "   ")], strategy="sentences", chunk_size=10, overlap=0))
+    assert [chunk["token_count"] for chunk in chunks] == [10, 10, 6]
+    assert {chunk["page"] for chunk in chunks} == {2}
+
+def test_invalid_settings_are_rejected():
+    for kwargs in ({"strategy": "paragraphs"}, {"chunk_size": 10, "overlap": 10}, {"chunk_size": 10, "overlap": -1}):
+        try:
+            list(chunk_pages(PAGES, **{"strategy": "tokens", **kwargs}))
+        except ValueError as e:
+            print(f"✅ Rejected {kwargs}: {e}")
+        else:
+            raise AssertionError(f"Expected ValueError for {kwargs}")
+
+if __name__ == "__main__":
+    print("🧪 Chunking Test")
+    print("=" * 40)
+    test_offsets_point_back_into_the_document()
+    test_token_windows_overlap()
+    test_page_chunks_never_span_pages()
+    test_long_sentences_are_split_and_empty_pages_skipped()
+    test_invalid_settings_are_rejected()
+    print("✅ All chunking checks passed")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test that the embedding cache evicts least recently used entries and enforces
+its cap across every connection sharing the file
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from embedding_cache import EmbeddingCache
+
+MODEL = "test-model"
+
+def vectors(texts):
+    return [[float(len(text)), 0.5] for text in texts]
+
+def cached(cache, texts):
+    """The texts that are still in the cache"""
+    return [text for text, result in zip(texts, cache.get_many(MODEL, texts)) if result is not None]
+
+def test_least_recently_used_entries_are_evicted():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(os.path.join(directory, "cache.sqlite3"), max_entries=3, touch_seconds=0)
+        cache.put_many(MODEL, ["a", "b"], vectors(["a", "b"]))
+        time.sleep(0.01)
+        cache.put_many(MODEL, ["c"], vectors(["c"]))
+        time.sleep(0.01)
+        # Using "a" makes "b" the least recently used entry
+        assert cache.get_many(MODEL, ["a"]) == [[1.0, 0.5]]
+        time.sleep(0.01)
+        cache.put_many(MODEL, ["d"], vectors(["d"]))
+        assert cached(cache, ["a", "b", "c", "d"]) == ["a", "c", "d"]
+        assert cache.count() == 3 and cache.evictions == 1
+
+def test_cap_is_shared_by_every_connection():
+    """Two caches on one file stand in for two worker processes"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite3")
+        first = EmbeddingCache(path, max_entries=10)
+        second = EmbeddingCache(path, max_entries=10)
+        texts = [f"chunk {i}" for i in range(30)]
+        for i in range(0, 30, 3):
+            cache = first if i % 2 else second
+            cache.put_many(MODEL, texts[i:i + 3], vectors(texts[i:i + 3]))
+        print(f"📊 Entries after 30 inserts through two connections: {first.count()}")
+        assert first.count() == second.count() == 10
+        assert first.evictions + second.evictions == 20
+        # The newest entries survive, whichever connection wrote them
+        assert cached(first, texts) == texts[20:]
+
+def test_hits_only_refresh_stale_entries():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(os.path.join(directory, "cache.sqlite3"), max_entries=10, touch_seconds=60)
+        cache.put_many(MODEL, ["a", "b"], vectors(["a", "b"]))
+        writes = cache._conn.total_changes
+        for _ in range(20):
+            cache.get_many(MODEL, ["a", "b", "missing"])
+        # Entries used within touch_seconds are read without any write
+        assert cache._conn.total_changes == writes
+        assert cache.hits == 40 and cache.misses == 20
+
+        cache.touch_seconds = 0
+        cache.get_many(MODEL, ["a", "a", "b"])
+        assert cache._conn.total_changes == writes + 2
+
+def test_get_or_compute_only_computes_misses():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(os.path.join(directory, "cache.sqlite3"))
+        computed = []
+
+        def compute(texts):
+            computed.extend(texts)
+            return vectors(texts)
+
+        assert cache.get_or_compute(MODEL, ["x", "yy", "x"], compute) == vectors(["x", "yy", "x"])
+        # Whitespace differences share an entry, and repeats are computed once
+        assert cache.get_or_compute(MODEL, [" x ", "zzz"], compute) == vectors(["x", "zzz"])
+        assert computed == ["x", "yy", "zzz"]
+
+if __name__ == "__main__":
+    print("🧪 Embedding Cache Test")
+    print("=" * 40)
+    test_least_recently_used_entries_are_evicted()
+    test_cap_is_shared_by_every_connection()
+    test_hits_only_refresh_stale_entries()
+    test_get_or_compute_only_computes_misses()
+    print("✅ All embedding cache checks passed")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test HNSW recall against exact search and that saved graphs load back intact
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from hnsw_index import HNSWIndex, NativeHNSWIndex, hnswlib
+
+DIMENSION = 64
+K = 10
+
+def clustered_vectors(count, seed=3):
+    """L2-normalised rows around a few centres, like real embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, DIMENSION))
+    vectors = centers[rng.integers(0, 20, count)] + 0.4 * rng.normal(size=(count, DIMENSION))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def recall(index, vectors, queries):
+    found = 0
+    for query in queries:
+        expected = set(np.argsort(-(vectors @ query))[:K].tolist())
+        results = index.search(query, K)
+        found += len(expected & {row for _, row in results})
+        # Reported similarities are the dot products of the returned rows
+        similarity, row = results[0]
+        assert abs(similarity - float(vectors[row] @ query)) < 1e-4
+    return found / (K * len(queries))
+
+def check_index(create, load):
+    vectors = clustered_vectors(1500)
+    queries = clustered_vectors(50, seed=4)
+    index = create()
+    assert index.search(queries[0], K) == []
+    # Rows arrive in two updates, the second after the matrix grew
+    index.add(vectors, 1000)
+    index.add(vectors, 1500)
+    assert len(index) == 1500
+    score = recall(index, vectors, queries)
+    print(f"📊 {type(index).__name__} recall@{K}: {score:.3f}")
+    assert score > 0.95
+
+    snapshot = index.copy()
+    index.add(np.vstack([vectors, vectors[:10]]), 1510)
+    assert len(snapshot) == 1500 and len(index) == 1510
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"graph{snapshot.suffix}")
+        snapshot.save(path)
+        loaded = load(path, vectors)
+    assert len(loaded) == 1500
+    assert (loaded.m, loaded.ef_construction) == (snapshot.m, snapshot.ef_construction)
+    assert recall(loaded, vectors, queries) == score
+
+def test_python_graph():
+    check_index(HNSWIndex, lambda path, vectors: HNSWIndex.load(path, vectors))
+
+@pytest.mark.skipif(hnswlib is None, reason="hnswlib is not installed (requirements-hnsw.txt)")
+def test_native_graph():
+    check_index(lambda: NativeHNSWIndex(DIMENSION, capacity=256),
+                lambda path, vectors: NativeHNSWIndex.load(path, DIMENSION))
+
+if __name__ == "__main__":
+    print("🧪 HNSW Index Test")
+    print("=" * 40)
+    test_python_graph()
+    if hnswlib is not None:
+        test_native_graph()
+    print("✅ All HNSW index checks passed")
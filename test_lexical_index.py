@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test that the BM25 log replays into the same index in every worker and
+survives compaction
+"""
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import lexical_index
+from lexical_index import BM25Index
+
+def chunk(chunk_id, content, source="doc.pdf"):
+    return {"id": chunk_id, "content": content, "metadata": {"source": source}}
+
+def test_bm25_ranks_rare_terms_and_filters_sources():
+    # No log on disk, so searches only see what was added here
+    index = BM25Index(os.path.join(tempfile.gettempdir(), "no-such-directory", "lexical.jsonl"))
+    index.add(1, "the pump pressure gauge reads high pressure", "a.pdf")
+    index.add(2, "replace the pump filter every month", "b.pdf")
+    index.add(3, "pressure relief valve opens at six bar", "b.pdf")
+    assert [chunk_id for chunk_id, _ in index.search("pressure valve", k=2)] == [3, 1]
+    assert [chunk_id for chunk_id, _ in index.search("pressure", k=5, sources={"a.pdf"})] == [1]
+    assert index.search("the and of", k=5) == []
+    index.remove(3)
+    assert [chunk_id for chunk_id, _ in index.search("valve", k=5)] == []
+
+def test_other_workers_replay_only_new_lines():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lexical.jsonl")
+        writer, reader = BM25Index(path), BM25Index(path)
+        writer.append([chunk(1, "alpha beta"), chunk(2, "beta gamma")])
+        assert [chunk_id for chunk_id, _ in reader.search("beta", k=5)] and len(reader) == 2
+        offset = reader._offset
+
+        writer.reload_if_changed()
+        writer.append([chunk(3, "gamma delta")], removed_ids=[1])
+        reader.reload_if_changed()
+        assert reader._offset > offset and sorted(reader.documents) == [2, 3]
+        assert reader.search("alpha", k=5) == []
+
+        # A line still being written is left for the next look
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"remove": [2], "ad')
+        reader.reload_if_changed()
+        assert sorted(reader.documents) == [2, 3]
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('d": []}\n')
+        reader.reload_if_changed()
+        assert sorted(reader.documents) == [3]
+
+def test_compaction_rewrites_the_log_for_every_reader():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lexical.jsonl")
+        with mock.patch.object(lexical_index, "LEXICAL_COMPACT_MIN_RECORDS", 20), \
+                mock.patch.object(lexical_index, "_index", BM25Index(path)):
+            reader = BM25Index(path)
+            # Re-indexing the same ten chunks over and over grows the log but not the index
+            for round_number in range(5):
+                lexical_index.update_lexical_index(
+                    [chunk(i, f"word{i} round{round_number} shared") for i in range(10)],
+                    removed_ids=range(10)
+                )
+                reader.reload_if_changed()
+            writer = lexical_index.get_lexical_index()
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+            print(f"📊 Log holds {len(lines)} lines and {writer._records} records for {len(writer)} chunks")
+            assert writer._records <= 2 * len(writer) + 20
+            assert len(writer) == len(reader) == 10
+            assert reader.search("round4", k=20) == writer.search("round4", k=20)
+            assert len(reader.search("round4", k=20)) == 10 and reader.search("round0", k=20) == []
+
+            # A cold start from the compacted log rebuilds the same postings
+            cold = BM25Index(path)
+            cold.reload_if_changed()
+            assert dict(cold.postings) == dict(writer.postings)
+            assert cold.total_length == writer.total_length
+
+if __name__ == "__main__":
+    print("🧪 Lexical Index Test")
+    print("=" * 40)
+    test_bm25_ranks_rare_terms_and_filters_sources()
+    test_other_workers_replay_only_new_lines()
+    test_compaction_rewrites_the_log_for_every_reader()
+    print("✅ All lexical index checks passed")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test that the LLM client retries throttled and failing requests, honours
+Retry-After and gives up on errors a retry cannot fix
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from email.utils import formatdate
+from unittest import mock
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import llm_client
+from llm_client import LLMClient, LLMError, parse_retry_after
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+def completion(content):
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+def run(responses, call, max_retries=2):
+    """Run call(client) against a server that answers with responses in order.
+
+    Returns (result or raised LLMError, requests seen, backoff delays asked for).
+    """
+    requests, delays = [], []
+
+    def handler(request):
+        requests.append(request)
+        return responses[len(requests) - 1]
+
+    def no_wait(attempt, retry_after=None):
+        delays.append(retry_after)
+        return 0
+
+    async def scenario():
+        client = LLMClient(base_url="https://llm.test/v1", api_key="test-key", max_retries=max_retries)
+        client._session = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+        client._session_loop = asyncio.get_running_loop()
+        try:
+            return await call(client)
+        except LLMError as e:
+            return e
+        finally:
+            await client.aclose()
+
+    with mock.patch.object(llm_client, "backoff_delay", no_wait):
+        result = asyncio.run(scenario())
+    return result, requests, delays
+
+def test_throttled_request_waits_for_retry_after():
+    result, requests, delays = run(
+        [httpx.Response(429, headers={"Retry-After": "3"}, text="slow down"), completion("Hi there")],
+        lambda client: client.complete(MESSAGES)
+    )
+    assert result == "Hi there" and len(requests) == 2 and delays == [3.0]
+    assert requests[0].headers["Authorization"] == "Bearer test-key"
+    assert json.loads(requests[0].content)["messages"] == MESSAGES
+
+def test_client_errors_are_not_retried():
+    result, requests, _ = run([httpx.Response(400, text="bad request")], lambda client: client.complete(MESSAGES))
+    assert isinstance(result, LLMError) and result.status_code == 400 and len(requests) == 1
+
+def test_retry_after_beyond_the_limit_fails_fast():
+    too_long = str(int(llm_client.LLM_RETRY_MAX_DELAY) + 60)
+    result, requests, delays = run([httpx.Response(429, headers={"Retry-After": too_long})],
+                                   lambda client: client.complete(MESSAGES))
+    assert isinstance(result, LLMError) and result.retry_after == float(too_long)
+    assert len(requests) == 1 and delays == []
+
+def test_server_errors_are_retried_until_the_budget_runs_out():
+    result, requests, delays = run([httpx.Response(503)] * 3, lambda client: client.complete(MESSAGES))
+    assert isinstance(result, LLMError) and result.status_code == 503
+    assert len(requests) == 3 and delays == [None, None]
+
+def test_stream_retries_before_the_first_token():
+    body = "".join(f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n"
+                   for token in ["Hel", "lo"]) + "data: [DONE]\n\n"
+
+    async def collect(client):
+        return [token async for token in client.stream(MESSAGES)]
+
+    result, requests, _ = run([httpx.Response(502), httpx.Response(200, text=body)], collect)
+    assert result == ["Hel", "lo"] and len(requests) == 2
+    assert json.loads(requests[1].content)["stream"] is True
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-4") == 0.0
+    assert parse_retry_after(None) is None and parse_retry_after("soon") is None
+    wait = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+    assert 25 <= wait <= 30
+
+if __name__ == "__main__":
+    print("🧪 LLM Client Retry Test")
+    print("=" * 40)
+    test_throttled_request_waits_for_retry_after()
+    test_client_errors_are_not_retried()
+    test_retry_after_beyond_the_limit_fails_fast()
+    test_server_errors_are_retried_until_the_budget_runs_out()
+    test_stream_retries_before_the_first_token()
+    test_parse_retry_after()
+    print("✅ All LLM client checks passed")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test that the local vector store keeps readers consistent through appends,
+deletions and compaction into a new generation of files
+"""
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from vector_store import LocalVectorStore, VECTOR_STORE_COMPACT_RATIO
+
+DIMENSION = 8
+
+def make_rows(ids, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"id": chunk_id, "content": f"chunk {chunk_id}", "metadata": {"source": f"doc{chunk_id % 3}.pdf"},
+             "embedding": rng.normal(size=DIMENSION).astype(np.float32).tolist()} for chunk_id in ids]
+
+def expected_ids(rows, query, k, sources=None):
+    """Exact top k ids by cosine similarity"""
+    rows = [row for row in rows if not sources or row["metadata"]["source"] in sources]
+    vectors = np.array([row["embedding"] for row in rows], dtype=np.float32)
+    similarities = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return [rows[i]["id"] for i in np.argsort(-similarities)[:k]]
+
+def search_ids(store, query, k, sources=None):
+    return [row["id"] for row in store.search(query, match_threshold=-1.0, match_count=k, sources=sources)]
+
+def live_files(path):
+    return sorted(name for name in os.listdir(path) if name.startswith("vectors-"))
+
+def test_updates_and_compaction_keep_results_exact():
+    with tempfile.TemporaryDirectory() as directory:
+        writer = LocalVectorStore(directory, index_type="exact")
+        reader = LocalVectorStore(directory, index_type="exact")
+        rows = make_rows(range(100))
+        writer.update(rows)
+        queries = np.random.default_rng(1).normal(size=(10, DIMENSION)).astype(np.float32)
+        assert reader.count() == 100
+        assert all(search_ids(reader, query, 5) == expected_ids(rows, query, 5) for query in queries)
+        first_version = reader.version()
+
+        # Delete just under the compaction ratio: rows are only masked
+        removed = list(range(0, int(100 * VECTOR_STORE_COMPACT_RATIO) - 1))
+        writer.update(removed_ids=removed)
+        live = [row for row in rows if row["id"] not in set(removed)]
+        assert live_files(directory) == ["vectors-0.f32"]
+        assert reader.snapshot().deleted == len(removed)
+        assert reader.version() != first_version
+        assert all(search_ids(reader, query, 5) == expected_ids(live, query, 5) for query in queries)
+
+        # Crossing it rewrites the live rows as generation 1
+        writer.update(removed_ids=[98, 99])
+        live = [row for row in live if row["id"] not in (98, 99)]
+        snapshot = reader.snapshot()
+        print(f"📊 After compaction: generation {snapshot.generation}, {snapshot.count} rows, "
+              f"files {live_files(directory)}")
+        assert snapshot.generation == 1 and snapshot.count == len(live) and snapshot.deleted == 0
+        assert reader.count() == len(live) == 100 - len(removed) - 2
+        for query in queries:
+            assert search_ids(reader, query, 5) == expected_ids(live, query, 5)
+            assert search_ids(reader, query, 5, ["doc1.pdf"]) == expected_ids(live, query, 5, ["doc1.pdf"])
+
+        # A later compaction drops generation 0; the previous one stays for readers still mapping it
+        for _ in range(2):
+            victims = [row["id"] for row in live[:len(live) // 3]]
+            writer.update(removed_ids=victims)
+            live = [row for row in live if row["id"] not in set(victims)]
+        assert reader.snapshot().generation == 3
+        assert live_files(directory) == ["vectors-2.f32", "vectors-3.f32"]
+        assert all(search_ids(reader, query, 5) == expected_ids(live, query, 5) for query in queries)
+
+        # A fresh process rebuilds the same state from the files alone
+        reopened = LocalVectorStore(directory, index_type="exact")
+        assert reopened.count() == len(live)
+        assert all(search_ids(reopened, query, 5) == expected_ids(live, query, 5) for query in queries)
+
+def test_readded_id_replaces_its_row():
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalVectorStore(directory, index_type="exact")
+        store.update(make_rows(range(10)))
+        replacement = make_rows([3], seed=9)[0]
+        replacement["metadata"] = {"source": "new.pdf"}
+        store.update([replacement])
+        assert store.count() == 10
+        assert store.count(["new.pdf"]) == 1
+        query = np.asarray(replacement["embedding"], dtype=np.float32)
+        best = store.search(query, match_threshold=-1.0, match_count=1)[0]
+        assert best["id"] == 3 and best["metadata"] == {"source": "new.pdf"}
+        stored = store.get_embeddings([3, 42])
+        assert list(stored) == [3]
+        np.testing.assert_allclose(stored[3], query / np.linalg.norm(query), rtol=1e-5)
+
+def test_torn_sidecar_line_is_applied_once_complete():
+    with tempfile.TemporaryDirectory() as directory:
+        writer = LocalVectorStore(directory, index_type="exact")
+        writer.update(make_rows(range(5)))
+        reader = LocalVectorStore(directory, index_type="exact")
+        assert reader.count() == 5
+
+        # A writer caught midway through appending a line
+        line = json.dumps({"remove": [0, 1], "add": []}) + "\n"
+        with open(writer.meta_path, "a", encoding="utf-8") as f:
+            f.write(line[:10])
+            f.flush()
+            assert reader.count() == 5
+            f.write(line[10:])
+        assert reader.count() == 3
+
+if __name__ == "__main__":
+    print("🧪 Local Vector Store Test")
+    print("=" * 40)
+    test_updates_and_compaction_keep_results_exact()
+    test_readded_id_replaces_its_row()
+    test_torn_sidecar_line_is_applied_once_complete()
+    print("✅ All local vector store checks passed")
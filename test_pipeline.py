@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test that the ingestion pipeline keeps order through its bounded queues,
+stops every stage on the first error and lets a consumer give up early
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from pipeline import Pipeline, prefetch
+
+def test_stages_pass_every_item_through():
+    pipeline = Pipeline(queue_size=2)
+    results = []
+
+    def double(items):
+        for item in items:
+            yield item * 2
+
+    def collect(items):
+        results.extend(items)
+
+    doubled = pipeline.stage("double", double, pipeline.source("numbers", iter(range(50))), workers=3)
+    pipeline.stage("collect", collect, doubled, sink=True)
+    pipeline.join()
+    assert sorted(results) == [i * 2 for i in range(50)]
+
+def test_stage_error_stops_the_others_and_is_raised_from_join():
+    pipeline = Pipeline(queue_size=2)
+    produced = []
+
+    def numbers():
+        # Would run for a minute if the failure did not stop it
+        for i in range(600):
+            produced.append(i)
+            yield i
+
+    def fail_on_five(items):
+        for item in items:
+            if item == 5:
+                raise RuntimeError("embedding failed")
+            yield item
+
+    def drain(items):
+        for _ in items:
+            time.sleep(0.1)
+
+    failing = pipeline.stage("embed", fail_on_five, pipeline.source("extract", numbers()))
+    pipeline.stage("store", drain, failing, sink=True)
+    started = time.monotonic()
+    try:
+        pipeline.join()
+    except RuntimeError as e:
+        assert str(e) == "embedding failed"
+    else:
+        raise AssertionError("Expected the stage error from join()")
+    # Backpressure kept the producer close to the failure, and it stopped there
+    assert time.monotonic() - started < 5
+    assert len(produced) < 5 + 3 * 2 + 2
+
+def test_prefetch_keeps_order_and_stops_the_producer_early():
+    assert list(prefetch(iter(range(100)), queue_size=3)) == list(range(100))
+
+    closed = threading.Event()
+    produced = []
+
+    def pages():
+        try:
+            for i in range(1000):
+                produced.append(i)
+                yield i
+        finally:
+            closed.set()
+
+    reader = prefetch(pages(), queue_size=2)
+    assert [next(reader) for _ in range(3)] == [0, 1, 2]
+    reader.close()
+    assert closed.wait(timeout=5)
+    assert len(produced) < 10
+
+if __name__ == "__main__":
+    print("🧪 Ingestion Pipeline Test")
+    print("=" * 40)
+    test_stages_pass_every_item_through()
+    test_stage_error_stops_the_others_and_is_raised_from_join()
+    test_prefetch_keeps_order_and_stops_the_producer_early()
+    print("✅ All pipeline checks passed")
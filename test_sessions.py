@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test session expiry, LRU eviction and the memory cap of the session store
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from sessions import Session, SessionStore
+
+def remember(session, content_size, version="v1"):
+    """Give the session one cached candidate of content_size characters"""
+    session.remember_candidates([{"id": 1, "content": "x" * content_size}], [[1.0, 0.0]], [1.0, 0.0],
+                                None, version)
+
+def test_least_recently_used_sessions_are_evicted():
+    store = SessionStore(max_sessions=3, ttl=60, max_bytes=10 ** 6)
+    first, second, third = (store.get_or_create() for _ in range(3))
+    # Using the first session again makes the second the oldest
+    assert store.get_or_create(first.id) is first
+    fourth = store.get_or_create()
+    assert list(store._sessions) == [third.id, first.id, fourth.id]
+    # An evicted id starts a new session, which evicts the next oldest
+    replacement = store.get_or_create(second.id)
+    assert replacement is not second
+    assert list(store._sessions) == [first.id, fourth.id, replacement.id]
+    assert store.stats()["evictions"] == 2
+
+def test_idle_sessions_expire():
+    store = SessionStore(max_sessions=10, ttl=0.05, max_bytes=10 ** 6)
+    idle = store.get_or_create()
+    time.sleep(0.1)
+    active = store.get_or_create()
+    # Creating a session sweeps the expired ones, and an expired id starts over
+    assert store.stats()["sessions"] == 1 and store.stats()["expirations"] == 1
+    assert store.get_or_create(idle.id) is not idle
+    assert store.get_or_create(active.id) is active
+
+def test_memory_cap_counts_session_growth():
+    store = SessionStore(max_sessions=10, ttl=60, max_bytes=10_000)
+    sessions = [store.get_or_create() for _ in range(3)]
+    for session in sessions:
+        remember(session, 3000)
+        store.touch(session)
+    assert store.stats()["memory_bytes"] == sum(session.size_bytes for session in sessions)
+
+    # The newest session growing past the cap evicts the oldest ones first
+    remember(sessions[2], 8000)
+    store.touch(sessions[2])
+    stats = store.stats()
+    print(f"📊 {stats['sessions']} sessions, {stats['memory_bytes']} of {stats['max_memory_bytes']} bytes")
+    assert list(store._sessions) == [sessions[2].id]
+    assert stats["memory_bytes"] == sessions[2].size_bytes and stats["evictions"] == 2
+
+    # A single session over the cap is kept, but deleting it releases its bytes
+    assert store.delete(sessions[2].id)
+    assert store.stats()["memory_bytes"] == 0
+
+def test_cached_candidates_need_the_same_scope_and_corpus():
+    session = Session()
+    remember(session, 10, version="v1")
+    assert session.topic_similarity(np.array([1.0, 0.0]), None, "v1") == 1.0
+    assert session.topic_similarity([0.0, 2.0], None, "v1") == 0.0
+    assert session.topic_similarity([1.0, 0.0], ["other.pdf"], "v1") is None
+    assert session.topic_similarity([1.0, 0.0], None, "v2") is None
+    assert session.topic_similarity([1.0, 0.0], None, None) is None
+
+if __name__ == "__main__":
+    print("🧪 Session Store Test")
+    print("=" * 40)
+    test_least_recently_used_sessions_are_evicted()
+    test_idle_sessions_expire()
+    test_memory_cap_counts_session_growth()
+    test_cached_candidates_need_the_same_scope_and_corpus()
+    print("✅ All session store checks passed")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Test that re-uploads only touch changed chunks and never lose a stored document
+"""
+import os
+import sys
+from contextlib import ExitStack
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import store_embeddings
+from store_embeddings import sync_document
+
+SOURCE = "manual.pdf"
+
+class FakeQuery:
+    """Just enough of the PostgREST query builder for store_embeddings"""
+
+    def __init__(self, client, action=None, rows=None):
+        self.client = client
+        self.action = action
+        self.rows = rows
+        self.source = None
+        self.ids = None
+        self.bounds = None
+
+    def select(self, columns):
+        return FakeQuery(self.client, "select")
+
+    def insert(self, rows):
+        return FakeQuery(self.client, "insert", rows)
+
+    def delete(self):
+        return FakeQuery(self.client, "delete")
+
+    def eq(self, column, value):
+        self.source = value
+        return self
+
+    def in_(self, column, values):
+        self.ids = set(values)
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        return mock.Mock(data=getattr(self.client, self.action)(self))
+
+class FakeSupabase:
+    """pdf_chunks held in a dict; inserts of any content in fail_contents raise"""
+
+    def __init__(self):
+        self.rows = {}
+        self.next_id = 1
+        self.fail_contents = set()
+        self.deleted = []
+        self.marked = []
+
+    def table(self, name):
+        assert name == "pdf_chunks"
+        return FakeQuery(self)
+
+    def rpc(self, name, params):
+        assert name == "mark_pdf_document_complete"
+        self.marked.append((params["doc_source"], params["doc_file_hash"], params["doc_total_chunks"]))
+        for row in self.rows.values():
+            if row["metadata"]["source"] == params["doc_source"]:
+                row["metadata"].update(file_hash=params["doc_file_hash"], total_chunks=params["doc_total_chunks"])
+        return mock.Mock(execute=lambda: mock.Mock(data=None))
+
+    def select(self, query):
+        rows = [row for _, row in sorted(self.rows.items()) if row["metadata"]["source"] == query.source]
+        start, end = query.bounds
+        return [{"id": row["id"], "metadata": dict(row["metadata"])} for row in rows[start:end + 1]]
+
+    def insert(self, query):
+        if any(row["content"] in self.fail_contents for row in query.rows):
+            raise RuntimeError("insert failed")
+        inserted = []
+        for row in query.rows:
+            stored = {"id": self.next_id, "content": row["content"], "metadata": dict(row["metadata"])}
+            self.rows[self.next_id] = stored
+            self.next_id += 1
+            inserted.append(dict(stored))
+        return inserted
+
+    def delete(self, query):
+        self.deleted.extend(sorted(query.ids))
+        for chunk_id in query.ids:
+            self.rows.pop(chunk_id, None)
+        return []
+
+    def contents(self):
+        return sorted(row["content"] for row in self.rows.values())
+
+def sync(supabase, contents, file_hash, insert_batch_size=2):
+    """Run sync_document with fake embeddings, returning (stats, derived index updates)"""
+    updates = []
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(store_embeddings, "get_embeddings",
+                                              lambda texts: [[float(len(text)), 1.0] for text in texts]))
+        stack.enter_context(mock.patch.object(store_embeddings, "_update_derived_indexes",
+                                              lambda added, removed: updates.append((list(added), list(removed)))))
+        # Small batches so one document spans several inserts
+        stack.enter_context(mock.patch.object(store_embeddings, "EMBEDDING_BATCH_SIZE", 2))
+        stack.enter_context(mock.patch.object(store_embeddings, "INSERT_BATCH_SIZE", insert_batch_size))
+        stack.enter_context(mock.patch.object(store_embeddings, "BATCH_RETRY_DELAY", 0))
+        stats = sync_document(({"content": content} for content in contents), SOURCE, file_hash,
+                              supabase=supabase)
+    return stats, updates
+
+VERSION_1 = ["intro", "chapter one", "chapter two", "chapter three", "appendix"]
+VERSION_2 = ["intro", "chapter one (revised)", "chapter two", "chapter three", "index"]
+
+def test_reupload_only_replaces_changed_chunks():
+    supabase = FakeSupabase()
+    stats, _ = sync(supabase, VERSION_1, "hash-1")
+    assert stats["successful_chunks"] == 5 and stats["deleted_chunks"] == 0
+    assert supabase.marked == [(SOURCE, "hash-1", 5)]
+    ids = {row["content"]: row["id"] for row in supabase.rows.values()}
+
+    stats, updates = sync(supabase, VERSION_2, "hash-2")
+    print(f"📊 Re-upload: {stats['successful_chunks']} added, {stats['unchanged_chunks']} unchanged, "
+          f"{stats['deleted_chunks']} deleted")
+    assert (stats["successful_chunks"], stats["unchanged_chunks"], stats["deleted_chunks"]) == (2, 3, 2)
+    assert supabase.contents() == sorted(VERSION_2)
+    assert sorted(supabase.deleted) == sorted([ids["chapter one"], ids["appendix"]])
+    # Unchanged chunks keep their rows, and the derived indexes learn about both sides of the change
+    assert all(supabase.rows[ids[content]]["content"] == content for content in ("intro", "chapter two"))
+    added, removed = updates[0]
+    assert sorted(row["content"] for row in added) == ["chapter one (revised)", "index"]
+    assert sorted(removed) == sorted(supabase.deleted)
+    assert supabase.marked[-1] == (SOURCE, "hash-2", 5)
+
+def test_unchanged_reupload_is_a_no_op():
+    supabase = FakeSupabase()
+    sync(supabase, VERSION_1, "hash-1")
+    stats, updates = sync(supabase, VERSION_1, "hash-1")
+    assert stats["unchanged"] and stats["unchanged_chunks"] == 5
+    assert updates == [] and supabase.deleted == []
+
+def test_failed_batch_keeps_previous_version():
+    supabase = FakeSupabase()
+    sync(supabase, VERSION_1, "hash-1")
+    supabase.fail_contents = {"index"}
+
+    # One row per insert, so only the chunk that fails is lost
+    stats, updates = sync(supabase, VERSION_2, "hash-2", insert_batch_size=1)
+    print(f"📊 Partial failure: {stats['failed_chunks']} chunks failed in {len(stats['failed_batches'])} batch(es)")
+    assert stats["failed_chunks"] == 1 and stats["deleted_chunks"] == 0
+    assert supabase.deleted == []
+    # Nothing stale was deleted and the new rows that did land are kept and indexed
+    assert set(VERSION_1) <= set(supabase.contents())
+    assert "chapter one (revised)" in supabase.contents()
+    assert [row["content"] for row in updates[0][0]] == ["chapter one (revised)"]
+    assert supabase.marked == [(SOURCE, "hash-1", 5)]
+
+    # The next upload of the same file fills in the rest and only then removes the stale rows
+    supabase.fail_contents = set()
+    stats, _ = sync(supabase, VERSION_2, "hash-2")
+    assert stats["successful_chunks"] == 1 and stats["deleted_chunks"] == 2
+    assert supabase.contents() == sorted(VERSION_2)
+    assert supabase.marked[-1] == (SOURCE, "hash-2", 5)
+
+def test_empty_reupload_keeps_stored_document():
+    supabase = FakeSupabase()
+    sync(supabase, VERSION_1, "hash-1")
+    stats, updates = sync(supabase, [], "hash-empty")
+    assert stats["total_chunks"] == 0 and stats["deleted_chunks"] == 0
+    assert supabase.contents() == sorted(VERSION_1)
+    assert supabase.deleted == [] and updates == []
+    assert supabase.marked == [(SOURCE, "hash-1", 5)]
+
+if __name__ == "__main__":
+    print("🧪 Document Sync Test")
+    print("=" * 40)
+    test_reupload_only_replaces_changed_chunks()
+    test_unchanged_reupload_is_a_no_op()
+    test_failed_batch_keeps_previous_version()
+    test_empty_reupload_keeps_stored_document()
+    print("✅ All document sync checks passed")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test that uploads are streamed to disk with bounded memory
+"""
+import asyncio
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from upload_pdf import save_upload_to_tempfile, UploadTooLargeError
+
+BLOCK_SIZE = 256 * 1024
+
+class FakeUpload:
+    """Minimal stand-in for UploadFile that generates its content on demand"""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    async def read(self, size=-1):
+        if size < 0:
+            size = self.remaining
+        size = min(size, self.remaining)
+        self.remaining -= size
+        return b"x" * size
+
+def measure_peak_memory(file_size):
+    """Save a fake upload of file_size bytes and return (peak bytes, path)"""
+    tracemalloc.start()
+    try:
+        path, _ = asyncio.run(save_upload_to_tempfile(
+            FakeUpload(file_size), max_bytes=file_size, block_size=BLOCK_SIZE
+        ))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, path
+
+def test_peak_memory_independent_of_file_size():
+    """Peak memory for a 64 MB upload should match that of a 4 MB upload"""
+    small_peak, small_path = measure_peak_memory(4 * 1024 * 1024)
+    large_peak, large_path = measure_peak_memory(64 * 1024 * 1024)
+    try:
+        print(f"📊 Peak memory: 4 MB upload = {small_peak / 1024:.0f} KB, 64 MB upload = {large_peak / 1024:.0f} KB")
+        assert os.path.getsize(large_path) == 64 * 1024 * 1024
+        # A handful of blocks at most, never proportional to the file size
+        assert large_peak < 4 * BLOCK_SIZE
+        assert large_peak < small_peak + BLOCK_SIZE
+    finally:
+        os.unlink(small_path)
+        os.unlink(large_path)
+
+def test_upload_rejected_while_streaming():
+    """Oversized uploads are rejected once the limit is crossed, without reading the rest"""
+    upload = FakeUpload(10 * 1024 * 1024)
+    try:
+        asyncio.run(save_upload_to_tempfile(upload, max_bytes=1024 * 1024, block_size=BLOCK_SIZE))
+    except UploadTooLargeError as e:
+        print(f"✅ Oversized upload rejected: {e}")
+    else:
+        raise AssertionError("Expected UploadTooLargeError")
+    assert upload.remaining > 8 * 1024 * 1024
+
+if __name__ == "__main__":
+    print("🧪 Upload Streaming Test")
+    print("=" * 40)
+    test_peak_memory_independent_of_file_size()
+    test_upload_rejected_while_streaming()
+    print("✅ All upload streaming checks passed")